@@ -0,0 +1,416 @@
+"""
+Benchmarks do OrcaPro.
+
+Uso:
+    python benchmark.py layout --itens 10 1000 10000
+    python benchmark.py inicializacao
+    python benchmark.py popular --banco bench.db --orcamentos 100000
+    python benchmark.py api --banco bench.db
+    python benchmark.py carga --banco bench.db --threads 4 --duracao 10
+    python benchmark.py comparar antes.json depois.json
+
+Com --json arquivo.json (antes do cenário) os resultados também são gravados em JSON,
+para comparar versões com o cenário 'comparar'. Os cenários 'api' e 'carga' alteram o
+banco (salvam orçamentos e mudam status): use um banco sintético, nunca o de produção.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import main
+
+# ===[ DADOS SINTÉTICOS ]===
+
+PALAVRAS = ('instalação manutenção preventiva corretiva troca reparo pintura parede elétrica '
+            'hidráulica quadro disjuntor tomada interruptor cabo fiação luminária revestimento '
+            'de da do com para em sala cozinha banheiro área externa').split()
+
+NOMES = ('Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Fábio', 'Gabriela', 'Heitor', 'Íris', 'João',
+         'Larissa', 'Márcio', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sônia', 'Tiago', 'Vânia', 'Wesley')
+SOBRENOMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Araújo', 'Gonçalves',
+              'Ribeiro', 'Almeida', 'Conceição', 'Carvalho', 'Rocha', 'Magalhães', 'Brandão')
+
+# Distribuição dos status dos orçamentos semeados
+PESOS_STATUS = {'PENDENTE': 3, 'APROVADO': 5, 'REJEITADO': 2}
+
+def item_sintetico(rnd, indice, max_palavras=40):
+    """Item com descrição de 1 a max_palavras palavras e observação em 1 a cada 5 itens."""
+    qtd = rnd.randint(1, 10)
+    preco = round(rnd.uniform(10, 2000), 2)
+    return {
+        'desc': ' '.join(rnd.choice(PALAVRAS) for _ in range(rnd.randint(1, max_palavras))),
+        'obs': 'Material incluso' if indice % 5 == 0 else '',
+        'qtd': qtd,
+        'preco': preco,
+        'total': round(qtd * preco, 2),
+    }
+
+def orcamento_sintetico(qtd_itens, semente=1):
+    rnd = random.Random(semente)
+    itens = [item_sintetico(rnd, i) for i in range(qtd_itens)]
+    return {
+        'id': 1,
+        'cliente': 'Cliente Benchmark',
+        'pasta_cliente': 'Cliente Benchmark',
+        'email': 'cliente@exemplo.com',
+        'telefone': '(11) 99999-0000',
+        'endereco': 'Rua Exemplo, 123',
+        'data_criacao': time.strftime('%d/%m/%Y'),
+        'itens': itens,
+        'total': round(sum(i['total'] for i in itens), 2),
+    }
+
+def cliente_sintetico(rnd, indice):
+    """Cliente determinístico pelo índice; 1 em cada 20 usos vem com outra grafia (caixa/acentos)."""
+    nome = f'{NOMES[indice % len(NOMES)]} {SOBRENOMES[(indice // len(NOMES)) % len(SOBRENOMES)]} {indice}'
+    if rnd.random() < 0.05:
+        nome = main.remover_acentos(nome).upper()
+    return nome, f'cliente{indice}@exemplo.com', f'(61) 9{indice % 10000:04d}-{indice % 7919:04d}'
+
+def orcamento_semeado(rnd, qtd_clientes, max_itens, hoje):
+    """Orçamento no formato de validar_orcamento_importacao, pronto para gravar_lote_importacao.
+
+    A quantidade de itens segue uma cauda longa (Pareto): a maioria tem poucos itens e
+    alguns chegam a max_itens.
+    """
+    nome, email, telefone = cliente_sintetico(rnd, rnd.randrange(qtd_clientes))
+    qtd_itens = min(max_itens, int(rnd.paretovariate(1.2)))
+    itens = [item_sintetico(rnd, i, max_palavras=8) for i in range(qtd_itens)]
+    return {
+        'cliente': nome,
+        'email': email,
+        'telefone': telefone,
+        'endereco': f'Quadra {rnd.randint(1, 400)}, Casa {rnd.randint(1, 60)}',
+        'data': (hoje - timedelta(days=rnd.randrange(3 * 365))).isoformat(),
+        'status': rnd.choices(list(PESOS_STATUS), weights=list(PESOS_STATUS.values()))[0],
+        'itens': itens,
+        'total': round(sum(item['total'] for item in itens), 2),
+    }
+
+def popular_banco(banco_dados, quantidade, max_itens=200, semente=1, clientes=None):
+    """Grava 'quantidade' orçamentos sintéticos pelo mesmo caminho da importação em massa."""
+    rnd = random.Random(semente)
+    qtd_clientes = clientes or max(10, quantidade // 5)
+    hoje = date.today()
+    resumo = {'importados': 0, 'itens': 0}
+    inicio = time.perf_counter()
+    while resumo['importados'] < quantidade:
+        tamanho = min(main.TAMANHO_LOTE_IMPORTACAO, quantidade - resumo['importados'])
+        main.gravar_lote_importacao(banco_dados, [orcamento_semeado(rnd, qtd_clientes, max_itens, hoje) for _ in range(tamanho)], resumo)
+        print(f"\r{resumo['importados']}/{quantidade} orçamentos", end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    resumo['duracao'] = time.perf_counter() - inicio
+    return resumo
+
+def abrir_banco(args):
+    """Abre o banco do benchmark (ou um temporário) e o popula se estiver vazio."""
+    caminho = args.banco or os.path.join(args.pasta_temporaria, 'bench.db')
+    banco_dados = main.BancoDados(caminho)
+    main.inicializar_banco(banco_dados)
+    with banco_dados.conexao() as conexao:
+        existentes = conexao.execute('SELECT COUNT(*) FROM orcamentos').fetchone()[0]
+    if not existentes:
+        popular_banco(banco_dados, args.orcamentos, args.max_itens, args.semente)
+    return banco_dados
+
+# ===[ MEDIÇÃO ]===
+
+def resumo_tempos(operacao, tempos, **extras):
+    """Estatísticas de uma lista de durações (s), em milissegundos."""
+    ordenados = sorted(tempos)
+    total = sum(ordenados)
+    return {
+        'operacao': operacao,
+        'execucoes': len(ordenados),
+        'min_ms': round(ordenados[0] * 1000, 3),
+        'mediana_ms': round(ordenados[len(ordenados) // 2] * 1000, 3),
+        'p95_ms': round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1000, 3),
+        'max_ms': round(ordenados[-1] * 1000, 3),
+        'por_segundo': round(len(ordenados) / total, 1) if total else None,
+        **extras,
+    }
+
+def medir(operacao, funcao, repeticoes, **extras):
+    """Executa funcao(i) 'repeticoes' vezes e resume as durações."""
+    tempos = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append(time.perf_counter() - inicio)
+    return resumo_tempos(operacao, tempos, **extras)
+
+def verificar(resposta):
+    """Falha a medição se a API devolveu erro (um erro rápido não pode parecer uma chamada rápida)."""
+    if isinstance(resposta, dict) and resposta.get('status') == 'erro':
+        raise RuntimeError(resposta.get('mensagem'))
+    return resposta
+
+def contar_paginas(caminho):
+    """Número de páginas de um PDF gerado pelo FPDF (objetos '/Type /Page' sem compressão)."""
+    with open(caminho, 'rb') as arquivo:
+        return len(re.findall(rb'/Type\s*/Page\b', arquivo.read()))
+
+def aquecer_pdf(pasta):
+    """Gera um PDF mínimo fora da medição: a importação do FPDF é um custo único, medido em 'inicializacao'."""
+    main.renderizar_pdf(main.montar_contexto_pdf(None), orcamento_sintetico(1), os.path.join(pasta, 'aquecimento.pdf'))
+
+# ===[ CENÁRIOS ]===
+
+def bench_layout(args):
+    """Tempo de renderização da tabela de itens do PDF por tamanho de orçamento."""
+    contexto = main.montar_contexto_pdf(None)
+    aquecer_pdf(args.pasta_temporaria)
+    resultados = []
+    for qtd in args.itens:
+        orcamento = orcamento_sintetico(qtd)
+        caminho = os.path.join(args.pasta_temporaria, f'layout_{qtd}.pdf')
+        resultado = medir(f'layout_{qtd}_itens', lambda _: main.renderizar_pdf(contexto, orcamento, caminho), args.repeticoes)
+        paginas = contar_paginas(caminho)
+        melhor = resultado['min_ms'] / 1000
+        resultado.update(itens=qtd, paginas=paginas, itens_por_segundo=round(qtd / melhor), paginas_por_segundo=round(paginas / melhor, 1),
+                         kb=round(os.path.getsize(caminho) / 1024, 1))
+        resultados.append(resultado)
+    return resultados
+
+def bench_inicializacao(args):
+    """Tempo de abertura do processo em modo linha de comando (importação + banco)."""
+    comando = [sys.executable, main.__file__, '--banco', os.path.join(args.pasta_temporaria, 'inicio.db'), '--tempos', 'estatisticas']
+    subprocess.run(comando, capture_output=True, check=True)  # Cria o banco e aplica as migrações
+    saidas = []
+
+    def executar(_):
+        saidas.append(subprocess.run(comando, capture_output=True, text=True, check=True).stderr.strip())
+
+    resultado = medir('processo_cli', executar, args.repeticoes)
+    print(saidas[-1], file=sys.stderr)
+    return [resultado]
+
+def bench_popular(args):
+    """Cria (ou completa) um banco sintético para os cenários 'api' e 'carga'."""
+    banco_dados = main.BancoDados(args.banco)
+    main.inicializar_banco(banco_dados)
+    resumo = popular_banco(banco_dados, args.orcamentos, args.max_itens, args.semente)
+    banco_dados.fechar()
+    return [{
+        'operacao': 'popular', 'orcamentos': resumo['importados'], 'itens': resumo['itens'],
+        'duracao_s': round(resumo['duracao'], 3), 'por_segundo': round(resumo['importados'] / resumo['duracao'], 1),
+        'tamanho_mb': round(os.path.getsize(args.banco) / 1024 / 1024, 1),
+    }]
+
+def preparar_api(args, banco_dados):
+    """API sem janela, com cache de PDFs e pasta de saída dentro da pasta temporária."""
+    main.PASTA_CACHE_PDF = os.path.join(args.pasta_temporaria, 'cache_pdf')
+    api = main.InterfaceSistema(banco_dados)
+    pasta_pdf = os.path.join(args.pasta_temporaria, 'pdfs')
+    os.makedirs(pasta_pdf, exist_ok=True)
+    api.salvar_configuracoes({'empresa': 'Benchmark', 'rodape': '', 'caminho_pdf': pasta_pdf, 'salvar_auto': True})
+    return api
+
+def bench_api(args):
+    """Latência das chamadas da API usadas pela interface, sobre o banco sintético."""
+    banco_dados = abrir_banco(args)
+    api = preparar_api(args, banco_dados)
+    rnd = random.Random(args.semente)
+    with banco_dados.conexao() as conexao:
+        total, maior_id = conexao.execute('SELECT COUNT(*), MAX(id) FROM orcamentos').fetchone()
+        ids_pdf = [linha[0] for linha in conexao.execute(
+            'SELECT id FROM orcamentos WHERE qtd_itens BETWEEN 1 AND 20 ORDER BY random() LIMIT ?', (args.pdfs,))]
+    repeticoes = args.repeticoes
+    contexto = {'orcamentos': total}
+    resultados = []
+
+    resultados.append(medir('obter_historico', lambda _: api._historico_completo(), max(1, repeticoes // 10), **contexto))
+    resultados.append(medir('obter_historico_paginado', lambda _: api.obter_historico_paginado({'limite': 50}), repeticoes, **contexto))
+
+    cursor = {'valor': None}
+    def proxima_pagina(_):
+        pagina = api.obter_historico_paginado({'limite': 50, 'ordem': 'maior_valor', 'cursor': cursor['valor']})
+        cursor['valor'] = pagina['proximo_cursor']
+    resultados.append(medir('obter_historico_paginado_rolagem', proxima_pagina, repeticoes, **contexto))
+    resultados.append(medir('obter_historico_paginado_busca',
+                            lambda i: api.obter_historico_paginado({'limite': 50, 'busca': PALAVRAS[i % 18][:5]}), repeticoes, **contexto))
+    resultados.append(medir('obter_estatisticas', lambda _: api.obter_estatisticas(), repeticoes, **contexto))
+    resultados.append(medir('obter_analise', lambda _: api.obter_analise(), max(1, repeticoes // 10), **contexto))
+
+    novo = orcamento_semeado(rnd, max(10, total // 5), 10, date.today())
+    novo['itens'] = novo['itens'] or [item_sintetico(rnd, 0)]
+    dados = {**novo, 'data': datetime.now().strftime('%d/%m/%Y')}
+    resultados.append(medir('salvar_orcamento_novo', lambda _: verificar(api.salvar_orcamento(dict(dados))), repeticoes, **contexto))
+    id_editado = maior_id + 1
+    resultados.append(medir('salvar_orcamento_edicao', lambda i: verificar(api.salvar_orcamento(
+        {**dados, 'id': id_editado, 'itens': dados['itens'][:1 + i % len(dados['itens'])]})), repeticoes, **contexto))
+    resultados.append(medir('atualizar_status', lambda i: verificar(api.atualizar_status(
+        rnd.randint(1, maior_id), main.STATUS_VALIDOS[i % len(main.STATUS_VALIDOS)])), repeticoes, **contexto))
+
+    if ids_pdf:
+        # A primeira geração de cada orçamento renderiza e a segunda vem do cache de PDFs (sem abrir o visualizador)
+        aquecer_pdf(args.pasta_temporaria)
+        resultados.append(medir('gerar_pdf', lambda i: verificar(api._gerar_pdf(ids_pdf[i], abrir=False)), len(ids_pdf), **contexto))
+        resultados.append(medir('gerar_pdf_cache', lambda i: verificar(api._gerar_pdf(ids_pdf[i], abrir=False)), len(ids_pdf), **contexto))
+    banco_dados.fechar()
+    return resultados
+
+# Operações da carga mista: (nome, peso, função(api, rnd, maior_id))
+OPERACOES_CARGA = (
+    ('obter_historico_paginado', 40, lambda api, rnd, maior_id: api.obter_historico_paginado({'limite': 50})),
+    ('busca', 20, lambda api, rnd, maior_id: api.obter_historico_paginado({'limite': 50, 'busca': rnd.choice(PALAVRAS)[:4]})),
+    ('obter_estatisticas', 20, lambda api, rnd, maior_id: api.obter_estatisticas()),
+    ('obter_detalhes_orcamento', 10, lambda api, rnd, maior_id: api.obter_detalhes_orcamento(rnd.randint(1, maior_id))),
+    ('atualizar_status', 10, lambda api, rnd, maior_id: api.atualizar_status(rnd.randint(1, maior_id), rnd.choice(main.STATUS_VALIDOS))),
+)
+
+def bench_carga(args):
+    """Várias threads chamando a API ao mesmo tempo (leituras e escritas misturadas) por 'duracao' segundos."""
+    banco_dados = abrir_banco(args)
+    api = preparar_api(args, banco_dados)
+    with banco_dados.conexao() as conexao:
+        maior_id = conexao.execute('SELECT MAX(id) FROM orcamentos').fetchone()[0]
+    nomes = [nome for nome, _, _ in OPERACOES_CARGA]
+    pesos = [peso for _, peso, _ in OPERACOES_CARGA]
+    funcoes = {nome: funcao for nome, _, funcao in OPERACOES_CARGA}
+    tempos = {nome: [] for nome in nomes}
+    erros = []
+    trava = threading.Lock()
+    fim = time.perf_counter() + args.duracao
+
+    def trabalhar(indice):
+        rnd = random.Random(args.semente + indice)
+        locais = {nome: [] for nome in nomes}
+        while time.perf_counter() < fim:
+            nome = rnd.choices(nomes, weights=pesos)[0]
+            inicio = time.perf_counter()
+            try:
+                funcoes[nome](api, rnd, maior_id)
+            except Exception as e:
+                with trava:
+                    erros.append(f'{nome}: {e}')
+                continue
+            locais[nome].append(time.perf_counter() - inicio)
+        with trava:
+            for nome, lista in locais.items():
+                tempos[nome].extend(lista)
+
+    threads = [threading.Thread(target=trabalhar, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    banco_dados.fechar()
+
+    resultados = [resumo_tempos(f'carga_{nome}', lista, threads=args.threads) for nome, lista in tempos.items() if lista]
+    for resultado in resultados:
+        resultado['por_segundo'] = round(resultado['execucoes'] / args.duracao, 1)  # Vazão real, com as threads em paralelo
+    resultados.append({'operacao': 'carga_total', 'threads': args.threads, 'duracao_s': args.duracao, 'erros': len(erros),
+                       'execucoes': sum(len(lista) for lista in tempos.values()),
+                       'por_segundo': round(sum(len(lista) for lista in tempos.values()) / args.duracao, 1)})
+    for erro in erros[:10]:
+        print(erro, file=sys.stderr)
+    return resultados
+
+def bench_comparar(args):
+    """Compara a mediana de cada operação entre dois arquivos gerados com --json."""
+    with open(args.antes, encoding='utf-8') as arquivo:
+        antes = {r['operacao']: r for r in json.load(arquivo)['resultados']}
+    with open(args.depois, encoding='utf-8') as arquivo:
+        depois = {r['operacao']: r for r in json.load(arquivo)['resultados']}
+    resultados = []
+    for operacao, atual in depois.items():
+        anterior = antes.get(operacao)
+        if not anterior or not anterior.get('mediana_ms') or atual.get('mediana_ms') is None:
+            continue
+        resultados.append({'operacao': operacao, 'antes_ms': anterior['mediana_ms'], 'depois_ms': atual['mediana_ms'],
+                           'variacao_pct': round((atual['mediana_ms'] / anterior['mediana_ms'] - 1) * 100, 1)})
+    return resultados
+
+# ===[ SAÍDA ]===
+
+def imprimir_resultados(resultados):
+    for resultado in resultados:
+        extras = '  '.join(f'{chave}={valor}' for chave, valor in resultado.items() if chave != 'operacao')
+        print(f"{resultado['operacao']:<36} {extras}")
+
+def gravar_json(caminho, args, resultados):
+    """Resultados com ambiente e parâmetros, no formato lido pelo cenário 'comparar'."""
+    parametros = {chave: valor for chave, valor in vars(args).items() if chave not in ('funcao', 'json', 'pasta_temporaria')}
+    documento = {
+        'cenario': args.cenario,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'processadores': os.cpu_count(),
+        'versao_esquema': main.VERSAO_ESQUEMA,
+        'parametros': parametros,
+        'resultados': resultados,
+    }
+    if caminho == '-':
+        print(json.dumps(documento, ensure_ascii=False, indent=2))
+        return
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(documento, arquivo, ensure_ascii=False, indent=2)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='Benchmarks do OrcaPro')
+    parser.add_argument('--json', metavar='ARQUIVO', help="Grava os resultados em JSON ('-' para a saída padrão)")
+    sub = parser.add_subparsers(dest='cenario', required=True)
+
+    p_layout = sub.add_parser('layout', help='Renderização da tabela de itens do PDF')
+    p_layout.add_argument('--itens', type=int, nargs='+', default=[10, 1000, 10000])
+    p_layout.add_argument('--repeticoes', type=int, default=3)
+    p_layout.set_defaults(funcao=bench_layout)
+
+    p_inicio = sub.add_parser('inicializacao', help='Tempo de abertura do programa (sem janela)')
+    p_inicio.add_argument('--repeticoes', type=int, default=10)
+    p_inicio.set_defaults(funcao=bench_inicializacao)
+
+    def opcoes_banco(p, obrigatorio=False):
+        if obrigatorio:
+            p.add_argument('--banco', required=True, help='Arquivo do banco sintético a criar (ou completar)')
+        else:
+            p.add_argument('--banco', help='Banco sintético (padrão: temporário, criado a cada execução)')
+        p.add_argument('--orcamentos', type=int, default=10000, help='Orçamentos semeados quando o banco está vazio')
+        p.add_argument('--max-itens', type=int, default=200, help='Máximo de itens por orçamento semeado')
+        p.add_argument('--semente', type=int, default=1)
+
+    p_popular = sub.add_parser('popular', help='Cria um banco sintético (1 mil a 1 milhão de orçamentos)')
+    opcoes_banco(p_popular, obrigatorio=True)
+    p_popular.set_defaults(funcao=bench_popular)
+
+    p_api = sub.add_parser('api', help='Latência das chamadas da API (histórico, estatísticas, salvar, status, PDF)')
+    opcoes_banco(p_api)
+    p_api.add_argument('--repeticoes', type=int, default=50)
+    p_api.add_argument('--pdfs', type=int, default=10, help='Orçamentos usados na medição de gerar_pdf')
+    p_api.set_defaults(funcao=bench_api)
+
+    p_carga = sub.add_parser('carga', help='Carga mista com várias threads')
+    opcoes_banco(p_carga)
+    p_carga.add_argument('--threads', type=int, default=4)
+    p_carga.add_argument('--duracao', type=float, default=10.0, help='Segundos de carga')
+    p_carga.set_defaults(funcao=bench_carga)
+
+    p_comparar = sub.add_parser('comparar', help='Compara dois resultados gravados com --json')
+    p_comparar.add_argument('antes')
+    p_comparar.add_argument('depois')
+    p_comparar.set_defaults(funcao=bench_comparar)
+
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as pasta:
+        args.pasta_temporaria = pasta
+        resultados = args.funcao(args)
+    if args.json != '-':
+        imprimir_resultados(resultados)
+    if args.json:
+        gravar_json(args.json, args, resultados)
+
+if __name__ == '__main__':
+    main_cli()
@@ -1,5 +1,7 @@
-import webview
+import time
+INICIO_PROCESSO = time.perf_counter()  # Referência para TEMPOS_INICIALIZACAO
 import json
+import hashlib
 import sqlite3
 import os
 import sys
@@ -8,15 +10,19 @@ import subprocess
 import re
 import shutil
 import tempfile
-from datetime import datetime
-from fpdf import FPDF
-from fpdf.enums import XPos, YPos
-
-try:
-    from PIL import Image
-except ImportError:
-    print("ERRO CRÍTICO: A biblioteca 'Pillow' é necessária. Instale com: pip install Pillow")
-    sys.exit(1)
+import threading
+import queue
+import itertools
+import unicodedata
+import bisect
+import collections
+import functools
+import types
+import traceback
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
 
 # ===[ CONFIGURAÇÕES E CONSTANTES ]===
 
@@ -26,16 +32,400 @@ def obter_caminho_app():
         return os.path.dirname(sys.executable)
     return os.path.dirname(os.path.abspath(__file__))
 
-ARQUIVO_DB = os.path.join(obter_caminho_app(), 'orcamentos.db')
+# ORCAPRO_BANCO aponta para um banco compartilhado (ex.: unidade de rede); com ORCAPRO_MULTIUSUARIO=1
+# o banco é aberto no modo multiusuário (ver BancoDados)
+ARQUIVO_DB = os.environ.get('ORCAPRO_BANCO') or os.path.join(obter_caminho_app(), 'orcamentos.db')
+MODO_MULTIUSUARIO = os.environ.get('ORCAPRO_MULTIUSUARIO') == '1'
 ARQUIVO_LOGO = os.path.join(obter_caminho_app(), 'logo_empresa.png')
+PASTA_CACHE_PDF = os.path.join(obter_caminho_app(), 'cache_pdf')
+PASTA_CACHE_LOGO = os.path.join(obter_caminho_app(), 'cache_logo')
+PASTA_BACKUPS = os.path.join(obter_caminho_app(), 'backups')
+
+# Cache de PDFs: tamanho máximo em disco e versão do layout (mudar invalida tudo o que já foi gerado)
+LIMITE_CACHE_PDF_BYTES = 200 * 1024 * 1024
+VERSAO_LAYOUT_PDF = 2
+
+# Ordenações aceitas pelo histórico paginado: (expressão SQL, direção)
+ORDENACOES_HISTORICO = {
+    'recentes': ('id', 'DESC'),
+    'antigos': ('id', 'ASC'),
+    'maior_valor': ('COALESCE(total, 0)', 'DESC'),  # Sem o COALESCE, o cursor (total, id) nunca passa de um total NULL
+    'menor_valor': ('COALESCE(total, 0)', 'ASC'),
+    'cliente': ('cliente COLLATE NOCASE', 'ASC'),
+}
+LIMITE_PAGINA_HISTORICO = 200
+
+# Exportação em lote: orçamentos lidos por consulta e tarefas pendentes por processo
+TAMANHO_BLOCO_LOTE = 200
+TAREFAS_POR_PROCESSO_LOTE = 4
+
+# Relatório único: o FPDF guarda todas as páginas na memória até gravar o arquivo
+# (cerca de 90 MB para 2000 orçamentos, ~5000 páginas), então o tamanho do relatório é limitado
+LIMITE_ORCAMENTOS_CONSOLIDADO = 2000
+
+# Fila de geração de PDF: quantas tarefas finalizadas ficam disponíveis para consulta
+LIMITE_TAREFAS_PDF = 200
+
+# Importação em massa: orçamentos por transação e rejeições devolvidas no resumo
+TAMANHO_LOTE_IMPORTACAO = 1000
+LIMITE_REJEICOES_RESUMO = 100
+STATUS_VALIDOS = ('PENDENTE', 'APROVADO', 'REJEITADO')
+
+# Cadastro de clientes: sugestões do autocompletar e chaves por consulta IN (...)
+LIMITE_SUGESTOES_CLIENTES = 8
+TAMANHO_BLOCO_CLIENTES = 500
+
+# Registro de alterações: acima de tantos orçamentos alterados, o cliente recarrega o histórico inteiro
+LIMITE_ALTERACOES = 500
+
+# Ações em massa no histórico: ids por comando IN (...), todos na mesma transação
+TAMANHO_BLOCO_ACAO_LOTE = 500
+
+# ===[ DIAGNÓSTICO ]===
+
+# Faixas (ms) do histograma de latência das chamadas; a última acumula o que passar de 5s
+FAIXAS_LATENCIA_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+LIMITE_ERROS_DIAGNOSTICO = 50
+LIMITE_PERFIS_LENTOS = 20
+PASTA_PERFIS = os.path.join(obter_caminho_app(), 'perfis')
+
+class Diagnostico:
+    """Métricas das chamadas da API: quantidade, erros, latência, SQL e fases da geração de PDF.
+
+    Cada thread guarda a medição da chamada em andamento (threading.local), e as conexões
+    do banco (ConexaoMedida) somam nela as consultas executadas. Com limite_perfil_ms
+    definido, as chamadas rodam sob cProfile e as mais lentas que o limite são gravadas
+    em pasta_perfis (arquivos .prof, abertos com pstats ou snakeviz).
+    """
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._local = threading.local()
+        self.limite_perfil_ms = None
+        self.pasta_perfis = PASTA_PERFIS
+        self.limpar()
+
+    def limpar(self):
+        with self._trava:
+            self.chamadas = {}
+            self.fases_pdf = {}
+            self.erros = collections.deque(maxlen=LIMITE_ERROS_DIAGNOSTICO)
+            self.desde = datetime.now()
+
+    def registrar_sql(self, duracao, consultas=1):
+        medicao = getattr(self._local, 'medicao', None)
+        if medicao is not None:
+            medicao['sql_consultas'] += consultas
+            medicao['sql_tempo'] += duracao
+
+    def registrar_erro(self, metodo, mensagem, detalhes=None):
+        with self._trava:
+            self.erros.append({'metodo': metodo, 'mensagem': str(mensagem), 'detalhes': detalhes,
+                               'quando': datetime.now().isoformat(timespec='seconds')})
+
+    def registrar_fases_pdf(self, tempos):
+        """Soma as durações (s) de cada fase de uma geração de PDF."""
+        with self._trava:
+            for fase, duracao in tempos.items():
+                dados = self.fases_pdf.setdefault(fase, {'quantidade': 0, 'tempo': 0.0, 'maximo': 0.0})
+                dados['quantidade'] += 1
+                dados['tempo'] += duracao
+                dados['maximo'] = max(dados['maximo'], duracao)
+
+    @contextmanager
+    def medir_chamada(self, metodo):
+        """Mede uma chamada; chamadas aninhadas (um método da API usando outro) contam só na externa."""
+        if getattr(self._local, 'medicao', None) is not None:
+            yield self._local.medicao
+            return
+        medicao = self._local.medicao = {'sql_consultas': 0, 'sql_tempo': 0.0, 'erro': None}
+        limite_perfil = self.limite_perfil_ms  # Lido uma vez: configurar_perfil pode mudá-lo durante a chamada
+        perfil = self._iniciar_perfil() if limite_perfil is not None else None
+        inicio = time.perf_counter()
+        try:
+            yield medicao
+        except Exception as e:
+            medicao['erro'] = str(e)
+            self.registrar_erro(metodo, e, traceback.format_exc())
+            raise
+        finally:
+            duracao = time.perf_counter() - inicio
+            self._local.medicao = None
+            if perfil is not None:
+                perfil.disable()
+                if duracao * 1000 >= limite_perfil:
+                    self._gravar_perfil(metodo, duracao, perfil)
+            self._registrar_chamada(metodo, duracao, medicao)
+
+    def _registrar_chamada(self, metodo, duracao, medicao):
+        with self._trava:
+            dados = self.chamadas.get(metodo)
+            if dados is None:
+                dados = self.chamadas[metodo] = {'quantidade': 0, 'erros': 0, 'tempo': 0.0, 'maximo': 0.0,
+                                                 'sql_consultas': 0, 'sql_tempo': 0.0,
+                                                 'histograma': [0] * (len(FAIXAS_LATENCIA_MS) + 1)}
+            dados['quantidade'] += 1
+            dados['tempo'] += duracao
+            dados['maximo'] = max(dados['maximo'], duracao)
+            dados['sql_consultas'] += medicao['sql_consultas']
+            dados['sql_tempo'] += medicao['sql_tempo']
+            dados['histograma'][bisect.bisect_left(FAIXAS_LATENCIA_MS, duracao * 1000)] += 1
+            if medicao['erro'] is not None:
+                dados['erros'] += 1
+
+    def _iniciar_perfil(self):
+        import cProfile
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:  # Outro profiler já ativo (Python 3.12+ permite um só por processo)
+            return None
+        return perfil
+
+    def _gravar_perfil(self, metodo, duracao, perfil):
+        """Grava o perfil da chamada lenta, mantendo só os LIMITE_PERFIS_LENTOS mais recentes."""
+        try:
+            os.makedirs(self.pasta_perfis, exist_ok=True)
+            metodo = re.sub(r'\W+', '_', metodo).strip('_')  # 'gerar_pdf (fila)' -> 'gerar_pdf_fila'
+            nome = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{metodo}_{duracao * 1000:.0f}ms.prof"
+            perfil.dump_stats(os.path.join(self.pasta_perfis, nome))
+            arquivos = sorted(arquivo for arquivo in os.listdir(self.pasta_perfis) if arquivo.endswith('.prof'))
+            for antigo in arquivos[:-LIMITE_PERFIS_LENTOS]:
+                os.remove(os.path.join(self.pasta_perfis, antigo))
+        except OSError as e:
+            self.registrar_erro('perfil', e)
+
+    def resumo(self):
+        """Métricas acumuladas, com as chamadas ordenadas pelo tempo total."""
+        with self._trava:
+            chamadas = [(metodo, dict(dados, histograma=list(dados['histograma']))) for metodo, dados in self.chamadas.items()]
+            fases = {fase: dict(dados) for fase, dados in self.fases_pdf.items()}
+            erros = list(self.erros)
+        return {
+            'desde': self.desde.isoformat(timespec='seconds'),
+            'chamadas': sorted((self._resumo_chamada(metodo, dados) for metodo, dados in chamadas), key=lambda c: -c['total_ms']),
+            'fases_pdf': [
+                {'fase': fase, 'quantidade': dados['quantidade'], 'media_ms': round(dados['tempo'] / dados['quantidade'] * 1000, 2),
+                 'max_ms': round(dados['maximo'] * 1000, 2), 'total_ms': round(dados['tempo'] * 1000, 1)}
+                for fase, dados in fases.items()
+            ],
+            'erros': erros[::-1],
+            'perfil': {'limite_ms': self.limite_perfil_ms, 'pasta': self.pasta_perfis},
+        }
+
+    @staticmethod
+    def _resumo_chamada(metodo, dados):
+        quantidade = dados['quantidade']
+        faixas = [*FAIXAS_LATENCIA_MS, None]
+
+        def percentil(fracao):
+            # Limite superior da faixa do histograma onde o percentil cai (None: acima de 5s)
+            alvo, acumulado = fracao * quantidade, 0
+            for faixa, contagem in zip(faixas, dados['histograma']):
+                acumulado += contagem
+                if acumulado >= alvo:
+                    return faixa
+            return None
+
+        return {
+            'metodo': metodo,
+            'quantidade': quantidade,
+            'erros': dados['erros'],
+            'media_ms': round(dados['tempo'] / quantidade * 1000, 2),
+            'p50_ms': percentil(0.5),
+            'p95_ms': percentil(0.95),
+            'max_ms': round(dados['maximo'] * 1000, 2),
+            'total_ms': round(dados['tempo'] * 1000, 1),
+            'sql_consultas': dados['sql_consultas'],
+            'sql_ms': round(dados['sql_tempo'] * 1000, 1),
+            'histograma': [{'ate_ms': faixa, 'quantidade': contagem} for faixa, contagem in zip(faixas, dados['histograma'])],
+        }
+
+diagnostico = Diagnostico()
+
+def instrumentar_api(classe):
+    """Envolve cada método público da classe (os expostos ao JavaScript pelo js_api) com diagnostico.medir_chamada."""
+    for nome, metodo in list(vars(classe).items()):
+        if not nome.startswith('_') and isinstance(metodo, types.FunctionType):
+            setattr(classe, nome, _metodo_instrumentado(nome, metodo))
+    return classe
+
+def copiar_assinaturas(classe):
+    """Copia para cada envoltório a assinatura do método original.
+
+    O pywebview lê os parâmetros com inspect.getfullargspec, que ignora __wrapped__. Feito só
+    ao abrir a janela, para a linha de comando não pagar a importação do inspect.
+    """
+    import inspect
+    for metodo in vars(classe).values():
+        original = getattr(metodo, '__wrapped__', None)
+        if original is not None:
+            metodo.__signature__ = inspect.signature(original)
+
+def _metodo_instrumentado(nome, metodo):
+    @functools.wraps(metodo)
+    def chamada(self, *args, **kwargs):
+        with diagnostico.medir_chamada(nome) as medicao:
+            resultado = metodo(self, *args, **kwargs)
+            if isinstance(resultado, dict) and resultado.get('status') == 'erro' and medicao['erro'] is None:
+                medicao['erro'] = resultado.get('mensagem')
+                diagnostico.registrar_erro(nome, resultado.get('mensagem'))
+            return resultado
+    return chamada
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que soma na medição da chamada em andamento as consultas e o tempo gasto nelas.
+
+    Conta o execute e as leituras com fetchone/fetchmany/fetchall; linhas lidas iterando
+    o cursor entram só até a primeira.
+    """
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            diagnostico.registrar_sql(time.perf_counter() - inicio)
+
+    def executemany(self, sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, parametros)
+        finally:
+            diagnostico.registrar_sql(time.perf_counter() - inicio)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            diagnostico.registrar_sql(time.perf_counter() - inicio, consultas=0)
+
+    def fetchmany(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchmany(*args, **kwargs)
+        finally:
+            diagnostico.registrar_sql(time.perf_counter() - inicio, consultas=0)
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            diagnostico.registrar_sql(time.perf_counter() - inicio, consultas=0)
+
+class ConexaoMedida(sqlite3.Connection):
+    """Conexão cujos cursores (inclusive os de execute/executemany diretos) são CursorMedido."""
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
 
 # ===[ GERENCIAMENTO DE BANCO DE DADOS ]===
 
-def inicializar_banco():
+class BancoDados:
+    """Pool de conexões SQLite compartilhado pelas threads da API.
+
+    O pywebview executa cada chamada JS em uma thread própria, então as conexões
+    são criadas com check_same_thread=False e emprestadas do pool apenas durante
+    o uso. Todas usam WAL, permitindo leituras simultâneas a uma escrita.
+
+    No modo multiusuário (vários computadores abrindo o mesmo arquivo numa pasta de
+    rede), o WAL não serve: ele depende de memória compartilhada entre os processos,
+    que não existe entre máquinas. O banco usa então o journal DELETE, que só depende
+    dos locks do arquivo, com gravação FULL e espera maior pelos locks dos outros usuários.
+    """
+    PRAGMAS = (
+        'PRAGMA cache_size = -16000',
+        'PRAGMA temp_store = MEMORY',
+        'PRAGMA foreign_keys = ON',
+    )
+    PRAGMAS_LOCAL = ('PRAGMA journal_mode = WAL', 'PRAGMA synchronous = NORMAL')
+    PRAGMAS_MULTIUSUARIO = ('PRAGMA journal_mode = DELETE', 'PRAGMA synchronous = FULL')
+
+    def __init__(self, caminho, tamanho_pool=4, timeout=None, multiusuario=False):
+        self.caminho = caminho
+        self.tamanho_pool = tamanho_pool
+        self.multiusuario = multiusuario
+        self.timeout = timeout or (30.0 if multiusuario else 10.0)
+        self._livres = queue.LifoQueue()
+        self._conexoes = []
+        self._trava = threading.Lock()
+
+    def _nova_conexao(self):
+        # isolation_level=None: transações são abertas explicitamente em transacao()
+        conexao = sqlite3.connect(self.caminho, timeout=self.timeout, check_same_thread=False,
+                                  isolation_level=None, cached_statements=256, factory=ConexaoMedida)
+        conexao.row_factory = sqlite3.Row
+        conexao.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+        for pragma in (self.PRAGMAS_MULTIUSUARIO if self.multiusuario else self.PRAGMAS_LOCAL) + self.PRAGMAS:
+            conexao.execute(pragma)
+        return conexao
+
+    def _emprestar(self):
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._trava:
+            if len(self._conexoes) < self.tamanho_pool:
+                conexao = self._nova_conexao()
+                self._conexoes.append(conexao)
+                return conexao
+        return self._livres.get(timeout=self.timeout)
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão do pool (modo autocommit, ideal para leituras)."""
+        conexao = self._emprestar()
+        try:
+            yield conexao
+        finally:
+            if conexao.in_transaction:
+                conexao.rollback()
+            self._livres.put(conexao)
+
+    @contextmanager
+    def transacao(self):
+        """Empresta uma conexão dentro de uma transação: COMMIT ao sair, ROLLBACK em erro."""
+        with self.conexao() as conexao:
+            # IMMEDIATE reserva a escrita logo no início, evitando 'database is locked' no meio da transação
+            conexao.execute('BEGIN IMMEDIATE')
+            try:
+                yield conexao
+            except BaseException:
+                conexao.rollback()
+                raise
+            conexao.commit()
+
+    def fechar(self):
+        """Fecha todas as conexões do pool."""
+        with self._trava:
+            while not self._livres.empty():
+                self._livres.get_nowait()
+            for conexao in self._conexoes:
+                conexao.close()
+            self._conexoes = []
+
+banco = BancoDados(ARQUIVO_DB, multiusuario=MODO_MULTIUSUARIO)
+
+def inicializar_banco(banco_dados=None):
     """Cria tabelas e executa migrações se necessário."""
-    conexao = sqlite3.connect(ARQUIVO_DB)
-    cursor = conexao.cursor()
-    
+    banco_dados = banco_dados or banco
+    with banco_dados.conexao() as conexao:
+        if conexao.execute('PRAGMA user_version').fetchone()[0] >= VERSAO_ESQUEMA:
+            return
+    with banco_dados.transacao() as conexao:
+        _criar_esquema(conexao.cursor())
+
+def colunas_tabela(cursor, tabela):
+    return {linha[1] for linha in cursor.execute(f'PRAGMA table_info({tabela})').fetchall()}
+
+def _criar_esquema(cursor):
+    """Cria/atualiza o esquema de um banco abaixo de VERSAO_ESQUEMA (todos os passos são idempotentes)."""
     # Tabela de Orçamentos
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS orcamentos (
@@ -47,7 +437,21 @@ def inicializar_banco():
             itens TEXT,
             total REAL,
             data_criacao TEXT,
-            status TEXT DEFAULT 'PENDENTE'
+            status TEXT DEFAULT 'PENDENTE',
+            qtd_itens INTEGER DEFAULT 0,
+            cliente_id INTEGER REFERENCES clientes (id)
+        )
+    ''')
+
+    # Cadastro de clientes: um registro por nome normalizado (ver chave_cliente)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            chave TEXT NOT NULL UNIQUE,
+            email TEXT,
+            telefone TEXT,
+            endereco TEXT
         )
     ''')
 
@@ -72,6 +476,34 @@ def inicializar_banco():
         )
     ''')
     
+    # Itens dos orçamentos (uma linha por item, substitui o JSON da coluna 'itens')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orcamento_itens (
+            id INTEGER PRIMARY KEY,
+            orcamento_id INTEGER NOT NULL REFERENCES orcamentos (id) ON DELETE CASCADE,
+            posicao INTEGER NOT NULL,
+            descricao TEXT NOT NULL,
+            observacao TEXT,
+            quantidade NUMERIC,
+            preco REAL,
+            total REAL
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_itens_orcamento ON orcamento_itens (orcamento_id, posicao)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_itens_descricao ON orcamento_itens (descricao COLLATE NOCASE)')
+
+    # Índice do cache de PDFs gerados (arquivos em PASTA_CACHE_PDF, nomeados pelo hash do conteúdo)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_pdf (
+            hash TEXT PRIMARY KEY,
+            orcamento_id INTEGER,
+            tamanho INTEGER,
+            ultimo_acesso REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_pdf_orcamento ON cache_pdf (orcamento_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cache_pdf_acesso ON cache_pdf (ultimo_acesso)')
+
     # Migrações
     migracoes = [
         ('configuracoes', 'caminho_salvar_pdf', 'TEXT'),
@@ -89,212 +521,1298 @@ def inicializar_banco():
         ('orcamentos', 'cliente_email', 'TEXT'),
         ('orcamentos', 'cliente_telefone', 'TEXT'),
         ('orcamentos', 'cliente_endereco', 'TEXT'),
-        ('orcamentos', 'status', 'TEXT')
+        ('orcamentos', 'status', 'TEXT'),
+        ('orcamentos', 'qtd_itens', 'INTEGER'),
+        ('orcamentos', 'cliente_id', 'INTEGER REFERENCES clientes (id)')
+    ]
+
+    colunas_existentes = {tabela: colunas_tabela(cursor, tabela) for tabela in ('configuracoes', 'orcamentos')}
+    for tabela, coluna, tipo in migracoes:
+        col_nome = coluna.split(' ')[0]
+        if col_nome in colunas_existentes[tabela]:
+            continue
+        cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN {col_nome} {tipo.replace("DEFAULT", "")}')
+        if 'DEFAULT' in tipo:
+            valor_padrao = tipo.split('DEFAULT')[1].strip()
+            cursor.execute(f"UPDATE {tabela} SET {col_nome} = {valor_padrao} WHERE {col_nome} IS NULL")
+
+    # Normaliza status antigos (nulos ou em inglês) para que os filtros usem o índice
+    cursor.execute("UPDATE orcamentos SET status = 'PENDENTE' WHERE status IS NULL OR status = 'PENDING'")
+    cursor.execute("UPDATE orcamentos SET status = 'APROVADO' WHERE status = 'APPROVED'")
+    cursor.execute("UPDATE orcamentos SET status = 'REJEITADO' WHERE status = 'REJECTED'")
+
+    # Contagem de itens armazenada (evita json.loads por linha na listagem do histórico)
+    cursor.execute('''
+        UPDATE orcamentos SET qtd_itens = CASE WHEN json_valid(itens) THEN json_array_length(itens) ELSE 0 END
+        WHERE qtd_itens IS NULL
+    ''')
+
+    # Agregados do dashboard, mantidos por triggers na mesma transação de cada escrita
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'estatisticas_status'")
+    agregados_existiam = cursor.fetchone() is not None
+    criar_estatisticas(cursor)
+    if not agregados_existiam:
+        reconstruir_estatisticas(cursor)
+
+    # Índices usados pela paginação do histórico
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orcamentos_status ON orcamentos (status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orcamentos_total ON orcamentos (COALESCE(total, 0))')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orcamentos_cliente ON orcamentos (cliente COLLATE NOCASE)')
+
+    versao_atual = cursor.execute('PRAGMA user_version').fetchone()[0]
+    for versao, migracao in MIGRACOES_VERSIONADAS:
+        if versao > versao_atual:
+            migracao(cursor)
+            cursor.execute(f'PRAGMA user_version = {versao}')
+
+def converter_datas_iso(cursor):
+    """Converte 'data_criacao' de 'dd/mm/aaaa' para 'AAAA-MM-DD' e cria os índices por data.
+
+    Datas ISO são ordenáveis e comparáveis como texto, então filtros por período e
+    agrupamentos por dia/semana/mês usam os índices em vez de converter cada linha.
+    """
+    # Os triggers de agregados extraem o mês da data: são recriados para o novo formato
+    for gatilho in ('trg_estatisticas_insercao', 'trg_estatisticas_exclusao', 'trg_estatisticas_alteracao'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {gatilho}')
+    cursor.execute('''
+        UPDATE orcamentos
+        SET data_criacao = substr(data_criacao, 7, 4) || '-' || substr(data_criacao, 4, 2) || '-' || substr(data_criacao, 1, 2)
+        WHERE data_criacao GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]'
+    ''')
+    criar_estatisticas(cursor)
+    reconstruir_estatisticas(cursor)
+
+    # (status, data, total) cobre as consultas da análise sem ler a tabela
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orcamentos_status_data ON orcamentos (status, data_criacao, total)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orcamentos_data ON orcamentos (data_criacao)')
+
+def escolher_grafia(grafias):
+    """Grafia que representa um cliente entre (nome, quantidade, ultimo_id) do mesmo nome.
+
+    Vence a mais usada; no empate, a com mais acentos, depois a com maiúsculas e minúsculas
+    ('João da Silva' antes de 'JOAO DA SILVA', que vem antes de 'joao da silva') e por fim
+    a mais recente. Volta com os espaços normalizados.
+    """
+    def pontuacao(grafia):
+        nome, quantidade, ultimo_id = grafia
+        acentos = sum(1 for letra in nome if letra != remover_acentos(letra))
+        caixa = 2 if nome != nome.upper() and nome != nome.lower() else (1 if nome.isupper() else 0)
+        return (quantidade, acentos, caixa, ultimo_id)
+    return nome_cliente(max(grafias, key=pontuacao)[0])
+
+def cadastrar_clientes(cursor):
+    """Cria o cadastro de clientes a partir dos orçamentos, unificando grafias do mesmo nome.
+
+    Nomes com a mesma chave ('João da Silva', 'joao  da silva') viram um único cliente, com
+    a grafia de escolher_grafia e os contatos mais recentes preenchidos.
+    """
+    grupos = {}
+    for nome, quantidade, ultimo_id in cursor.execute(
+            'SELECT cliente, COUNT(*), MAX(id) FROM orcamentos WHERE cliente IS NOT NULL GROUP BY cliente').fetchall():
+        chave = chave_cliente(nome)
+        if chave:
+            grupos.setdefault(chave, []).append((nome, quantidade, ultimo_id))
+
+    cursor.execute('CREATE TEMP TABLE mapa_clientes (cliente TEXT PRIMARY KEY, chave TEXT NOT NULL)')
+    cursor.executemany('INSERT OR IGNORE INTO clientes (nome, chave) VALUES (?, ?)',
+                       [(escolher_grafia(grafias), chave) for chave, grafias in grupos.items()])
+    cursor.executemany('INSERT INTO mapa_clientes (cliente, chave) VALUES (?, ?)',
+                       [(nome, chave) for chave, grafias in grupos.items() for nome, _, _ in grafias])
+    cursor.execute('''
+        UPDATE orcamentos SET cliente_id = (
+            SELECT c.id FROM mapa_clientes m JOIN clientes c ON c.chave = m.chave WHERE m.cliente = orcamentos.cliente
+        )
+    ''')
+    cursor.execute('DROP TABLE mapa_clientes')
+
+    # (cliente, status, data, total) cobre o histórico e os totais por cliente sem ler a tabela
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orcamentos_cliente_id ON orcamentos (cliente_id, status, data_criacao, total)')
+    cursor.execute('''
+        UPDATE clientes SET
+            email = (SELECT cliente_email FROM orcamentos WHERE cliente_id = clientes.id AND cliente_email != '' ORDER BY id DESC LIMIT 1),
+            telefone = (SELECT cliente_telefone FROM orcamentos WHERE cliente_id = clientes.id AND cliente_telefone != '' ORDER BY id DESC LIMIT 1),
+            endereco = (SELECT cliente_endereco FROM orcamentos WHERE cliente_id = clientes.id AND cliente_endereco != '' ORDER BY id DESC LIMIT 1)
+    ''')
+
+    # Inclui o cliente no índice da análise, para agrupar os principais clientes só pelo índice
+    cursor.execute('DROP INDEX IF EXISTS idx_orcamentos_status_data')
+    cursor.execute('CREATE INDEX idx_orcamentos_status_data ON orcamentos (status, data_criacao, total, cliente_id)')
+
+def registrar_clientes(conexao, clientes):
+    """Cadastra (ou atualiza) os clientes informados e retorna {chave: id}.
+
+    'clientes' é uma lista de (nome, email, telefone, endereco). Um cliente já cadastrado
+    mantém a grafia do nome e só tem os contatos substituídos pelos que vierem preenchidos.
+    """
+    registros = []
+    for nome, email, telefone, endereco in clientes:
+        chave = chave_cliente(nome)
+        if chave:
+            registros.append((nome_cliente(nome), chave, email or '', telefone or '', endereco or ''))
+    conexao.executemany('''
+        INSERT INTO clientes (nome, chave, email, telefone, endereco) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (chave) DO UPDATE SET
+            email = COALESCE(NULLIF(excluded.email, ''), email),
+            telefone = COALESCE(NULLIF(excluded.telefone, ''), telefone),
+            endereco = COALESCE(NULLIF(excluded.endereco, ''), endereco)
+    ''', registros)
+
+    chaves = list({registro[1] for registro in registros})
+    ids = {}
+    for inicio in range(0, len(chaves), TAMANHO_BLOCO_CLIENTES):
+        bloco = chaves[inicio:inicio + TAMANHO_BLOCO_CLIENTES]
+        marcadores = ', '.join('?' * len(bloco))
+        ids.update(conexao.execute(f'SELECT chave, id FROM clientes WHERE chave IN ({marcadores})', bloco).fetchall())
+    return ids
+
+def revisar_nomes_clientes(cursor):
+    """Escolhe de novo a grafia dos clientes já cadastrados (ver escolher_grafia).
+
+    Corrige cadastros feitos com a regra antiga, que podia ficar com 'joao  da silva'
+    ou 'Maria ' (espaços sobrando) em vez da grafia com acentos e maiúsculas.
+    """
+    grupos = {}
+    for cliente_id, nome, quantidade, ultimo_id in cursor.execute('''
+        SELECT cliente_id, cliente, COUNT(*), MAX(id) FROM orcamentos
+        WHERE cliente_id IS NOT NULL AND cliente IS NOT NULL GROUP BY cliente_id, cliente
+    ''').fetchall():
+        grupos.setdefault(cliente_id, []).append((nome, quantidade, ultimo_id))
+    cursor.executemany('UPDATE clientes SET nome = ? WHERE id = ?',
+                       [(escolher_grafia(grafias), cliente_id) for cliente_id, grafias in grupos.items()])
+
+def indexar_total_sem_nulos(cursor):
+    """Troca o índice de 'total' pelo de COALESCE(total, 0), a expressão das ordenações por valor."""
+    cursor.execute('DROP INDEX IF EXISTS idx_orcamentos_total')
+    cursor.execute('CREATE INDEX idx_orcamentos_total ON orcamentos (COALESCE(total, 0))')
+
+def migrar_itens_para_tabela(cursor):
+    """Move os itens do JSON em 'orcamentos.itens' para a tabela 'orcamento_itens'."""
+    cursor.execute('''
+        INSERT INTO orcamento_itens (orcamento_id, posicao, descricao, observacao, quantidade, preco, total)
+        SELECT o.id, j.key, COALESCE(json_extract(j.value, '$.desc'), ''), COALESCE(json_extract(j.value, '$.obs'), ''),
+               json_extract(j.value, '$.qtd'), json_extract(j.value, '$.preco'), json_extract(j.value, '$.total')
+        FROM orcamentos o, json_each(o.itens) j
+        WHERE json_valid(o.itens)
+    ''')
+    cursor.execute('''
+        UPDATE orcamentos SET
+            qtd_itens = (SELECT COUNT(*) FROM orcamento_itens i WHERE i.orcamento_id = orcamentos.id),
+            itens = NULL
+    ''')
+
+def gravar_itens(conexao, id_orcamento, itens):
+    """Sincroniza os itens de um orçamento, escrevendo apenas as linhas que mudaram."""
+    existentes = {
+        linha['posicao']: tuple(linha)[1:]
+        for linha in conexao.execute('''
+            SELECT posicao, descricao, observacao, quantidade, preco, total
+            FROM orcamento_itens WHERE orcamento_id = ?
+        ''', (id_orcamento,))
+    }
+    novos = [
+        (posicao, item['desc'], item.get('obs') or '', item['qtd'], item['preco'], item['total'])
+        for posicao, item in enumerate(itens)
     ]
+    alterados = [(id_orcamento,) + item for item in novos if existentes.get(item[0]) != item[1:]]
+
+    conexao.executemany('''
+        INSERT INTO orcamento_itens (orcamento_id, posicao, descricao, observacao, quantidade, preco, total)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (orcamento_id, posicao) DO UPDATE SET
+            descricao = excluded.descricao, observacao = excluded.observacao,
+            quantidade = excluded.quantidade, preco = excluded.preco, total = excluded.total
+    ''', alterados)
+    if len(existentes) > len(novos):
+        conexao.execute('DELETE FROM orcamento_itens WHERE orcamento_id = ? AND posicao >= ?', (id_orcamento, len(novos)))
+
+# Telefone só com dígitos, para que '6199999' encontre '(61) 9999-9...'
+SQL_TELEFONE_DIGITOS = "replace(replace(replace(replace(replace(replace(COALESCE(o.cliente_telefone, ''), '(', ''), ')', ''), '-', ''), ' ', ''), '.', ''), '+', '')"
+
+def criar_indice_busca(cursor):
+    """Cria o índice de texto completo (FTS5) dos orçamentos e indexa os existentes.
+
+    O tokenizador unicode61 com remove_diacritics ignora acentos e caixa ('eletrica'
+    encontra 'Elétrica'); os índices de prefixo aceleram buscas enquanto se digita.
+    A linha do índice usa o mesmo rowid do orçamento.
+    """
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS busca_orcamentos USING fts5 (
+            cliente, contato, endereco, itens,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_busca_exclusao AFTER DELETE ON orcamentos BEGIN
+            DELETE FROM busca_orcamentos WHERE rowid = OLD.id;
+        END
+    ''')
+    indexar_busca(cursor)
+
+def indexar_busca(conexao, primeiro_id=None, ultimo_id=None):
+    """(Re)indexa no índice de busca os orçamentos de primeiro_id a ultimo_id.
+
+    Sem ultimo_id, apenas primeiro_id; sem nenhum dos dois, todos os orçamentos.
+    """
+    filtro, valores = '', ()
+    if primeiro_id is not None:
+        filtro, valores = 'WHERE o.id BETWEEN ? AND ?', (primeiro_id, primeiro_id if ultimo_id is None else ultimo_id)
+    conexao.execute(f'DELETE FROM busca_orcamentos {"WHERE rowid BETWEEN ? AND ?" if valores else ""}', valores)
+    conexao.execute(f'''
+        INSERT INTO busca_orcamentos (rowid, cliente, contato, endereco, itens)
+        SELECT o.id, o.cliente,
+               COALESCE(o.cliente_email, '') || ' ' || COALESCE(o.cliente_telefone, '') || ' ' || {SQL_TELEFONE_DIGITOS},
+               o.cliente_endereco,
+               (SELECT group_concat(i.descricao || CASE WHEN i.observacao != '' THEN ' (' || i.observacao || ')' ELSE '' END, ' | ')
+                FROM orcamento_itens i WHERE i.orcamento_id = o.id)
+        FROM orcamentos o {filtro}
+    ''', valores)
+
+def criar_registro_manutencao(cursor):
+    """Cria a tabela com a última execução de cada tarefa agendada (backup, otimização)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS manutencao (
+            tarefa TEXT PRIMARY KEY,
+            executada_em TEXT,
+            resultado TEXT
+        )
+    ''')
+
+def controlar_versoes(cursor):
+    """Cria a versão de cada orçamento (concorrência otimista) e o registro de alterações.
+
+    'versao' é incrementada a cada UPDATE feito pela API; quem grava informa a versão
+    que leu e a gravação é recusada se outro usuário alterou o orçamento nesse meio-tempo.
+    A tabela 'alteracoes' guarda, por orçamento, só a última alteração com um número de
+    sequência crescente: cada cliente pede o que mudou desde a última sequência que viu
+    (obter_alteracoes) e atualiza apenas essas linhas. Com uma linha por orçamento, a
+    tabela não cresce com o número de edições.
+    """
+    if 'versao' not in colunas_tabela(cursor, 'orcamentos'):
+        cursor.execute('ALTER TABLE orcamentos ADD COLUMN versao INTEGER NOT NULL DEFAULT 1')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alteracoes (
+            orcamento_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            operacao TEXT NOT NULL,
+            quando TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_alteracoes_seq ON alteracoes (seq)')
+    for gatilho, evento, linha, operacao in (
+        ('trg_alteracoes_insercao', 'INSERT', 'NEW', 'insercao'),
+        ('trg_alteracoes_alteracao', 'UPDATE', 'NEW', 'alteracao'),
+        ('trg_alteracoes_exclusao', 'DELETE', 'OLD', 'exclusao'),
+    ):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {gatilho} AFTER {evento} ON orcamentos BEGIN
+                INSERT OR REPLACE INTO alteracoes (orcamento_id, seq, operacao, quando)
+                VALUES ({linha}.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM alteracoes), '{operacao}',
+                        strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'));
+            END
+        ''')
+
+class ConflitoVersao(Exception):
+    """O orçamento foi alterado (ou excluído) por outro usuário depois de lido."""
+    def __init__(self, id_orcamento, versao_atual):
+        self.id_orcamento = id_orcamento
+        self.versao_atual = versao_atual
+        if versao_atual is None:
+            mensagem = f'O orçamento #{id_orcamento} foi excluído por outro usuário.'
+        else:
+            mensagem = f'O orçamento #{id_orcamento} foi alterado por outro usuário enquanto você o editava.'
+        super().__init__(mensagem)
+
+def verificar_gravacao(conexao, cursor, id_orcamento):
+    """Lança ConflitoVersao se a gravação condicionada à versão não afetou nenhuma linha."""
+    if cursor.rowcount == 0:
+        linha = conexao.execute('SELECT versao FROM orcamentos WHERE id = ?', (id_orcamento,)).fetchone()
+        raise ConflitoVersao(id_orcamento, linha['versao'] if linha else None)
+
+def resposta_conflito(erro):
+    return {'status': 'erro', 'conflito': True, 'mensagem': str(erro), 'versao_atual': erro.versao_atual}
+
+# Migrações de dados versionadas: cada passo roda uma única vez, controlado por PRAGMA user_version.
+# Um banco já na última versão não executa nada além da leitura do user_version.
+MIGRACOES_VERSIONADAS = [
+    (1, migrar_itens_para_tabela),
+    (2, criar_indice_busca),
+    (3, converter_datas_iso),
+    (4, cadastrar_clientes),
+    (5, criar_registro_manutencao),
+    (6, controlar_versoes),
+    (7, revisar_nomes_clientes),
+    (8, indexar_total_sem_nulos),
+]
+VERSAO_ESQUEMA = MIGRACOES_VERSIONADAS[-1][0]
+
+def consulta_busca(termo):
+    """Converte o texto digitado em uma consulta FTS5: todas as palavras, cada uma como prefixo.
+
+    Retorna None se o texto não tiver nenhuma palavra pesquisável.
+    """
+    palavras = re.findall(r'\w+', termo or '')
+    if not palavras:
+        return None
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+def item_da_linha(linha):
+    """Converte uma linha de 'orcamento_itens' no formato de item usado pela interface."""
+    return {'desc': linha['descricao'], 'obs': linha['observacao'] or '', 'qtd': linha['quantidade'],
+            'preco': linha['preco'], 'total': linha['total']}
+
+def carregar_itens(conexao, id_orcamento):
+    """Retorna os itens de um orçamento no formato usado pela interface."""
+    linhas = conexao.execute('''
+        SELECT descricao, observacao, quantidade, preco, total FROM orcamento_itens
+        WHERE orcamento_id = ? ORDER BY posicao
+    ''', (id_orcamento,)).fetchall()
+    return [item_da_linha(linha) for linha in linhas]
+
+def carregar_itens_varios(conexao, ids):
+    """Carrega os itens de vários orçamentos em uma única consulta: {id: [itens]}."""
+    marcadores = ', '.join('?' * len(ids))
+    itens = {id_orcamento: [] for id_orcamento in ids}
+    for linha in conexao.execute(f'''
+        SELECT orcamento_id, descricao, observacao, quantidade, preco, total FROM orcamento_itens
+        WHERE orcamento_id IN ({marcadores}) ORDER BY orcamento_id, posicao
+    ''', ids):
+        itens[linha['orcamento_id']].append(item_da_linha(linha))
+    return itens
+
+def sql_mes(coluna):
+    """Expressão SQL que extrai 'AAAA-MM' de uma data 'AAAA-MM-DD'."""
+    return f"substr({coluna}, 1, 7)"
+
+# Agrupamentos aceitos pela análise de faturamento: expressão SQL do período de uma data 'AAAA-MM-DD'
+PERIODOS_ANALISE = {
+    'dia': lambda coluna: coluna,
+    'semana': lambda coluna: f"date({coluna}, '-6 days', 'weekday 1')",  # Segunda-feira da semana
+    'mes': sql_mes,
+}
+
+def filtro_orcamentos(parametros, tabela='orcamentos'):
+    """Cláusula WHERE (ou '') e valores para os filtros 'status', 'data_inicio' e 'data_fim' ('AAAA-MM-DD').
+
+    'mais_antigos_que' (dias) restringe aos orçamentos criados antes de hoje menos esse número de dias.
+    """
+    condicoes, valores = [], []
+    if parametros.get('status'):
+        condicoes.append(f'{tabela}.status = ?')
+        valores.append(parametros['status'])
+    if parametros.get('data_inicio'):
+        condicoes.append(f'{tabela}.data_criacao >= ?')
+        valores.append(parametros['data_inicio'])
+    if parametros.get('data_fim'):
+        condicoes.append(f'{tabela}.data_criacao <= ?')
+        valores.append(parametros['data_fim'])
+    if parametros.get('mais_antigos_que') is not None:
+        condicoes.append(f'{tabela}.data_criacao < ?')
+        valores.append((datetime.now() - timedelta(days=int(parametros['mais_antigos_que']))).strftime('%Y-%m-%d'))
+    return ('WHERE ' + ' AND '.join(condicoes) if condicoes else ''), valores
+
+def criar_estatisticas(cursor):
+    """Cria as tabelas de agregados e os triggers que as mantêm atualizadas."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS estatisticas_status (
+            status TEXT PRIMARY KEY,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            valor REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS estatisticas_mensais (
+            mes TEXT,
+            status TEXT,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            valor REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (mes, status)
+        )
+    ''')
+
+    def somar(prefixo, sinal):
+        status = f"COALESCE({prefixo}.status, 'PENDENTE')"
+        valor = f"{sinal}COALESCE({prefixo}.total, 0)"
+        return f'''
+            INSERT INTO estatisticas_status (status, quantidade, valor) VALUES ({status}, {sinal}1, {valor})
+                ON CONFLICT(status) DO UPDATE SET quantidade = quantidade + excluded.quantidade, valor = valor + excluded.valor;
+            INSERT INTO estatisticas_mensais (mes, status, quantidade, valor) VALUES ({sql_mes(prefixo + '.data_criacao')}, {status}, {sinal}1, {valor})
+                ON CONFLICT(mes, status) DO UPDATE SET quantidade = quantidade + excluded.quantidade, valor = valor + excluded.valor;
+        '''
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_estatisticas_insercao AFTER INSERT ON orcamentos BEGIN
+            {somar('NEW', '')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_estatisticas_exclusao AFTER DELETE ON orcamentos BEGIN
+            {somar('OLD', '-')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_estatisticas_alteracao AFTER UPDATE OF status, total, data_criacao ON orcamentos BEGIN
+            {somar('OLD', '-')}
+            {somar('NEW', '')}
+        END
+    ''')
+
+def reconstruir_estatisticas(cursor):
+    """Recalcula os agregados do dashboard a partir da tabela de orçamentos."""
+    cursor.execute('DELETE FROM estatisticas_status')
+    cursor.execute('DELETE FROM estatisticas_mensais')
+    cursor.execute('''
+        INSERT INTO estatisticas_status (status, quantidade, valor)
+        SELECT COALESCE(status, 'PENDENTE'), COUNT(*), COALESCE(SUM(total), 0) FROM orcamentos GROUP BY 1
+    ''')
+    cursor.execute(f'''
+        INSERT INTO estatisticas_mensais (mes, status, quantidade, valor)
+        SELECT {sql_mes('data_criacao')}, COALESCE(status, 'PENDENTE'), COUNT(*), COALESCE(SUM(total), 0)
+        FROM orcamentos GROUP BY 1, 2
+    ''')
+
+def verificar_estatisticas(cursor):
+    """Compara os agregados armazenados com um recálculo completo e retorna as divergências."""
+    cursor.execute('''
+        SELECT COALESCE(status, 'PENDENTE'), COUNT(*), COALESCE(SUM(total), 0) FROM orcamentos GROUP BY 1
+    ''')
+    esperado = {linha[0]: (linha[1], linha[2]) for linha in cursor.fetchall()}
+    cursor.execute('SELECT status, quantidade, valor FROM estatisticas_status WHERE quantidade != 0 OR valor != 0')
+    armazenado = {linha[0]: (linha[1], linha[2]) for linha in cursor.fetchall()}
+
+    divergencias = []
+    for status in sorted(set(esperado) | set(armazenado)):
+        qtd_esp, valor_esp = esperado.get(status, (0, 0.0))
+        qtd_arm, valor_arm = armazenado.get(status, (0, 0.0))
+        if qtd_esp != qtd_arm or abs(valor_esp - valor_arm) > 0.005:
+            divergencias.append({
+                'status': status,
+                'esperado': {'quantidade': qtd_esp, 'valor': round(valor_esp, 2)},
+                'armazenado': {'quantidade': qtd_arm, 'valor': round(valor_arm, 2)}
+            })
+    return divergencias
+
+# ===[ FUNÇÕES AUXILIARES ]===
+
+def abrir_arquivo_externo(caminho):
+    """Abre o arquivo com o programa padrão do sistema (sem esperar o visualizador)."""
+    if platform.system() == 'Darwin':
+        subprocess.Popen(('open', caminho))
+    elif platform.system() == 'Windows':
+        os.startfile(caminho)
+    else:
+        subprocess.Popen(('xdg-open', caminho))
+
+def remover_acentos(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+def nome_cliente(nome):
+    """Nome como é exibido no cadastro: sem espaços nas pontas nem repetidos no meio."""
+    return ' '.join(str(nome or '').split())
+
+def chave_cliente(nome):
+    """Nome normalizado que identifica um cliente: sem acentos, caixa, pontuação e espaços repetidos."""
+    return re.sub(r'[^a-z0-9]+', ' ', remover_acentos(str(nome or '').lower())).strip()
+
+def data_iso(valor):
+    """Aceita 'dd/mm/aaaa' (formato da interface) ou 'AAAA-MM-DD' e devolve 'AAAA-MM-DD', como é salvo no banco."""
+    texto = str(valor or '').strip()
+    for formato in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(texto[:10], formato).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    raise ValueError(f"data inválida: '{texto}'")
+
+def data_br(valor):
+    """Formata uma data 'AAAA-MM-DD' do banco como 'dd/mm/aaaa' para exibição."""
+    if valor and re.match(r'^\d{4}-\d{2}-\d{2}$', valor):
+        return f"{valor[8:10]}/{valor[5:7]}/{valor[:4]}"
+    return valor
+
+def sanitizar_nome_arquivo(nome):
+    """Remove caracteres inválidos para nomes de arquivo."""
+    return re.sub(r'[<>:"/\\|?*]', '', nome).strip()
+
+# ===[ GERAÇÃO DE PDF ]===
+# O layout do documento fica em relatorio.py, carregado só quando um PDF é gerado
+
+def invalidar_modelo_pdf():
+    """Descarta o modelo de PDF em cache, se o módulo de relatório já foi carregado."""
+    relatorio = sys.modules.get('relatorio')
+    if relatorio is not None:
+        relatorio.invalidar_modelo_pdf()
+
+def montar_contexto_pdf(config_linha):
+    """Extrai da linha de configurações os dados necessários para gerar PDFs."""
+    config = {k: config_linha[k] for k in config_linha.keys()} if config_linha else {}
+    return {
+        'dados_empresa': {
+            'nome': config.get('nome_empresa', 'Minha Empresa'),
+            'razao_social': config.get('razao_social', ''),
+            'cnpj': config.get('cnpj', ''),
+            'endereco': config.get('endereco', ''),
+            'telefone': config.get('telefone', ''),
+            'caminho_logo': config.get('caminho_logo', '')
+        },
+        'metodos_pagamento': {
+            'pix': bool(config.get('pagamento_pix', 0)),
+            'credito': bool(config.get('pagamento_credito', 0)),
+            'debito': bool(config.get('pagamento_debito', 0)),
+            'dinheiro': bool(config.get('pagamento_dinheiro', 0))
+        },
+        'texto_rodape': config.get('texto_rodape', ''),
+        'salvar_auto': bool(config.get('salvar_auto', 1)),
+        'caminho_salvar': config.get('caminho_salvar_pdf', ''),
+        'criar_subpasta': bool(config.get('criar_subpasta', 0))
+    }
+
+# Orçamento com o nome do cliente no cadastro, que dá nome à subpasta dos PDFs
+SQL_ORCAMENTO_PDF = 'SELECT o.*, c.nome AS cliente_cadastro FROM orcamentos o LEFT JOIN clientes c ON c.id = o.cliente_id'
+
+def montar_orcamento_pdf(linha_orc, itens):
+    """Converte a linha do orçamento (lida com SQL_ORCAMENTO_PDF) no dicionário usado pelo RelatorioPDF."""
+    return {
+        'id': linha_orc['id'],
+        'cliente': linha_orc['cliente'],
+        'pasta_cliente': linha_orc['cliente_cadastro'] or linha_orc['cliente'],
+        'email': linha_orc['cliente_email'],
+        'telefone': linha_orc['cliente_telefone'],
+        'endereco': linha_orc['cliente_endereco'],
+        'itens': itens,
+        'total': linha_orc['total'],
+        'data_criacao': data_br(linha_orc['data_criacao'])
+    }
+
+def diretorio_salvamento(contexto, cliente):
+    """Pasta configurada para os PDFs, com a subpasta do cliente quando habilitada.
+
+    Recebe o nome do cadastro ('pasta_cliente'), para que grafias diferentes do mesmo
+    cliente caiam na mesma pasta.
+    """
+    dir_salvamento = contexto['caminho_salvar']
+    if contexto['criar_subpasta']:
+        dir_salvamento = os.path.join(dir_salvamento, sanitizar_nome_arquivo(cliente))
+        os.makedirs(dir_salvamento, exist_ok=True)
+    return dir_salvamento
+
+def nome_arquivo_pdf(orcamento):
+    return f"Orcamento_{orcamento['id']}_{sanitizar_nome_arquivo(orcamento['cliente'])}.pdf"
+
+def renderizar_pdf(contexto, orcamento, caminho_final, tempos=None):
+    """Monta o PDF de um orçamento e grava em 'caminho_final'.
+
+    O módulo relatorio (FPDF e Pillow) só é importado aqui, na primeira geração.
+    Função de módulo (e não método) para poder rodar nos processos do exportador em lote.
+    Com 'tempos', recebe a duração de cada fase (ver relatorio.renderizar_pdf).
+    """
+    import relatorio
+    return relatorio.renderizar_pdf(contexto, orcamento, caminho_final, tempos)
+
+def renderizar_consolidado(contexto, orcamentos, caminho_final, titulo=''):
+    """Grava vários orçamentos (iterável) em um único PDF com capa de totais (ver relatorio.renderizar_consolidado)."""
+    import relatorio
+    return relatorio.renderizar_consolidado(contexto, orcamentos, caminho_final, titulo, datetime.now().strftime('%d/%m/%Y'))
+
+def descrever_filtro_pdf(parametros):
+    """Texto da capa do consolidado descrevendo quais orçamentos entraram."""
+    if parametros.get('ids'):
+        return f"{len(parametros['ids'])} orçamento(s) selecionado(s)"
+    partes = []
+    if parametros.get('status'):
+        partes.append(f"Status: {parametros['status']}")
+    if parametros.get('data_inicio') or parametros.get('data_fim'):
+        inicio = data_br(parametros['data_inicio']) if parametros.get('data_inicio') else 'o início'
+        fim = data_br(parametros['data_fim']) if parametros.get('data_fim') else 'hoje'
+        partes.append(f"Período: {inicio} a {fim}")
+    if parametros.get('mais_antigos_que') is not None:
+        partes.append(f"Criados há mais de {parametros['mais_antigos_que']} dia(s)")
+    return ' | '.join(partes) or 'Todos os orçamentos'
+
+# ===[ CACHE DE PDFs ]===
+
+_hashes_logo = {}
+
+def hash_logo(caminho):
+    """SHA-256 do arquivo de logo, recalculado só quando o arquivo muda (mtime/tamanho)."""
+    try:
+        estado = os.stat(caminho)
+    except (OSError, TypeError):
+        return None
+    assinatura = (estado.st_mtime_ns, estado.st_size)
+    guardado = _hashes_logo.get(caminho)
+    if guardado is None or guardado[0] != assinatura:
+        with open(caminho, 'rb') as arquivo:
+            guardado = _hashes_logo[caminho] = (assinatura, hashlib.sha256(arquivo.read()).hexdigest())
+    return guardado[1]
+
+def chave_cache_pdf(contexto, orcamento):
+    """Hash de tudo que influencia o PDF: orçamento, configurações, logo e versão do layout."""
+    conteudo = json.dumps({
+        'versao': VERSAO_LAYOUT_PDF,
+        'orcamento': orcamento,
+        'empresa': contexto['dados_empresa'],
+        'pagamentos': contexto['metodos_pagamento'],
+        'rodape': contexto['texto_rodape'],
+        'logo': hash_logo(contexto['dados_empresa'].get('caminho_logo')),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+class CachePDF:
+    """Cache em disco dos PDFs gerados, endereçado pelo conteúdo e limitado por tamanho (LRU).
+
+    O índice fica no banco e os arquivos na pasta local: com o banco compartilhado entre
+    máquinas (modo multiusuário) os dois deixariam de corresponder, então o cache é
+    desligado (ativo=False) e todo PDF é gerado de novo.
+    """
+    def __init__(self, banco_dados, pasta, limite_bytes=LIMITE_CACHE_PDF_BYTES, ativo=True):
+        self.banco = banco_dados
+        self.pasta = pasta
+        self.limite_bytes = limite_bytes
+        self.ativo = ativo
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f'{chave}.pdf')
+
+    def copiar(self, chave, destino):
+        """Copia o PDF em cache para 'destino'. Retorna False se não houver cache válido."""
+        if not self.ativo:
+            return False
+        with self.banco.conexao() as conexao:
+            encontrado = conexao.execute('SELECT 1 FROM cache_pdf WHERE hash = ?', (chave,)).fetchone()
+        if not encontrado:
+            return False
+        try:
+            if os.path.abspath(destino) != os.path.abspath(self._caminho(chave)):
+                shutil.copyfile(self._caminho(chave), destino)
+        except FileNotFoundError:
+            with self.banco.transacao() as conexao:
+                conexao.execute('DELETE FROM cache_pdf WHERE hash = ?', (chave,))
+            return False
+        with self.banco.transacao() as conexao:
+            conexao.execute('UPDATE cache_pdf SET ultimo_acesso = ? WHERE hash = ?', (time.time(), chave))
+        return True
+
+    def guardar(self, chave, id_orcamento, origem):
+        """Guarda uma cópia do PDF recém-gerado e descarta os menos usados se passar do limite."""
+        if not self.ativo:
+            return
+        os.makedirs(self.pasta, exist_ok=True)
+        temporario = self._caminho(chave) + '.tmp'
+        shutil.copyfile(origem, temporario)
+        os.replace(temporario, self._caminho(chave))
+        with self.banco.transacao() as conexao:
+            conexao.execute('''
+                INSERT OR REPLACE INTO cache_pdf (hash, orcamento_id, tamanho, ultimo_acesso) VALUES (?, ?, ?, ?)
+            ''', (chave, id_orcamento, os.path.getsize(origem), time.time()))
+            total = conexao.execute('SELECT COALESCE(SUM(tamanho), 0) FROM cache_pdf').fetchone()[0]
+            removidos = []
+            if total > self.limite_bytes:
+                for linha in conexao.execute('SELECT hash, tamanho FROM cache_pdf ORDER BY ultimo_acesso'):
+                    if total <= self.limite_bytes:
+                        break
+                    removidos.append(linha['hash'])
+                    total -= linha['tamanho']
+                conexao.executemany('DELETE FROM cache_pdf WHERE hash = ?', [(chave_antiga,) for chave_antiga in removidos])
+        self.apagar_arquivos(removidos)
+
+    def invalidar_orcamento(self, conexao, id_orcamento):
+        """Remove as entradas de um orçamento (dentro da transação de quem alterou o orçamento)."""
+        if not self.ativo:
+            return []
+        removidos = [linha[0] for linha in conexao.execute('SELECT hash FROM cache_pdf WHERE orcamento_id = ?', (id_orcamento,))]
+        conexao.execute('DELETE FROM cache_pdf WHERE orcamento_id = ?', (id_orcamento,))
+        return removidos
+
+    def invalidar_orcamentos(self, conexao, ids):
+        """Como invalidar_orcamento, para vários orçamentos de uma vez."""
+        if not self.ativo:
+            return []
+        removidos = []
+        for inicio in range(0, len(ids), TAMANHO_BLOCO_ACAO_LOTE):
+            bloco = ids[inicio:inicio + TAMANHO_BLOCO_ACAO_LOTE]
+            marcadores = ', '.join('?' * len(bloco))
+            removidos += [linha[0] for linha in conexao.execute(f'SELECT hash FROM cache_pdf WHERE orcamento_id IN ({marcadores})', bloco)]
+            conexao.execute(f'DELETE FROM cache_pdf WHERE orcamento_id IN ({marcadores})', bloco)
+        return removidos
+
+    def invalidar_tudo(self, conexao):
+        if not self.ativo:
+            return []
+        removidos = [linha[0] for linha in conexao.execute('SELECT hash FROM cache_pdf')]
+        conexao.execute('DELETE FROM cache_pdf')
+        return removidos
+
+    def apagar_arquivos(self, chaves):
+        for chave in chaves:
+            try:
+                os.remove(self._caminho(chave))
+            except OSError:
+                pass
+
+# ===[ LOGOTIPO ]===
+
+# O logo ocupa 30 mm de largura no cabeçalho do PDF (RelatorioPDF.header): 300 dpi bastam para impressão
+LARGURA_LOGO_MM = 30
+DPI_LOGO = 300
+VARIANTES_LOGO = {
+    'pdf': round(LARGURA_LOGO_MM / 25.4 * DPI_LOGO),  # 354 px
+    'previa': 160,                                     # miniatura da tela de configurações (80 px em telas 2x)
+}
+QUALIDADE_JPEG_LOGO = 90
+# Acima de tantas cores a imagem é tratada como foto (JPEG); abaixo, como arte (PNG com paleta)
+LIMITE_CORES_PALETA_LOGO = 4096
+
+def caminho_variante_logo(pasta, chave, variante):
+    """Arquivo já gerado de uma variante do logo (PNG ou JPEG), ou None."""
+    for extensao in ('png', 'jpg'):
+        caminho = os.path.join(pasta, f'{chave}_{variante}.{extensao}')
+        if os.path.exists(caminho):
+            return caminho
+    return None
+
+def processar_logo(origem, pasta_cache=None):
+    """Gera as variantes otimizadas do logo (VARIANTES_LOGO) e retorna {variante: caminho}.
+
+    JPEGs são decodificados já reduzidos (Image.draft: escala de 1/2 a 1/8 direto do DCT),
+    sem carregar a foto inteira na memória. A imagem é reduzida à resolução de impressão,
+    aplicada sobre branco (o fundo do cabeçalho, dispensando o canal alfa) e centralizada
+    em um quadrado; artes com poucas cores viram PNG com paleta e fotos viram JPEG.
+    As variantes ficam em cache pelo hash do arquivo de origem.
+    """
+    from PIL import Image, ImageOps
+    pasta_cache = pasta_cache or PASTA_CACHE_LOGO
+    chave = hash_logo(origem)
+    if chave is None:
+        raise ValueError(f"arquivo não encontrado: '{origem}'")
+    chave = chave[:32]
+
+    variantes = {variante: caminho_variante_logo(pasta_cache, chave, variante) for variante in VARIANTES_LOGO}
+    if all(variantes.values()):
+        return variantes
+
+    maior = max(VARIANTES_LOGO.values())
+    with Image.open(origem) as original:
+        original.draft('RGB', (maior, maior))  # Só tem efeito em JPEG
+        imagem = ImageOps.exif_transpose(original)
+    imagem.thumbnail((maior, maior), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if imagem.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagem.info:
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, 'white')
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        imagem = fundo
+    else:
+        imagem = imagem.convert('RGB')
+
+    os.makedirs(pasta_cache, exist_ok=True)
+    for variante, lado in VARIANTES_LOGO.items():
+        if variantes[variante]:
+            continue
+        reduzida = imagem.copy()
+        reduzida.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        quadrado = Image.new('RGB', (max(reduzida.size),) * 2, 'white')
+        quadrado.paste(reduzida, ((quadrado.width - reduzida.width) // 2, (quadrado.height - reduzida.height) // 2))
+
+        cores = quadrado.getcolors(LIMITE_CORES_PALETA_LOGO)
+        if cores is None:
+            destino = os.path.join(pasta_cache, f'{chave}_{variante}.jpg')
+            quadrado.save(destino + '.parcial', 'JPEG', quality=QUALIDADE_JPEG_LOGO, optimize=True, subsampling=0)
+        else:
+            destino = os.path.join(pasta_cache, f'{chave}_{variante}.png')
+            paleta = quadrado.quantize(colors=min(256, len(cores)), dither=Image.Dither.NONE if len(cores) <= 256 else Image.Dither.FLOYDSTEINBERG)
+            paleta.save(destino + '.parcial', 'PNG', optimize=True)
+        os.replace(destino + '.parcial', destino)
+        variantes[variante] = destino
+    return variantes
+
+def instalar_logo(origem, destino_base=None, pasta_cache=None):
+    """Otimiza o logo e o copia para o arquivo usado pelos PDFs; retorna caminhos e a economia obtida."""
+    from PIL import Image
+    inicio = time.perf_counter()
+    with Image.open(origem) as imagem:
+        dimensoes_originais = imagem.size
+    tamanho_original = os.path.getsize(origem)  # Antes da cópia: a origem pode ser o próprio ARQUIVO_LOGO
+    variantes = processar_logo(origem, pasta_cache)
+
+    # O PNG de 3300x3300 antigo (ou o JPEG da foto anterior) é substituído pelo novo formato
+    destino_base = os.path.splitext(destino_base or ARQUIVO_LOGO)[0]
+    extensao = os.path.splitext(variantes['pdf'])[1]
+    destino = destino_base + extensao
+    shutil.copyfile(variantes['pdf'], destino + '.parcial')
+    os.replace(destino + '.parcial', destino)
+    for antigo in ('.png', '.jpg'):
+        if antigo != extensao and os.path.exists(destino_base + antigo):
+            os.remove(destino_base + antigo)
+
+    with Image.open(destino) as imagem:
+        dimensoes = imagem.size
+    tamanho = os.path.getsize(destino)
+    return {
+        'caminho': destino,
+        'previa': variantes['previa'],
+        'formato': 'JPEG' if extensao == '.jpg' else 'PNG',
+        'dimensoes_originais': list(dimensoes_originais),
+        'dimensoes': list(dimensoes),
+        'tamanho_original': tamanho_original,
+        'tamanho': tamanho,
+        'economia_pct': round((1 - tamanho / tamanho_original) * 100, 1) if tamanho_original else 0,
+        'duracao': round(time.perf_counter() - inicio, 3),
+    }
+
+# ===[ IMPORTAÇÃO EM MASSA ]===
+
+# Cabeçalhos aceitos no CSV (sem acento/caixa) -> campo interno
+COLUNAS_CSV_IMPORTACAO = {
+    'orcamento': 'orcamento', 'numero': 'orcamento',
+    'cliente': 'cliente', 'email': 'email', 'telefone': 'telefone', 'endereco': 'endereco',
+    'data': 'data', 'status': 'status',
+    'descricao': 'desc', 'desc': 'desc', 'observacao': 'obs', 'obs': 'obs',
+    'quantidade': 'qtd', 'qtd': 'qtd', 'preco': 'preco', 'total': 'total',
+}
+
+def converter_numero(valor):
+    """Aceita números e textos como '1.234,56', 'R$ 10,00' ou '10.5'."""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return valor
+    texto = str(valor or '').replace('R$', '').replace(' ', '').strip()
+    if not texto:
+        raise ValueError('valor numérico vazio')
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        numero = float(texto)
+    except ValueError:
+        raise ValueError(f"número inválido: '{valor}'")
+    return int(numero) if numero.is_integer() else numero
+
+def validar_orcamento_importacao(dados):
+    """Valida e normaliza um orçamento importado. Levanta ValueError com o motivo da rejeição."""
+    cliente = str(dados.get('cliente') or '').strip()
+    if not cliente:
+        raise ValueError('cliente não informado')
+    status = str(dados.get('status') or 'PENDENTE').strip().upper()
+    if status not in STATUS_VALIDOS:
+        raise ValueError(f"status inválido: '{status}'")
+
+    itens = []
+    for posicao, item in enumerate(dados.get('itens') or [], start=1):
+        desc = str(item.get('desc') or '').strip()
+        if not desc:
+            raise ValueError(f'item {posicao} sem descrição')
+        try:
+            qtd = 1 if item.get('qtd') in (None, '') else converter_numero(item['qtd'])  # Sem quantidade: 1
+            preco = converter_numero(item.get('preco'))
+            total = converter_numero(item['total']) if item.get('total') not in (None, '') else round(qtd * preco, 2)
+        except ValueError as e:
+            raise ValueError(f'item {posicao}: {e}')
+        itens.append({'desc': desc, 'obs': str(item.get('obs') or '').strip(), 'qtd': qtd, 'preco': preco, 'total': total})
+    if not itens:
+        raise ValueError('orçamento sem itens')
+
+    return {
+        'cliente': cliente,
+        'email': str(dados.get('email') or '').strip(),
+        'telefone': str(dados.get('telefone') or '').strip(),
+        'endereco': str(dados.get('endereco') or '').strip(),
+        'data': data_iso(dados.get('data') or datetime.now().strftime('%Y-%m-%d')),
+        'status': status,
+        'itens': itens,
+        'total': round(sum(item['total'] for item in itens), 2),
+    }
+
+def ler_jsonl_importacao(arquivo):
+    """Gera (linha, orçamento) de um arquivo JSON Lines: um orçamento por linha."""
+    for numero, linha in enumerate(arquivo, start=1):
+        if linha.strip():
+            try:
+                yield numero, json.loads(linha)
+            except ValueError as e:
+                yield numero, e
+
+def ler_csv_importacao(arquivo):
+    """Gera (linha, orçamento) de um CSV com um item por linha.
+
+    Linhas consecutivas com o mesmo valor na coluna 'orcamento' formam um único
+    orçamento; sem essa coluna, cada linha é um orçamento com um item. O separador
+    (',' ou ';') é detectado pelo início do arquivo.
+    """
+    import csv
+
+    amostra = arquivo.read(4096)
+    arquivo.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.reader(arquivo, dialeto)
+    cabecalho = [COLUNAS_CSV_IMPORTACAO.get(normalizar_cabecalho(coluna)) for coluna in next(leitor, [])]
+
+    def registros():
+        for numero, valores in enumerate(leitor, start=2):
+            if any(valor.strip() for valor in valores):
+                yield numero, {campo: valor for campo, valor in zip(cabecalho, valores) if campo}
+
+    for _, grupo in itertools.groupby(registros(), key=lambda registro: registro[1].get('orcamento') or registro[0]):
+        grupo = list(grupo)
+        numero, primeiro = grupo[0]
+        orcamento = {campo: primeiro.get(campo) for campo in ('cliente', 'email', 'telefone', 'endereco', 'data', 'status')}
+        orcamento['itens'] = [
+            {campo: registro[campo] for campo in ('desc', 'obs', 'qtd', 'preco', 'total') if campo in registro}
+            for _, registro in grupo if registro.get('desc')
+        ]
+        yield numero, orcamento
+
+def normalizar_cabecalho(texto):
+    return re.sub(r'[^a-z]', '', remover_acentos(texto.lower()))  # 'E-mail' -> 'email'
+
+def importar_orcamentos(banco_dados, caminho, formato=None, ao_rejeitar=None, tamanho_lote=TAMANHO_LOTE_IMPORTACAO):
+    """Importa orçamentos de um CSV ou JSON Lines sem carregar o arquivo inteiro na memória.
+
+    Os registros válidos são gravados em transações de 'tamanho_lote' orçamentos com
+    executemany (orçamentos, itens e índice de busca). Cada rejeição é passada a
+    ao_rejeitar(linha, mensagem), se informado. Retorna o resumo da importação.
+    """
+    formato = (formato or os.path.splitext(caminho)[1].lstrip('.')).lower()
+    if formato not in ('csv', 'jsonl', 'ndjson'):
+        raise ValueError(f"Formato não suportado: '{formato}' (use CSV ou JSON Lines)")
+
+    inicio = time.perf_counter()
+    resumo = {'importados': 0, 'itens': 0, 'rejeitados': 0, 'rejeicoes': []}
+
+    def rejeitar(linha, mensagem):
+        resumo['rejeitados'] += 1
+        if len(resumo['rejeicoes']) < LIMITE_REJEICOES_RESUMO:
+            resumo['rejeicoes'].append({'linha': linha, 'mensagem': mensagem})
+        if ao_rejeitar:
+            ao_rejeitar(linha, mensagem)
+
+    # utf-8-sig: planilhas exportadas pelo Excel começam com BOM
+    with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+        leitor = ler_csv_importacao(arquivo) if formato == 'csv' else ler_jsonl_importacao(arquivo)
+        lote = []
+        for linha, dados in leitor:
+            try:
+                if isinstance(dados, Exception):
+                    raise ValueError(f'JSON inválido: {dados}')
+                lote.append(validar_orcamento_importacao(dados))
+            except (ValueError, TypeError, AttributeError) as e:
+                rejeitar(linha, str(e))
+                continue
+            if len(lote) >= tamanho_lote:
+                gravar_lote_importacao(banco_dados, lote, resumo)
+                lote = []
+        if lote:
+            gravar_lote_importacao(banco_dados, lote, resumo)
+
+    resumo['duracao'] = round(time.perf_counter() - inicio, 3)
+    resumo['por_segundo'] = round(resumo['importados'] / resumo['duracao']) if resumo['duracao'] else resumo['importados']
+    return resumo
+
+def gravar_lote_importacao(banco_dados, lote, resumo):
+    """Grava um lote de orçamentos validados em uma única transação."""
+    with banco_dados.transacao() as conexao:
+        # Com BEGIN IMMEDIATE ninguém mais escreve, então os ids podem ser reservados aqui
+        ultimo = conexao.execute("SELECT seq FROM sqlite_sequence WHERE name = 'orcamentos'").fetchone()
+        maior = conexao.execute('SELECT COALESCE(MAX(id), 0) FROM orcamentos').fetchone()[0]
+        primeiro_id = max(ultimo[0] if ultimo else 0, maior) + 1
+        clientes = registrar_clientes(conexao, [(orc['cliente'], orc['email'], orc['telefone'], orc['endereco']) for orc in lote])
+
+        conexao.executemany('''
+            INSERT INTO orcamentos
+            (id, cliente, cliente_email, cliente_telefone, cliente_endereco, qtd_itens, total, data_criacao, status, cliente_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (primeiro_id + i, orc['cliente'], orc['email'], orc['telefone'], orc['endereco'],
+             len(orc['itens']), orc['total'], orc['data'], orc['status'], clientes.get(chave_cliente(orc['cliente'])))
+            for i, orc in enumerate(lote)
+        ])
+        itens = [
+            (primeiro_id + i, posicao, item['desc'], item['obs'], item['qtd'], item['preco'], item['total'])
+            for i, orc in enumerate(lote) for posicao, item in enumerate(orc['itens'])
+        ]
+        conexao.executemany('''
+            INSERT INTO orcamento_itens (orcamento_id, posicao, descricao, observacao, quantidade, preco, total)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', itens)
+        indexar_busca(conexao, primeiro_id, primeiro_id + len(lote) - 1)
+
+    resumo['importados'] += len(lote)
+    resumo['itens'] += len(itens)
+
+# ===[ EXPORTAÇÃO DE DADOS ]===
+
+# Colunas exportadas (as mesmas aceitas pela importação, para permitir o caminho de volta)
+COLUNAS_EXPORTACAO = ['orcamento', 'cliente', 'email', 'telefone', 'endereco', 'data', 'status', 'qtd_itens', 'total']
+COLUNAS_EXPORTACAO_ITENS = ['orcamento', 'cliente', 'email', 'telefone', 'endereco', 'data', 'status', 'total_orcamento',
+                            'descricao', 'observacao', 'quantidade', 'preco', 'total']
+FORMATOS_EXPORTACAO = ('csv', 'jsonl', 'xlsx')
+
+def linhas_exportacao(conexao, parametros, incluir_itens):
+    """Gera as linhas da exportação direto do cursor, sem montar listas intermediárias."""
+    filtro, valores = filtro_orcamentos(parametros, 'o')
+    campos = 'o.id, o.cliente, o.cliente_email, o.cliente_telefone, o.cliente_endereco, o.data_criacao, o.status'
+    if not incluir_itens:
+        return conexao.execute(f'SELECT {campos}, o.qtd_itens, o.total FROM orcamentos o {filtro} ORDER BY o.id', valores)
+    return conexao.execute(f'''
+        SELECT {campos}, o.total, i.descricao, i.observacao, i.quantidade, i.preco, i.total
+        FROM orcamentos o JOIN orcamento_itens i ON i.orcamento_id = o.id
+        {filtro} ORDER BY o.id, i.posicao
+    ''', valores)
+
+def numero_brasileiro(valor):
+    """Número com vírgula decimal, como o Excel em português espera no CSV."""
+    return str(valor).replace('.', ',') if isinstance(valor, float) else valor
+
+def escrever_csv(arquivo, colunas, linhas):
+    import csv
+
+    escritor = csv.writer(arquivo, delimiter=';')
+    escritor.writerow(colunas)
+    total = 0
+    for linha in linhas:
+        escritor.writerow([numero_brasileiro(valor) for valor in linha])
+        total += 1
+    return total
+
+def escrever_jsonl(arquivo, colunas, linhas, incluir_itens):
+    """Um orçamento por linha; com itens, as linhas do mesmo orçamento viram a lista 'itens'."""
+    total = 0
+    if not incluir_itens:
+        for linha in linhas:
+            arquivo.write(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + '\n')
+            total += 1
+        return total
 
-    for tabela, coluna, tipo in migracoes:
+    campos_orcamento = colunas[:8]
+    for _, grupo in itertools.groupby(linhas, key=lambda linha: linha[0]):
+        primeira = next(grupo)
+        orcamento = dict(zip(campos_orcamento, primeira[:8]))
+        orcamento['total'] = orcamento.pop('total_orcamento')
+        orcamento['itens'] = [
+            {'desc': linha[8], 'obs': linha[9] or '', 'qtd': linha[10], 'preco': linha[11], 'total': linha[12]}
+            for linha in itertools.chain([primeira], grupo)
+        ]
+        arquivo.write(json.dumps(orcamento, ensure_ascii=False) + '\n')
+        total += 1
+    return total
+
+def escrever_xlsx(caminho, colunas, linhas):
+    """Planilha em modo write_only do openpyxl (linhas vão direto para o disco)."""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError("A exportação em XLSX requer a biblioteca 'openpyxl'. Instale com: pip install openpyxl")
+
+    indice_data = colunas.index('data')
+    pasta_trabalho = Workbook(write_only=True)
+    planilha = pasta_trabalho.create_sheet('Orçamentos')
+    planilha.append(colunas)
+    total = 0
+    for linha in linhas:
+        linha = list(linha)
         try:
-            col_nome = coluna.split(' ')[0]
-            cursor.execute(f'ALTER TABLE {tabela} ADD COLUMN {col_nome} {tipo.replace("DEFAULT", "")}')
-            if 'DEFAULT' in tipo:
-                valor_padrao = tipo.split('DEFAULT')[1].strip()
-                cursor.execute(f"UPDATE {tabela} SET {col_nome} = {valor_padrao} WHERE {col_nome} IS NULL")
-        except sqlite3.OperationalError:
-            pass 
-    
-    conexao.commit()
-    conexao.close()
+            linha[indice_data] = datetime.strptime(linha[indice_data], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            pass
+        planilha.append(linha)
+        total += 1
+    pasta_trabalho.save(caminho)
+    return total
 
-# ===[ FUNÇÕES AUXILIARES ]===
+def exportar_orcamentos(banco_dados, caminho, formato=None, parametros=None, incluir_itens=False):
+    """Exporta os orçamentos filtrados para CSV, JSON Lines ou XLSX em memória constante.
 
-def formatar_moeda(valor):
-    """Formata float para BRL."""
-    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    'parametros' aceita os filtros de filtro_orcamentos. Com incluir_itens, CSV e XLSX
+    trazem uma linha por item e o JSON Lines traz a lista 'itens' em cada orçamento.
+    O arquivo é escrito ao lado do destino e só substitui 'caminho' quando completo.
+    """
+    formato = (formato or os.path.splitext(caminho)[1].lstrip('.')).lower()
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato não suportado: '{formato}' (use CSV, JSONL ou XLSX)")
 
-def limpar_texto(texto):
-    """Converte texto para latin-1 para compatibilidade com fontes padrão do FPDF."""
-    if not texto: return ""
-    return str(texto).encode('latin-1', 'replace').decode('latin-1')
+    inicio = time.perf_counter()
+    colunas = COLUNAS_EXPORTACAO_ITENS if incluir_itens else COLUNAS_EXPORTACAO
+    temporario = caminho + '.parcial'
+    try:
+        with banco_dados.conexao() as conexao:
+            linhas = linhas_exportacao(conexao, parametros or {}, incluir_itens)
+            if formato == 'xlsx':
+                total = escrever_xlsx(temporario, colunas, linhas)
+            else:
+                # utf-8-sig: o Excel só reconhece acentos no CSV com o BOM
+                codificacao = 'utf-8-sig' if formato == 'csv' else 'utf-8'
+                with open(temporario, 'w', encoding=codificacao, newline='') as arquivo:
+                    if formato == 'csv':
+                        total = escrever_csv(arquivo, colunas, linhas)
+                    else:
+                        total = escrever_jsonl(arquivo, colunas, linhas, incluir_itens)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
 
-def abrir_arquivo_externo(caminho):
-    """Abre o arquivo com o programa padrão do sistema."""
-    if platform.system() == 'Darwin':
-        subprocess.call(('open', caminho))
-    elif platform.system() == 'Windows':
-        os.startfile(caminho)
-    else:
-        subprocess.call(('xdg-open', caminho))
+    return {'arquivo': caminho, 'linhas': total, 'duracao': round(time.perf_counter() - inicio, 3)}
 
-def sanitizar_nome_arquivo(nome):
-    """Remove caracteres inválidos para nomes de arquivo."""
-    return re.sub(r'[<>:"/\\|?*]', '', nome).strip()
+# ===[ BACKUP E MANUTENÇÃO ]===
 
-# ===[ GERAÇÃO DE PDF ]===
+PAGINAS_POR_PASSO_BACKUP = 256      # ~1 MB por passo com páginas de 4 KB
+PAUSA_PASSO_BACKUP = 0.005          # Segundos entre os passos: deixa as escritas da interface passarem
+LIMITE_SNAPSHOTS = 10               # Backups mantidos em PASTA_BACKUPS (os mais antigos são apagados)
+INTERVALO_BACKUP_HORAS = 24
+INTERVALO_OTIMIZACAO_DIAS = 7
+LIMITE_FRAGMENTACAO_VACUUM = 10.0   # % de páginas livres a partir do qual a otimização agendada faz VACUUM
+ATRASO_AGENDADOR = 120              # Segundos após a abertura antes da primeira verificação
+INTERVALO_AGENDADOR = 3600
 
-class RelatorioPDF(FPDF):
-    def __init__(self, dados_empresa, orcamento, data_formatada, metodos_pagamento, texto_rodape=""):
-        super().__init__()
-        self.empresa = dados_empresa
-        self.orcamento = orcamento
-        self.data_str = data_formatada
-        self.pagamentos = metodos_pagamento
-        self.texto_rodape = texto_rodape
-        # Margem inferior aumentada para comportar o rodapé estendido com segurança
-        self.set_auto_page_break(auto=True, margin=35)
-        self.set_margins(15, 15, 15)
-
-    def header(self):
-        # Topo decorativo
-        self.set_fill_color(55, 65, 81)
-        self.rect(0, 0, 210, 5, 'F')
-        self.ln(10)
-        
-        possui_logo = False
-        if self.empresa.get('caminho_logo') and os.path.exists(self.empresa.get('caminho_logo')):
-            try:
-                self.image(self.empresa.get('caminho_logo'), 15, 12, w=30)
-                possui_logo = True
-            except:
-                pass
+def relatorio_armazenamento(conexao, caminho):
+    """Tamanho do banco e do WAL e fragmentação (% de páginas livres, recuperáveis pelo VACUUM)."""
+    tamanho_pagina = conexao.execute('PRAGMA page_size').fetchone()[0]
+    paginas = conexao.execute('PRAGMA page_count').fetchone()[0]
+    paginas_livres = conexao.execute('PRAGMA freelist_count').fetchone()[0]
+    caminho_wal = caminho + '-wal'
+    return {
+        'tamanho': os.path.getsize(caminho),
+        'tamanho_wal': os.path.getsize(caminho_wal) if os.path.exists(caminho_wal) else 0,
+        'tamanho_pagina': tamanho_pagina,
+        'paginas': paginas,
+        'paginas_livres': paginas_livres,
+        'fragmentacao_pct': round(paginas_livres * 100 / paginas, 1) if paginas else 0.0,
+    }
 
-        pos_texto_x = 50 if possui_logo else 15
-        
-        # Dados da Empresa
-        self.set_xy(pos_texto_x, 15)
-        self.set_text_color(0, 0, 0)
-        self.set_font('Helvetica', 'B', 14)
-        self.cell(100, 7, limpar_texto(self.empresa.get('nome', 'Minha Empresa')), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-        
-        self.set_font('Helvetica', '', 9)
-        self.set_text_color(80, 80, 80)
-        
-        if self.empresa.get('razao_social'):
-            self.set_x(pos_texto_x)
-            self.cell(100, 5, limpar_texto(self.empresa['razao_social']), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-        if self.empresa.get('cnpj'):
-            self.set_x(pos_texto_x)
-            self.cell(100, 5, limpar_texto(f"CNPJ: {self.empresa['cnpj']}"), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-        if self.empresa.get('endereco'):
-            self.set_x(pos_texto_x)
-            self.cell(100, 5, limpar_texto(self.empresa['endereco']), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-        if self.empresa.get('telefone'):
-            self.set_x(pos_texto_x)
-            self.cell(100, 5, limpar_texto(f"Tel: {self.empresa['telefone']}"), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-
-        # Título do Documento
-        self.set_y(15)
-        self.set_font('Helvetica', 'B', 24)
-        self.set_text_color(200, 200, 200)
-        self.cell(0, 10, limpar_texto("ORÇAMENTO"), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
-
-        y_pos = 28
-        self.set_xy(110, y_pos)
-        self.set_font('Helvetica', 'B', 10)
-        self.set_text_color(0, 0, 0)
-        self.cell(40, 6, limpar_texto("Número:"), border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='R')
-        self.set_font('Helvetica', '', 10)
-        self.cell(45, 6, limpar_texto(f"#{self.orcamento['id']:04d}"), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
-        
-        self.set_xy(110, y_pos + 6)
-        self.set_font('Helvetica', 'B', 10)
-        self.cell(40, 6, limpar_texto("Data:"), border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='R')
-        self.set_font('Helvetica', '', 10)
-        self.cell(45, 6, limpar_texto(self.data_str), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
-
-        self.set_y(max(self.get_y(), 50)) 
-        self.ln(5)
-        
-        # Dados do Cliente
-        self.set_draw_color(200, 200, 200)
-        self.line(15, self.get_y(), 195, self.get_y())
-        self.ln(5)
-        
-        self.set_font('Helvetica', 'B', 10)
-        self.set_text_color(100, 100, 100)
-        self.cell(0, 6, limpar_texto("PREPARADO PARA:"), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-        
-        self.set_font('Helvetica', 'B', 12)
-        self.set_text_color(0, 0, 0)
-        self.cell(0, 7, limpar_texto(self.orcamento['cliente']), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-        
-        self.set_font('Helvetica', '', 10)
-        self.set_text_color(80, 80, 80)
-        
-        detalhes_cliente = []
-        if self.orcamento.get('email'): detalhes_cliente.append(self.orcamento['email'])
-        if self.orcamento.get('telefone'): detalhes_cliente.append(self.orcamento['telefone'])
-        
-        if detalhes_cliente:
-            self.cell(0, 5, limpar_texto(" | ".join(detalhes_cliente)), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-            
-        if self.orcamento.get('endereco'):
-            self.cell(0, 5, limpar_texto(self.orcamento['endereco']), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-            
-        self.ln(8) # Espaço antes do começo da tabela
-
-    def cabecalho_tabela(self):
-        """Desenha os cabeçalhos das colunas (Repetido automaticamente em novas páginas)."""
-        self.set_font('Helvetica', 'B', 10)
-        self.set_fill_color(50, 50, 50)
-        self.set_draw_color(50, 50, 50)
-        self.set_text_color(255, 255, 255)
-        larguras = [90, 25, 30, 35]
-        
-        self.cell(larguras[0], 9, limpar_texto("  DESCRIÇÃO / SERVIÇO"), border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='L', fill=True)
-        self.cell(larguras[1], 9, limpar_texto("QTD"), border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
-        self.cell(larguras[2], 9, limpar_texto("UNITÁRIO"), border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='R', fill=True)
-        self.cell(larguras[3], 9, limpar_texto("TOTAL  "), border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R', fill=True)
-        
-        self.set_font('Helvetica', '', 10)
-        self.set_text_color(0, 0, 0)
-        self.set_draw_color(220, 220, 220)
-
-    def footer(self):
-        """Rodapé fixo em todas as páginas."""
-        # Define a altura base do rodapé baseada na presença do texto extra das configurações
-        y_pos = -35 if self.texto_rodape else -25
-        self.set_y(y_pos)
-        
-        # Texto customizado de observação / rodapé
-        if self.texto_rodape:
-            self.set_draw_color(200, 200, 200)
-            self.line(15, self.get_y()-2, 195, self.get_y()-2)
-            self.set_font('Helvetica', '', 9)
-            self.set_text_color(60, 60, 60)
-            self.multi_cell(0, 5, limpar_texto(self.texto_rodape), align='C')
-            self.ln(3)
-
-        # Formas de Pagamento
-        if self.pagamentos:
-            self.set_font('Helvetica', 'B', 8)
-            self.set_text_color(50, 50, 50)
-            self.cell(0, 4, limpar_texto("Formas de Pagamento Aceitas:"), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-            self.set_font('Helvetica', '', 8)
-            
-            texto_metodos = []
-            if self.pagamentos.get('pix'): texto_metodos.append("PIX")
-            if self.pagamentos.get('credito'): texto_metodos.append("Cartão de Crédito")
-            if self.pagamentos.get('debito'): texto_metodos.append("Cartão de Débito")
-            if self.pagamentos.get('dinheiro'): texto_metodos.append("Dinheiro")
-            
-            if texto_metodos:
-                texto_final = ", ".join(texto_metodos) + "."
-                self.cell(0, 4, limpar_texto(texto_final), border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+def registrar_execucao(banco_dados, tarefa, resultado):
+    with banco_dados.transacao() as conexao:
+        conexao.execute('INSERT OR REPLACE INTO manutencao (tarefa, executada_em, resultado) VALUES (?, ?, ?)',
+                        (tarefa, datetime.now().isoformat(timespec='seconds'), json.dumps(resultado, ensure_ascii=False)))
+
+def ultimas_execucoes(banco_dados):
+    """{tarefa: {'executada_em', 'resultado'}} da tabela manutencao."""
+    with banco_dados.conexao() as conexao:
+        return {linha['tarefa']: {'executada_em': linha['executada_em'], 'resultado': json.loads(linha['resultado'] or 'null')}
+                for linha in conexao.execute('SELECT * FROM manutencao')}
+
+def listar_backups(pasta=None):
+    """Snapshots em PASTA_BACKUPS, do mais recente para o mais antigo."""
+    pasta = pasta or PASTA_BACKUPS
+    if not os.path.isdir(pasta):
+        return []
+    nomes = sorted((nome for nome in os.listdir(pasta) if nome.startswith('orcamentos_') and nome.endswith('.db')), reverse=True)
+    return [{'arquivo': os.path.join(pasta, nome), 'tamanho': os.path.getsize(os.path.join(pasta, nome))} for nome in nomes]
+
+def rotacionar_backups(pasta=None, manter=LIMITE_SNAPSHOTS):
+    """Apaga os snapshots além dos 'manter' mais recentes; retorna os arquivos removidos."""
+    removidos = [backup['arquivo'] for backup in listar_backups(pasta)[manter:]]
+    for arquivo in removidos:
+        os.remove(arquivo)
+    return removidos
+
+def criar_backup(banco_dados, pasta=None, ao_progredir=None):
+    """Copia o banco em funcionamento para um snapshot em 'pasta' (orcamentos_AAAAMMDD_HHMMSS.db).
+
+    No WAL, usa a API de backup do SQLite em passos de PAGINAS_POR_PASSO_BACKUP páginas,
+    com uma pausa entre eles, para não bloquear a interface. A conexão de origem mantém
+    uma transação de leitura durante a cópia: ela fixa o snapshot, e a cópia fica
+    consistente sem ser reiniciada a cada escrita de outra conexão (sem ela, um
+    backup com escritas frequentes pode nunca terminar). Nos outros journals (modo
+    multiusuário) essa transação seguraria uma trava SHARED que impede as escritas de
+    todas as máquinas durante a cópia inteira, então o banco é copiado num passo só, sem
+    pausas. 'ao_progredir(copiadas, total)' recebe o andamento em páginas. O snapshot é gravado como arquivo único (journal
+    DELETE), verificado com quick_check e os mais antigos além de LIMITE_SNAPSHOTS são apagados.
+    """
+    pasta = pasta or PASTA_BACKUPS
+    os.makedirs(pasta, exist_ok=True)
+    base = os.path.join(pasta, f"orcamentos_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    destino, numero = base + '.db', 1
+    while os.path.exists(destino):  # Dois backups no mesmo segundo
+        numero += 1
+        destino = f'{base}_{numero}.db'
+    parcial = destino + '.parcial'
+    inicio = time.perf_counter()
+
+    def progresso(_status, restantes, total):
+        if ao_progredir:
+            ao_progredir(total - restantes, total)
+
+    copia = sqlite3.connect(parcial)
+    try:
+        with banco_dados.conexao() as conexao:
+            if conexao.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal':
+                conexao.execute('BEGIN')
+                conexao.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchone()
+                conexao.backup(copia, pages=PAGINAS_POR_PASSO_BACKUP, progress=progresso, sleep=PAUSA_PASSO_BACKUP)
+                conexao.rollback()
+            else:
+                conexao.backup(copia, progress=progresso)
+        copia.execute('PRAGMA journal_mode = DELETE')
+        verificacao = copia.execute('PRAGMA quick_check').fetchone()[0]
+    finally:
+        copia.close()
+    if verificacao != 'ok':
+        os.remove(parcial)
+        raise sqlite3.DatabaseError(f'Backup inconsistente: {verificacao}')
+    os.replace(parcial, destino)
+
+    return {
+        'arquivo': destino,
+        'tamanho': os.path.getsize(destino),
+        'duracao': round(time.perf_counter() - inicio, 3),
+        'removidos': rotacionar_backups(pasta),
+    }
+
+def executar_manutencao(banco_dados, compactar=True):
+    """Otimiza o banco (ANALYZE, PRAGMA optimize), esvazia o WAL e, se 'compactar', faz VACUUM.
+
+    Com compactar=None, o VACUUM (que reescreve o arquivo inteiro e bloqueia as escritas)
+    só é feito se a fragmentação passar de LIMITE_FRAGMENTACAO_VACUUM.
+    Retorna o relatorio_armazenamento de antes e depois.
+    """
+    inicio = time.perf_counter()
+    with banco_dados.conexao() as conexao:
+        antes = relatorio_armazenamento(conexao, banco_dados.caminho)
+        if compactar is None:
+            compactar = antes['fragmentacao_pct'] >= LIMITE_FRAGMENTACAO_VACUUM
+        if compactar:
+            conexao.execute('VACUUM')
+        conexao.execute('ANALYZE')
+        conexao.execute('PRAGMA optimize')
+        conexao.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        depois = relatorio_armazenamento(conexao, banco_dados.caminho)
+    return {
+        'tamanho_antes': antes['tamanho'],
+        'tamanho_depois': depois['tamanho'],
+        'compactado': compactar,
+        'antes': antes,
+        'depois': depois,
+        'duracao': round(time.perf_counter() - inicio, 3)
+    }
 
-        # Contagem de páginas
-        self.set_y(-15)
-        self.set_font('Helvetica', 'I', 8)
-        self.set_text_color(150, 150, 150)
-        self.cell(0, 10, limpar_texto(f'Página {self.page_no()}/{{nb}}'), border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C')
+def tarefa_vencida(execucoes, tarefa, intervalo):
+    ultima = execucoes.get(tarefa)
+    return ultima is None or datetime.now() - datetime.fromisoformat(ultima['executada_em']) >= intervalo
 
 # ===[ API DO SISTEMA ]===
 
+@instrumentar_api
 class InterfaceSistema:
-    def __init__(self):
+    def __init__(self, banco_dados=None):
         self.janela = None
+        self.banco = banco_dados or banco
+        self._lotes = {}
+        self._trava_lotes = threading.Lock()
+        self._contador_lotes = itertools.count(1)
+        self.cache_pdf = CachePDF(self.banco, PASTA_CACHE_PDF, ativo=not self.banco.multiusuario)
+        self._tarefas_pdf = {}
+        self._trava_tarefas = threading.Lock()
+        self._contador_tarefas = itertools.count(1)
+        self._fila_pdf = queue.Queue()
+        self._trabalhador_pdf = None
+        # Backup e otimização nunca rodam ao mesmo tempo
+        self._trava_manutencao = threading.Lock()
+        self._backup = {'em_andamento': False, 'copiadas': 0, 'total': 0}
+        self._trava_backup = threading.Lock()
 
     def selecionar_pasta(self):
         if self.janela:
+            import webview
             resultado = self.janela.create_file_dialog(webview.FOLDER_DIALOG)
             if resultado and len(resultado) > 0:
                 return resultado[0]
@@ -302,81 +1820,209 @@ class InterfaceSistema:
 
     def selecionar_logo(self):
         if self.janela:
+            import webview
             tipos_arquivo = ('Imagens (*.png;*.jpg;*.jpeg)', 'Todos os arquivos (*.*)')
             resultado = self.janela.create_file_dialog(webview.OPEN_DIALOG, allow_multiple=False, file_types=tipos_arquivo)
             
             if resultado and len(resultado) > 0:
                 caminho_origem = resultado[0]
                 try:
-                    img = Image.open(caminho_origem).convert("RGBA")
-                    dimensao_max = 3300
-                    if img.width > dimensao_max or img.height > dimensao_max:
-                        img.thumbnail((dimensao_max, dimensao_max), Image.Resampling.LANCZOS)
-                    
-                    tamanho = max(img.width, img.height)
-                    nova_img = Image.new("RGBA", (tamanho, tamanho), (255, 255, 255, 0))
-                    nova_img.paste(img, ((tamanho - img.width) // 2, (tamanho - img.height) // 2), img)
-                    nova_img.save(ARQUIVO_LOGO, "PNG")
-                    return {'status': 'ok', 'caminho': ARQUIVO_LOGO}
+                    return {'status': 'ok', **self._instalar_logo(caminho_origem)}
                 except Exception as e:
                     return {'status': 'erro', 'mensagem': f"Erro ao processar imagem: {str(e)}"}
         return {'status': 'cancelado'}
 
-    def atualizar_status(self, id_orcamento, novo_status):
+    def _instalar_logo(self, origem, configurar=False):
+        logo = instalar_logo(origem)
+        # Se o formato mudou (PNG <-> JPEG), o caminho salvo nas configurações aponta para um arquivo removido
+        base = os.path.splitext(ARQUIVO_LOGO)[0]
+        with self.banco.transacao() as conexao:
+            conexao.execute('UPDATE configuracoes SET caminho_logo=? WHERE id=1 AND (? OR caminho_logo IN (?, ?))',
+                            (logo['caminho'], configurar, base + '.png', base + '.jpg'))
+        invalidar_modelo_pdf()
+        return logo
+
+    def importar_arquivo(self, caminho=None):
+        """Importa orçamentos de um CSV ou JSON Lines (ver importar_orcamentos).
+
+        Sem caminho, abre o seletor de arquivos da janela.
+        """
+        if not caminho and self.janela:
+            import webview
+            tipos_arquivo = ('Planilhas e JSON Lines (*.csv;*.jsonl;*.ndjson)', 'Todos os arquivos (*.*)')
+            resultado = self.janela.create_file_dialog(webview.OPEN_DIALOG, allow_multiple=False, file_types=tipos_arquivo)
+            caminho = resultado[0] if resultado else None
+        if not caminho:
+            return {'status': 'cancelado'}
         try:
-            conexao = sqlite3.connect(ARQUIVO_DB)
-            cursor = conexao.cursor()
-            cursor.execute('UPDATE orcamentos SET status = ? WHERE id = ?', (novo_status, id_orcamento))
-            conexao.commit()
-            conexao.close()
-            return {'status': 'ok'}
+            return {'status': 'ok', **importar_orcamentos(self.banco, caminho)}
         except Exception as e:
             return {'status': 'erro', 'mensagem': str(e)}
 
-    def excluir_orcamento(self, id_orcamento):
+    def exportar_dados(self, parametros=None):
+        """Exporta o histórico filtrado para CSV, JSON Lines ou XLSX (ver exportar_orcamentos).
+
+        Parâmetros: 'formato', 'itens' (uma linha por item), 'status', 'data_inicio',
+        'data_fim' e 'caminho'; sem caminho, abre o diálogo de salvar da janela.
+        """
+        parametros = parametros or {}
+        formato = (parametros.get('formato') or 'csv').lower()
+        caminho = parametros.get('caminho')
+        if not caminho and self.janela:
+            import webview
+            nome = f"orcamentos_{datetime.now().strftime('%Y%m%d')}.{formato}"
+            resultado = self.janela.create_file_dialog(webview.SAVE_DIALOG, save_filename=nome)
+            caminho = (resultado[0] if isinstance(resultado, (list, tuple)) else resultado) if resultado else None
+        if not caminho:
+            return {'status': 'cancelado'}
         try:
-            conexao = sqlite3.connect(ARQUIVO_DB)
-            cursor = conexao.cursor()
-            cursor.execute('DELETE FROM orcamentos WHERE id = ?', (id_orcamento,))
-            conexao.commit()
-            conexao.close()
+            resumo = exportar_orcamentos(self.banco, caminho, formato, parametros, bool(parametros.get('itens')))
+            return {'status': 'ok', **resumo}
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    # Nas gravações abaixo, 'versao' é a versão lida pelo cliente: se informada e o orçamento
+    # tiver mudado desde então, nada é gravado e a resposta traz 'conflito' e 'versao_atual'.
+    # Sem versão (None, enviado como -1 no '? IN (versao, -1)'), a gravação é incondicional.
+
+    def atualizar_status(self, id_orcamento, novo_status, versao=None):
+        try:
+            with self.banco.transacao() as conexao:
+                cursor = conexao.execute('UPDATE orcamentos SET status = ?, versao = versao + 1 WHERE id = ? AND ? IN (versao, -1)',
+                                         (novo_status, id_orcamento, -1 if versao is None else versao))
+                if versao is not None:
+                    verificar_gravacao(conexao, cursor, id_orcamento)
+                removidos = self.cache_pdf.invalidar_orcamento(conexao, id_orcamento)
+                linha = conexao.execute('SELECT versao FROM orcamentos WHERE id = ?', (id_orcamento,)).fetchone()
+            self.cache_pdf.apagar_arquivos(removidos)
+            return {'status': 'ok', 'versao': linha[0] if linha else None}
+        except ConflitoVersao as e:
+            return resposta_conflito(e)
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    def excluir_orcamento(self, id_orcamento, versao=None):
+        try:
+            with self.banco.transacao() as conexao:
+                cursor = conexao.execute('DELETE FROM orcamentos WHERE id = ? AND ? IN (versao, -1)', (id_orcamento, -1 if versao is None else versao))
+                if versao is not None:
+                    verificar_gravacao(conexao, cursor, id_orcamento)
+                removidos = self.cache_pdf.invalidar_orcamento(conexao, id_orcamento)
+            self.cache_pdf.apagar_arquivos(removidos)
             return {'status': 'ok'}
+        except ConflitoVersao as e:
+            return resposta_conflito(e)
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    # Ações em massa: 'ids' (lista) ou um filtro ('status', 'data_inicio', 'data_fim',
+    # 'mais_antigos_que'), aplicadas em uma única transação. Em 'versoes' ({id: versao}),
+    # os orçamentos alterados ou excluídos por outro usuário desde a leitura ficam de fora
+    # e voltam em 'conflitos'.
+
+    def _selecionar_acao_lote(self, conexao, parametros):
+        """Linhas (id, versao, status) alcançadas pela ação e a lista de conflitos de versão."""
+        if parametros.get('ids'):
+            ids = [int(id_orcamento) for id_orcamento in parametros['ids']]
+            linhas = []
+            for inicio in range(0, len(ids), TAMANHO_BLOCO_ACAO_LOTE):
+                bloco = ids[inicio:inicio + TAMANHO_BLOCO_ACAO_LOTE]
+                marcadores = ', '.join('?' * len(bloco))
+                linhas += conexao.execute(f'SELECT id, versao, status FROM orcamentos WHERE id IN ({marcadores})', bloco).fetchall()
+        else:
+            filtro, valores = filtro_orcamentos(parametros)
+            if not filtro:
+                raise ValueError('Selecione os orçamentos ou informe um filtro.')
+            linhas = conexao.execute(f'SELECT id, versao, status FROM orcamentos {filtro}', valores).fetchall()
+
+        # As chaves chegam como texto quando o dicionário vem do JavaScript
+        versoes = {int(id_orcamento): versao for id_orcamento, versao in (parametros.get('versoes') or {}).items()}
+        atuais = {linha['id']: linha['versao'] for linha in linhas}
+        conflitos = [{'id': id_orcamento, 'versao_atual': atuais.get(id_orcamento)}
+                     for id_orcamento, versao in versoes.items() if versao is not None and atuais.get(id_orcamento) != versao]
+        ignorados = {conflito['id'] for conflito in conflitos}
+        return [linha for linha in linhas if linha['id'] not in ignorados], conflitos
+
+    def atualizar_status_lote(self, parametros):
+        """Muda para 'novo_status' o status de vários orçamentos.
+
+        Retorna 'alterados', 'inalterados' (já estavam no status) e 'conflitos'.
+        """
+        novo_status = parametros.get('novo_status')
+        if novo_status not in STATUS_VALIDOS:
+            return {'status': 'erro', 'mensagem': f'Status inválido: {novo_status}'}
+        try:
+            with self.banco.transacao() as conexao:
+                linhas, conflitos = self._selecionar_acao_lote(conexao, parametros)
+                ids = [linha['id'] for linha in linhas if linha['status'] != novo_status]
+                for inicio in range(0, len(ids), TAMANHO_BLOCO_ACAO_LOTE):
+                    bloco = ids[inicio:inicio + TAMANHO_BLOCO_ACAO_LOTE]
+                    conexao.execute(f"UPDATE orcamentos SET status = ?, versao = versao + 1 WHERE id IN ({', '.join('?' * len(bloco))})",
+                                    (novo_status, *bloco))
+                removidos = self.cache_pdf.invalidar_orcamentos(conexao, ids)
+            self.cache_pdf.apagar_arquivos(removidos)
+            return {'status': 'ok', 'alterados': len(ids), 'inalterados': len(linhas) - len(ids), 'conflitos': conflitos}
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    def excluir_orcamentos_lote(self, parametros):
+        """Exclui vários orçamentos. Retorna 'excluidos' e 'conflitos'."""
+        try:
+            with self.banco.transacao() as conexao:
+                linhas, conflitos = self._selecionar_acao_lote(conexao, parametros)
+                ids = [linha['id'] for linha in linhas]
+                for inicio in range(0, len(ids), TAMANHO_BLOCO_ACAO_LOTE):
+                    bloco = ids[inicio:inicio + TAMANHO_BLOCO_ACAO_LOTE]
+                    conexao.execute(f"DELETE FROM orcamentos WHERE id IN ({', '.join('?' * len(bloco))})", bloco)
+                removidos = self.cache_pdf.invalidar_orcamentos(conexao, ids)
+            self.cache_pdf.apagar_arquivos(removidos)
+            return {'status': 'ok', 'excluidos': len(ids), 'conflitos': conflitos}
         except Exception as e:
             return {'status': 'erro', 'mensagem': str(e)}
 
     def salvar_orcamento(self, dados):
         try:
-            conexao = sqlite3.connect(ARQUIVO_DB)
-            cursor = conexao.cursor()
-            itens_json = json.dumps(dados['itens'])
-            
-            if 'id' in dados and dados['id']:
-                cursor.execute('''
-                    UPDATE orcamentos 
-                    SET cliente=?, cliente_email=?, cliente_telefone=?, cliente_endereco=?, itens=?, total=?, data_criacao=?
-                    WHERE id=?
-                ''', (dados['cliente'], dados.get('email', ''), dados.get('telefone', ''), dados.get('endereco', ''), itens_json, dados['total'], dados['data'], dados['id']))
-            else:
-                cursor.execute('''
-                    INSERT INTO orcamentos 
-                    (cliente, cliente_email, cliente_telefone, cliente_endereco, itens, total, data_criacao, status) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, 'PENDENTE')
-                ''', (dados['cliente'], dados.get('email', ''), dados.get('telefone', ''), dados.get('endereco', ''), itens_json, dados['total'], dados['data']))
-                
-            conexao.commit()
-            conexao.close()
-            return {'status': 'ok'}
+            data = data_iso(dados['data'])
+            with self.banco.transacao() as conexao:
+                cliente_id = registrar_clientes(conexao, [(dados['cliente'], dados.get('email'), dados.get('telefone'), dados.get('endereco'))]).get(chave_cliente(dados['cliente']))
+                if 'id' in dados and dados['id']:
+                    id_orcamento = dados['id']
+                    versao = dados.get('versao')
+                    cursor = conexao.execute('''
+                        UPDATE orcamentos 
+                        SET cliente=?, cliente_email=?, cliente_telefone=?, cliente_endereco=?, qtd_itens=?, total=?, data_criacao=?, cliente_id=?,
+                            versao = versao + 1
+                        WHERE id=? AND ? IN (versao, -1)
+                    ''', (dados['cliente'], dados.get('email', ''), dados.get('telefone', ''), dados.get('endereco', ''), len(dados['itens']), dados['total'], data, cliente_id,
+                          id_orcamento, -1 if versao is None else versao))
+                    verificar_gravacao(conexao, cursor, id_orcamento)
+                else:
+                    cursor = conexao.execute('''
+                        INSERT INTO orcamentos 
+                        (cliente, cliente_email, cliente_telefone, cliente_endereco, qtd_itens, total, data_criacao, status, cliente_id) 
+                        VALUES (?, ?, ?, ?, ?, ?, ?, 'PENDENTE', ?)
+                    ''', (dados['cliente'], dados.get('email', ''), dados.get('telefone', ''), dados.get('endereco', ''), len(dados['itens']), dados['total'], data, cliente_id))
+                    id_orcamento = cursor.lastrowid
+                gravar_itens(conexao, id_orcamento, dados['itens'])
+                indexar_busca(conexao, id_orcamento)
+                removidos = self.cache_pdf.invalidar_orcamento(conexao, id_orcamento)
+                versao_gravada = conexao.execute('SELECT versao FROM orcamentos WHERE id = ?', (id_orcamento,)).fetchone()[0]
+            self.cache_pdf.apagar_arquivos(removidos)
+
+            return {'status': 'ok', 'id': id_orcamento, 'versao': versao_gravada}
+        except ConflitoVersao as e:
+            return resposta_conflito(e)
         except Exception as e:
             return {'status': 'erro', 'mensagem': str(e)}
 
     def obter_detalhes_orcamento(self, id_orcamento):
-        conexao = sqlite3.connect(ARQUIVO_DB)
-        conexao.row_factory = sqlite3.Row
-        cursor = conexao.cursor()
-        cursor.execute('SELECT * FROM orcamentos WHERE id = ?', (id_orcamento,))
-        linha = cursor.fetchone()
-        conexao.close()
-        
+        with self.banco.conexao() as conexao:
+            linha = conexao.execute('''
+                SELECT o.*, a.quando AS atualizado_em FROM orcamentos o
+                LEFT JOIN alteracoes a ON a.orcamento_id = o.id WHERE o.id = ?
+            ''', (id_orcamento,)).fetchone()
+            itens = carregar_itens(conexao, id_orcamento) if linha else []
+
         if linha:
             return {
                 'id': linha['id'],
@@ -384,56 +2030,454 @@ class InterfaceSistema:
                 'email': linha['cliente_email'],
                 'telefone': linha['cliente_telefone'],
                 'endereco': linha['cliente_endereco'],
-                'itens': json.loads(linha['itens']),
-                'total': linha['total']
+                'itens': itens,
+                'total': linha['total'],
+                'versao': linha['versao'],
+                'atualizado_em': linha['atualizado_em']
             }
         return None
 
-    def obter_historico(self):
-        conexao = sqlite3.connect(ARQUIVO_DB)
-        conexao.row_factory = sqlite3.Row
-        cursor = conexao.cursor()
-        cursor.execute('SELECT * FROM orcamentos')
-        linhas = cursor.fetchall()
+    def _historico_completo(self):
+        """Todo o histórico de uma vez, sem paginação: só a referência de comparação do benchmark.
+
+        Fica fora da API do JavaScript (prefixo _); a interface usa obter_historico_paginado.
+        """
+        with self.banco.conexao() as conexao:
+            linhas = conexao.execute('SELECT id, cliente, total, data_criacao, qtd_itens, status, cliente_id, versao FROM orcamentos').fetchall()
+        return [self._linha_historico(linha) for linha in linhas]
+
+    def obter_historico_paginado(self, parametros=None):
+        """Retorna uma página do histórico usando paginação por cursor (keyset).
+
+        Parâmetros aceitos: 'status', 'cliente_id', 'busca' (texto livre, ver buscar_orcamentos), 'ordem'
+        (chave de ORDENACOES_HISTORICO), 'limite' e 'cursor' (devolvido pela página anterior).
+        """
+        parametros = parametros or {}
+        coluna, direcao = ORDENACOES_HISTORICO.get(parametros.get('ordem'), ORDENACOES_HISTORICO['recentes'])
+        limite = max(1, min(int(parametros.get('limite') or 50), LIMITE_PAGINA_HISTORICO))
+
+        condicoes, valores = [], []
+        if parametros.get('status'):
+            condicoes.append('status = ?')
+            valores.append(parametros['status'])
+        if parametros.get('cliente_id'):
+            condicoes.append('cliente_id = ?')
+            valores.append(int(parametros['cliente_id']))
+        consulta = consulta_busca(parametros.get('busca'))
+        if consulta:
+            condicoes.append('id IN (SELECT rowid FROM busca_orcamentos WHERE busca_orcamentos MATCH ?)')
+            valores.append(consulta)
+
+        # Continua exatamente de onde a página anterior parou: (coluna, id) depois do último visto
+        cursor_pagina = parametros.get('cursor')
+        comparador = '<' if direcao == 'DESC' else '>'
+        if cursor_pagina:
+            if coluna == 'id':
+                condicoes.append(f'id {comparador} ?')
+                valores.append(cursor_pagina['id'])
+            else:
+                condicoes.append(f'({coluna}, id) {comparador} (?, ?)')
+                valores.extend([cursor_pagina['valor'], cursor_pagina['id']])
+
+        sql = f'SELECT id, cliente, total, data_criacao, qtd_itens, status, cliente_id, versao, {coluna} AS chave_ordem FROM orcamentos'
+        if condicoes:
+            sql += ' WHERE ' + ' AND '.join(condicoes)
+        sql += f' ORDER BY {coluna} {direcao}'
+        if coluna != 'id':
+            sql += f', id {direcao}'
+        sql += ' LIMIT ?'
+        valores.append(limite + 1)
+
+        with self.banco.conexao() as conexao:
+            linhas = conexao.execute(sql, valores).fetchall()
+
+        tem_mais = len(linhas) > limite
+        linhas = linhas[:limite]
+        proximo_cursor = None
+        if tem_mais:
+            ultima = linhas[-1]
+            proximo_cursor = {'id': ultima['id'], 'valor': ultima['chave_ordem']}
+
+        return {
+            'itens': [self._linha_historico(linha) for linha in linhas],
+            'proximo_cursor': proximo_cursor
+        }
+
+    def buscar_orcamentos(self, termo, limite=20):
+        """Busca por cliente, e-mail, telefone, endereço e descrição/observação dos itens.
+
+        Cada palavra é tratada como prefixo e acentos são ignorados. Os resultados vêm
+        ordenados por relevância (bm25, com o nome do cliente pesando mais), com um
+        trecho do texto encontrado em 'trecho'.
+        """
+        consulta = consulta_busca(termo)
+        if not consulta:
+            return {'status': 'ok', 'resultados': []}
+        limite = max(1, min(int(limite or 20), LIMITE_PAGINA_HISTORICO))
+        try:
+            with self.banco.conexao() as conexao:
+                linhas = conexao.execute('''
+                    SELECT o.id, o.cliente, o.total, o.data_criacao, o.qtd_itens, o.status, o.cliente_id, o.versao,
+                           snippet(busca_orcamentos, -1, '[', ']', '...', 12) AS trecho
+                    FROM busca_orcamentos
+                    JOIN orcamentos o ON o.id = busca_orcamentos.rowid
+                    WHERE busca_orcamentos MATCH ?
+                    ORDER BY bm25(busca_orcamentos, 10.0, 5.0, 2.0, 1.0)
+                    LIMIT ?
+                ''', (consulta, limite)).fetchall()
+        except sqlite3.OperationalError as e:
+            return {'status': 'erro', 'mensagem': f"Busca inválida: {str(e)}"}
+
         resultados = []
         for linha in linhas:
-            itens = json.loads(linha['itens'])
-            resultados.append({
-                'id': linha['id'],
-                'cliente': linha['cliente'],
-                'total': linha['total'],
-                'data': linha['data_criacao'],
-                'qtd_itens': len(itens),
-                'status': linha['status'] or 'PENDENTE'
-            })
-        conexao.close()
-        return resultados
+            resultado = self._linha_historico(linha)
+            resultado['trecho'] = linha['trecho']
+            resultados.append(resultado)
+        return {'status': 'ok', 'resultados': resultados}
+
+    def buscar_clientes(self, termo, limite=LIMITE_SUGESTOES_CLIENTES):
+        """Sugestões do autocompletar: clientes cujo nome normalizado começa com o texto digitado.
+
+        A faixa [chave, chave + '~') percorre o índice único de 'chave'; os totais de cada
+        sugestão vêm de idx_orcamentos_cliente_id.
+        """
+        chave = chave_cliente(termo)
+        if not chave:
+            return {'status': 'ok', 'clientes': []}
+        limite = max(1, min(int(limite or LIMITE_SUGESTOES_CLIENTES), LIMITE_PAGINA_HISTORICO))
+        with self.banco.conexao() as conexao:
+            linhas = conexao.execute('''
+                SELECT c.id, c.nome, c.email, c.telefone, c.endereco,
+                       (SELECT COUNT(*) FROM orcamentos o WHERE o.cliente_id = c.id) AS quantidade,
+                       (SELECT COALESCE(SUM(o.total), 0) FROM orcamentos o WHERE o.cliente_id = c.id) AS valor
+                FROM clientes c
+                WHERE c.chave >= ? AND c.chave < ?
+                  AND EXISTS (SELECT 1 FROM orcamentos o WHERE o.cliente_id = c.id)
+                ORDER BY c.chave
+                LIMIT ?
+            ''', (chave, chave + '~', limite)).fetchall()
+        return {'status': 'ok', 'clientes': [
+            {'id': linha['id'], 'nome': linha['nome'], 'email': linha['email'] or '', 'telefone': linha['telefone'] or '',
+             'endereco': linha['endereco'] or '', 'quantidade': linha['quantidade'], 'valor': round(linha['valor'], 2)}
+            for linha in linhas
+        ]}
+
+    def obter_resumo_cliente(self, id_cliente):
+        """Cadastro do cliente com quantidade e valor por status e a data do último orçamento."""
+        with self.banco.conexao() as conexao:
+            cliente = conexao.execute('SELECT * FROM clientes WHERE id = ?', (id_cliente,)).fetchone()
+            if not cliente:
+                return {'status': 'erro', 'mensagem': 'Cliente não encontrado'}
+            # Só idx_orcamentos_cliente_id é lido: (cliente_id, status, data_criacao, total)
+            linhas = conexao.execute('''
+                SELECT status, COUNT(*) AS quantidade, COALESCE(SUM(total), 0) AS valor, MAX(data_criacao) AS ultima_data
+                FROM orcamentos WHERE cliente_id = ?
+                GROUP BY status
+            ''', (id_cliente,)).fetchall()
+
+        por_status = {status: {'quantidade': 0, 'valor': 0.0} for status in STATUS_VALIDOS}
+        for linha in linhas:
+            if linha['status'] in por_status:
+                por_status[linha['status']] = {'quantidade': linha['quantidade'], 'valor': round(linha['valor'], 2)}
+        ultima_data = max((linha['ultima_data'] for linha in linhas if linha['ultima_data']), default=None)
+        return {
+            'status': 'ok',
+            'id': cliente['id'],
+            'nome': cliente['nome'],
+            'email': cliente['email'] or '',
+            'telefone': cliente['telefone'] or '',
+            'endereco': cliente['endereco'] or '',
+            'por_status': [{'status': status, **dados} for status, dados in por_status.items()],
+            'quantidade': sum(dados['quantidade'] for dados in por_status.values()),
+            'valor': round(sum(dados['valor'] for dados in por_status.values()), 2),
+            'ultimo_orcamento': data_br(ultima_data),
+        }
+
+    def obter_tempos_inicializacao(self):
+        """Tempos (ms desde o início do processo) de cada etapa da abertura do programa."""
+        return dict(TEMPOS_INICIALIZACAO)
+
+    # --- Diagnóstico ---
+
+    def obter_diagnostico(self):
+        """Métricas das chamadas da API desde a abertura (ou a última limpeza), para a tela de diagnóstico."""
+        return {'status': 'ok', **diagnostico.resumo(), 'inicializacao': dict(TEMPOS_INICIALIZACAO)}
+
+    def limpar_diagnostico(self):
+        diagnostico.limpar()
+        return {'status': 'ok'}
+
+    def configurar_perfil(self, limite_ms=None):
+        """Liga o cProfile nas chamadas da API, gravando as que passarem de limite_ms (None desliga)."""
+        try:
+            diagnostico.limite_perfil_ms = None if limite_ms in (None, '') else max(0.0, float(limite_ms))
+        except (TypeError, ValueError):
+            return {'status': 'erro', 'mensagem': f"Limite inválido: '{limite_ms}'"}
+        return {'status': 'ok', 'limite_ms': diagnostico.limite_perfil_ms, 'pasta': diagnostico.pasta_perfis}
+
+    # --- Backup e manutenção ---
+
+    def obter_estado_manutencao(self):
+        """Tamanho e fragmentação do banco, snapshots existentes, últimas execuções e o backup em andamento."""
+        try:
+            with self.banco.conexao() as conexao:
+                armazenamento = relatorio_armazenamento(conexao, self.banco.caminho)
+            return {
+                'status': 'ok', 'armazenamento': armazenamento, 'backups': listar_backups(),
+                'execucoes': ultimas_execucoes(self.banco), 'backup': dict(self._backup), 'pasta': PASTA_BACKUPS,
+            }
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    def fazer_backup(self):
+        """Inicia um backup em segundo plano; o andamento vem em obter_estado_manutencao."""
+        if not self._reservar_backup():
+            return {'status': 'erro', 'mensagem': 'Já existe um backup em andamento.'}
+        threading.Thread(target=self._executar_backup, daemon=True).start()
+        return {'status': 'ok'}
+
+    def otimizar_banco(self, compactar=True):
+        """VACUUM (se 'compactar'), ANALYZE e PRAGMA optimize; retorna o antes e depois (ver executar_manutencao)."""
+        try:
+            with self._trava_manutencao:
+                resultado = executar_manutencao(self.banco, compactar)
+                registrar_execucao(self.banco, 'otimizacao', resultado)
+            return {'status': 'ok', **resultado}
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    def _reservar_backup(self):
+        """Marca um backup como em andamento. False se já houver um (da interface ou do agendador)."""
+        with self._trava_backup:
+            if self._backup['em_andamento']:
+                return False
+            self._backup.update(em_andamento=True, copiadas=0, total=0)
+            return True
+
+    def _executar_backup(self):
+        def ao_progredir(copiadas, total):
+            self._backup.update(copiadas=copiadas, total=total)
+
+        try:
+            with self._trava_manutencao, diagnostico.medir_chamada('fazer_backup (fila)'):
+                resultado = criar_backup(self.banco, ao_progredir=ao_progredir)
+                registrar_execucao(self.banco, 'backup', resultado)
+        except Exception as e:
+            traceback.print_exc()
+            diagnostico.registrar_erro('fazer_backup', e, traceback.format_exc())
+            registrar_execucao(self.banco, 'backup_falha', {'mensagem': str(e)})
+        finally:
+            self._backup['em_andamento'] = False
+
+    def _iniciar_agendador(self):
+        """Thread que faz o backup diário e a otimização semanal enquanto o programa está aberto."""
+        def agendador():
+            time.sleep(ATRASO_AGENDADOR)
+            while True:
+                try:
+                    execucoes = ultimas_execucoes(self.banco)
+                    if tarefa_vencida(execucoes, 'backup', timedelta(hours=INTERVALO_BACKUP_HORAS)) and self._reservar_backup():
+                        self._executar_backup()
+                    if tarefa_vencida(execucoes, 'otimizacao', timedelta(days=INTERVALO_OTIMIZACAO_DIAS)):
+                        # O VACUUM trava o arquivo com exclusividade: no banco compartilhado, pararia
+                        # as outras máquinas sem aviso, então fica só para o botão em Configurações
+                        with diagnostico.medir_chamada('otimizar_banco (agendado)'):
+                            self.otimizar_banco(compactar=False if self.banco.multiusuario else None)
+                except Exception:
+                    traceback.print_exc()
+                time.sleep(INTERVALO_AGENDADOR)
+
+        threading.Thread(target=agendador, daemon=True).start()
+
+    def _linha_historico(self, linha):
+        """Converte uma linha do banco no formato usado pela listagem do histórico."""
+        return {
+            'id': linha['id'],
+            'cliente': linha['cliente'],
+            'total': linha['total'],
+            'data': data_br(linha['data_criacao']),
+            'qtd_itens': linha['qtd_itens'] or 0,
+            'status': linha['status'] or 'PENDENTE',
+            'cliente_id': linha['cliente_id'],
+            'versao': linha['versao']
+        }
+
+    def obter_alteracoes(self, desde=None):
+        """Orçamentos alterados por qualquer usuário depois da sequência 'desde' (ver controlar_versoes).
+
+        Sem 'desde', retorna só a sequência atual, ponto de partida das próximas consultas.
+        'alterados' traz as linhas no formato do histórico (com 'operacao' insercao ou
+        alteracao) e 'excluidos' os ids removidos. Com mais de LIMITE_ALTERACOES
+        orçamentos alterados (ex.: uma importação), 'recarregar' indica que é mais barato
+        buscar o histórico de novo.
+        """
+        try:
+            with self.banco.conexao() as conexao:
+                seq = conexao.execute('SELECT COALESCE(MAX(seq), 0) FROM alteracoes').fetchone()[0]
+                if desde is None or int(desde) >= seq:
+                    return {'status': 'ok', 'seq': seq, 'alterados': [], 'excluidos': [], 'recarregar': False}
+                linhas = conexao.execute('''
+                    SELECT a.orcamento_id, a.operacao, o.id, o.cliente, o.total, o.data_criacao, o.qtd_itens, o.status, o.cliente_id, o.versao
+                    FROM alteracoes a LEFT JOIN orcamentos o ON o.id = a.orcamento_id
+                    WHERE a.seq > ? AND a.seq <= ? ORDER BY a.seq LIMIT ?
+                ''', (int(desde), seq, LIMITE_ALTERACOES + 1)).fetchall()
+            if len(linhas) > LIMITE_ALTERACOES:
+                return {'status': 'ok', 'seq': seq, 'alterados': [], 'excluidos': [], 'recarregar': True}
+            return {
+                'status': 'ok', 'seq': seq, 'recarregar': False,
+                'alterados': [{**self._linha_historico(linha), 'operacao': linha['operacao']} for linha in linhas if linha['id'] is not None],
+                'excluidos': [linha['orcamento_id'] for linha in linhas if linha['id'] is None],
+            }
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
 
     def obter_estatisticas(self):
-        conexao = sqlite3.connect(ARQUIVO_DB)
-        cursor = conexao.cursor()
-        cursor.execute('SELECT COUNT(*) FROM orcamentos')
-        total_geral = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*), SUM(total) FROM orcamentos WHERE status = 'APROVADO'")
-        l_aprov = cursor.fetchone()
-        cursor.execute("SELECT COUNT(*), SUM(total) FROM orcamentos WHERE status = 'PENDENTE' OR status IS NULL")
-        l_pend = cursor.fetchone()
-        cursor.execute("SELECT COUNT(*) FROM orcamentos WHERE status = 'REJEITADO'")
-        rej_qtd = cursor.fetchone()[0] or 0
-        conexao.close()
+        with self.banco.conexao() as conexao:
+            linhas = conexao.execute('SELECT status, quantidade, valor FROM estatisticas_status').fetchall()
+        agregados = {status: (quantidade, valor) for status, quantidade, valor in linhas}
+
+        aprovados = agregados.get('APROVADO', (0, 0.0))
+        pendentes = agregados.get('PENDENTE', (0, 0.0))
+        rejeitados = agregados.get('REJEITADO', (0, 0.0))
+        return {
+            'total_geral': sum(quantidade for quantidade, _ in agregados.values()),
+            'aprovados_qtd': aprovados[0], 'aprovados_valor': round(aprovados[1], 2),
+            'pendentes_qtd': pendentes[0], 'pendentes_valor': round(pendentes[1], 2),
+            'rejeitados_qtd': rejeitados[0]
+        }
+
+    def obter_estatisticas_mensais(self, mes_inicio=None, mes_fim=None):
+        """Retorna os agregados por mês ('AAAA-MM') e status, opcionalmente limitados a um intervalo."""
+        with self.banco.conexao() as conexao:
+            linhas = conexao.execute('''
+                SELECT mes, status, quantidade, valor FROM estatisticas_mensais
+                WHERE quantidade != 0 AND mes >= ? AND mes <= ?
+                ORDER BY mes, status
+            ''', (mes_inicio or '', mes_fim or '9999-99')).fetchall()
+        return [
+            {'mes': mes, 'status': status, 'quantidade': quantidade, 'valor': round(valor, 2)}
+            for mes, status, quantidade, valor in linhas
+        ]
+
+    def obter_analise(self, parametros=None):
+        """Faturamento por período para gráficos do dashboard, calculado em SQL.
+
+        Parâmetros: 'data_inicio' e 'data_fim' ('AAAA-MM-DD', padrão: últimos 12 meses),
+        'agrupamento' ('dia', 'semana' ou 'mes') e 'limite_clientes'. Retorna a série por
+        período e status, os totais por status, a taxa de aprovação, o ticket médio e os
+        principais clientes do intervalo.
+        """
+        parametros = parametros or {}
+        agrupamento = parametros.get('agrupamento') or 'mes'
+        if agrupamento not in PERIODOS_ANALISE:
+            return {'status': 'erro', 'mensagem': f"Agrupamento inválido: '{agrupamento}'"}
+        try:
+            hoje = datetime.now()
+            data_fim = data_iso(parametros.get('data_fim') or hoje.strftime('%Y-%m-%d'))
+            data_inicio = data_iso(parametros.get('data_inicio') or hoje.replace(year=hoje.year - 1, day=1).strftime('%Y-%m-%d'))
+        except ValueError as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+        limite_clientes = max(1, min(int(parametros.get('limite_clientes') or 10), 100))
+
+        # status IN (...) com intervalo de datas percorre idx_orcamentos_status_data sem ler a tabela
+        marcadores = ', '.join('?' * len(STATUS_VALIDOS))
+        filtro = f'status IN ({marcadores}) AND data_criacao BETWEEN ? AND ?'
+        valores = (*STATUS_VALIDOS, data_inicio, data_fim)
+        periodo = PERIODOS_ANALISE[agrupamento]('data_criacao')
+
+        with self.banco.conexao() as conexao:
+            linhas_serie = conexao.execute(f'''
+                SELECT {periodo} AS periodo, status, COUNT(*) AS quantidade, COALESCE(SUM(total), 0) AS valor
+                FROM orcamentos WHERE {filtro}
+                GROUP BY 1, 2 ORDER BY 1
+            ''', valores).fetchall()
+            # Agrupa pelo cliente do cadastro (coberto pelo índice) e só lê o nome dos que entram no ranking
+            linhas_clientes = conexao.execute(f'''
+                SELECT r.*, c.nome AS cliente FROM (
+                    SELECT cliente_id, COUNT(*) AS quantidade, COALESCE(SUM(total), 0) AS valor,
+                           SUM(status = 'APROVADO') AS aprovados, COALESCE(SUM(CASE WHEN status = 'APROVADO' THEN total END), 0) AS valor_aprovado
+                    FROM orcamentos WHERE {filtro}
+                    GROUP BY cliente_id
+                    ORDER BY valor_aprovado DESC, valor DESC
+                    LIMIT ?
+                ) r LEFT JOIN clientes c ON c.id = r.cliente_id
+                ORDER BY r.valor_aprovado DESC, r.valor DESC
+            ''', (*valores, limite_clientes)).fetchall()
+
+        serie, por_status = {}, {status: {'quantidade': 0, 'valor': 0.0} for status in STATUS_VALIDOS}
+        for linha in linhas_serie:
+            ponto = serie.setdefault(linha['periodo'], {'periodo': linha['periodo'], 'quantidade': 0, 'valor': 0.0,
+                                                        **{status.lower(): {'quantidade': 0, 'valor': 0.0} for status in STATUS_VALIDOS}})
+            ponto[linha['status'].lower()] = {'quantidade': linha['quantidade'], 'valor': round(linha['valor'], 2)}
+            ponto['quantidade'] += linha['quantidade']
+            ponto['valor'] = round(ponto['valor'] + linha['valor'], 2)
+            por_status[linha['status']]['quantidade'] += linha['quantidade']
+            por_status[linha['status']]['valor'] += linha['valor']
+
+        total_qtd = sum(dados['quantidade'] for dados in por_status.values())
+        total_valor = sum(dados['valor'] for dados in por_status.values())
+        aprovados, rejeitados = por_status['APROVADO'], por_status['REJEITADO']
+        decididos = aprovados['quantidade'] + rejeitados['quantidade']
+
         return {
-            'total_geral': total_geral,
-            'aprovados_qtd': l_aprov[0] or 0, 'aprovados_valor': l_aprov[1] or 0.0,
-            'pendentes_qtd': l_pend[0] or 0, 'pendentes_valor': l_pend[1] or 0.0,
-            'rejeitados_qtd': rej_qtd
+            'status': 'ok',
+            'data_inicio': data_inicio,
+            'data_fim': data_fim,
+            'agrupamento': agrupamento,
+            'serie': list(serie.values()),
+            'por_status': [{'status': status, 'quantidade': dados['quantidade'], 'valor': round(dados['valor'], 2)}
+                           for status, dados in por_status.items()],
+            'quantidade': total_qtd,
+            'valor': round(total_valor, 2),
+            # Aprovados sobre todos os orçamentos do período e só sobre os já decididos (aprovados + rejeitados)
+            'taxa_aprovacao': round(aprovados['quantidade'] / total_qtd, 4) if total_qtd else 0,
+            'taxa_aprovacao_decididos': round(aprovados['quantidade'] / decididos, 4) if decididos else 0,
+            'ticket_medio': round(total_valor / total_qtd, 2) if total_qtd else 0,
+            'ticket_medio_aprovado': round(aprovados['valor'] / aprovados['quantidade'], 2) if aprovados['quantidade'] else 0,
+            'top_clientes': [
+                {'cliente_id': linha['cliente_id'], 'cliente': linha['cliente'], 'quantidade': linha['quantidade'], 'valor': round(linha['valor'], 2),
+                 'aprovados': linha['aprovados'], 'valor_aprovado': round(linha['valor_aprovado'], 2)}
+                for linha in linhas_clientes
+            ],
         }
 
+    def obter_ranking_servicos(self, limite=10):
+        """Serviços mais orçados, com quantidade de orçamentos e receita somada."""
+        with self.banco.conexao() as conexao:
+            linhas = conexao.execute('''
+                SELECT descricao, COUNT(DISTINCT orcamento_id) AS orcamentos, SUM(quantidade) AS quantidade, SUM(total) AS receita
+                FROM orcamento_itens
+                GROUP BY descricao COLLATE NOCASE
+                ORDER BY orcamentos DESC, receita DESC
+                LIMIT ?
+            ''', (limite,)).fetchall()
+        return [
+            {'descricao': linha['descricao'], 'orcamentos': linha['orcamentos'],
+             'quantidade': linha['quantidade'], 'receita': round(linha['receita'] or 0, 2)}
+            for linha in linhas
+        ]
+
+    def verificar_estatisticas(self, corrigir=False):
+        """Confere os agregados do dashboard e, se pedido, reconstrói a partir dos orçamentos."""
+        try:
+            with self.banco.transacao() as conexao:
+                cursor = conexao.cursor()
+                divergencias = verificar_estatisticas(cursor)
+                if divergencias and corrigir:
+                    reconstruir_estatisticas(cursor)
+            return {'status': 'ok', 'divergencias': divergencias, 'corrigido': bool(divergencias and corrigir)}
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    def reconstruir_estatisticas(self):
+        try:
+            with self.banco.transacao() as conexao:
+                reconstruir_estatisticas(conexao.cursor())
+            return {'status': 'ok'}
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
     def salvar_configuracoes(self, dados):
-        conexao = sqlite3.connect(ARQUIVO_DB)
-        cursor = conexao.cursor()
-        cursor.execute('SELECT id FROM configuracoes WHERE id=1')
-        existe = cursor.fetchone()
-        
         parametros = (
             dados['empresa'], dados.get('razao_social', ''), dados.get('cnpj', ''), dados.get('endereco', ''), 
             dados.get('telefone', ''), dados['rodape'], dados.get('caminho_pdf', ''), 
@@ -443,28 +2487,27 @@ class InterfaceSistema:
             1 if dados.get('pagamento_dinheiro') else 0
         )
 
-        if existe:
-            cursor.execute('''UPDATE configuracoes SET 
-                nome_empresa=?, razao_social=?, cnpj=?, endereco=?, telefone=?, texto_rodape=?, 
-                caminho_salvar_pdf=?, criar_subpasta=?, salvar_auto=?, caminho_logo=?, 
-                pagamento_pix=?, pagamento_credito=?, pagamento_debito=?, pagamento_dinheiro=? WHERE id=1''', parametros)
-        else:
-            cursor.execute('''INSERT INTO configuracoes (
-                nome_empresa, razao_social, cnpj, endereco, telefone, texto_rodape, 
-                caminho_salvar_pdf, criar_subpasta, salvar_auto, caminho_logo, 
-                pagamento_pix, pagamento_credito, pagamento_debito, pagamento_dinheiro, id) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)''', parametros)
-        conexao.commit()
-        conexao.close()
+        with self.banco.transacao() as conexao:
+            existe = conexao.execute('SELECT id FROM configuracoes WHERE id=1').fetchone()
+            if existe:
+                conexao.execute('''UPDATE configuracoes SET 
+                    nome_empresa=?, razao_social=?, cnpj=?, endereco=?, telefone=?, texto_rodape=?, 
+                    caminho_salvar_pdf=?, criar_subpasta=?, salvar_auto=?, caminho_logo=?, 
+                    pagamento_pix=?, pagamento_credito=?, pagamento_debito=?, pagamento_dinheiro=? WHERE id=1''', parametros)
+            else:
+                conexao.execute('''INSERT INTO configuracoes (
+                    nome_empresa, razao_social, cnpj, endereco, telefone, texto_rodape, 
+                    caminho_salvar_pdf, criar_subpasta, salvar_auto, caminho_logo, 
+                    pagamento_pix, pagamento_credito, pagamento_debito, pagamento_dinheiro, id) 
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)''', parametros)
+            removidos = self.cache_pdf.invalidar_tudo(conexao)
+        self.cache_pdf.apagar_arquivos(removidos)
+        invalidar_modelo_pdf()
         return {'status': 'ok'}
 
     def obter_configuracoes(self):
-        conexao = sqlite3.connect(ARQUIVO_DB)
-        conexao.row_factory = sqlite3.Row
-        cursor = conexao.cursor()
-        cursor.execute('SELECT * FROM configuracoes WHERE id=1')
-        linha = cursor.fetchone()
-        conexao.close()
+        with self.banco.conexao() as conexao:
+            linha = conexao.execute('SELECT * FROM configuracoes WHERE id=1').fetchone()
         if linha:
             return {
                 'empresa': linha['nome_empresa'], 'razao_social': linha['razao_social'],
@@ -477,139 +2520,543 @@ class InterfaceSistema:
             }
         return {}
 
+    # --- Exportação em lote ---
+
+    def exportar_pdfs_lote(self, parametros=None):
+        """Inicia em segundo plano a exportação dos PDFs de vários orçamentos.
+
+        Aceita 'ids' (lista) ou um filtro com 'status', 'data_inicio' e 'data_fim'
+        ('AAAA-MM-DD'). Os arquivos são gravados na pasta configurada (ou em 'pasta',
+        se informada), sem abrir cada um; o andamento é consultado com obter_progresso_lote.
+        """
+        parametros = parametros or {}
+        try:
+            with self.banco.conexao() as conexao:
+                contexto = montar_contexto_pdf(conexao.execute('SELECT * FROM configuracoes WHERE id = 1').fetchone())
+                ids = self._ids_lote(conexao, parametros)
+            if parametros.get('pasta'):
+                contexto['caminho_salvar'] = parametros['pasta']
+
+            if not contexto['caminho_salvar'] or not os.path.isdir(contexto['caminho_salvar']):
+                return {'status': 'erro', 'mensagem': 'Configure uma pasta de salvamento válida para exportar em lote.'}
+            if not ids:
+                return {'status': 'erro', 'mensagem': 'Nenhum orçamento encontrado para exportar.'}
+
+            id_lote = next(self._contador_lotes)
+            with self._trava_lotes:
+                self._lotes[id_lote] = {
+                    'id_lote': id_lote, 'total': len(ids), 'concluidos': 0, 'arquivos': [],
+                    'falhas': [], 'finalizado': False, 'cancelado': False
+                }
+            threading.Thread(target=self._executar_lote, args=(id_lote, ids, contexto), daemon=True).start()
+            return {'status': 'ok', 'id_lote': id_lote, 'total': len(ids)}
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    def obter_progresso_lote(self, id_lote):
+        with self._trava_lotes:
+            lote = self._lotes.get(id_lote)
+            if not lote:
+                return {'status': 'erro', 'mensagem': 'Lote não encontrado'}
+            return {'status': 'ok', **lote, 'arquivos': list(lote['arquivos']), 'falhas': list(lote['falhas'])}
+
+    def cancelar_lote(self, id_lote):
+        with self._trava_lotes:
+            if id_lote in self._lotes:
+                self._lotes[id_lote]['cancelado'] = True
+        return {'status': 'ok'}
+
+    def _ids_lote(self, conexao, parametros):
+        if parametros.get('ids'):
+            return [int(id_orcamento) for id_orcamento in parametros['ids']]
+
+        filtro, valores = filtro_orcamentos(parametros)
+        return [linha[0] for linha in conexao.execute(f'SELECT id FROM orcamentos {filtro} ORDER BY id', valores)]
+
+    def exportar_pdf_consolidado(self, parametros=None):
+        """Inicia em segundo plano um único PDF com vários orçamentos e uma capa com os totais por status.
+
+        Seleciona os orçamentos como exportar_pdfs_lote ('ids' ou filtro). O arquivo é
+        'caminho' ou, sem ele, o escolhido no diálogo de salvar da janela (ou
+        Relatorio_AAAAMMDD.pdf na pasta configurada). O andamento é consultado com
+        obter_progresso_lote, contado em orçamentos.
+        """
+        parametros = parametros or {}
+        caminho = parametros.get('caminho')
+        nome = f"Relatorio_{datetime.now().strftime('%Y%m%d')}.pdf"
+        if not caminho and self.janela:
+            import webview
+            resultado = self.janela.create_file_dialog(webview.SAVE_DIALOG, save_filename=nome)
+            caminho = (resultado[0] if isinstance(resultado, (list, tuple)) else resultado) if resultado else None
+            if not caminho:
+                return {'status': 'cancelado'}
+        try:
+            with self.banco.conexao() as conexao:
+                contexto = montar_contexto_pdf(conexao.execute('SELECT * FROM configuracoes WHERE id = 1').fetchone())
+                ids = self._ids_lote(conexao, parametros)
+            if not caminho:
+                pasta = parametros.get('pasta') or contexto['caminho_salvar']
+                if not pasta or not os.path.isdir(pasta):
+                    return {'status': 'erro', 'mensagem': 'Configure uma pasta de salvamento válida para exportar o relatório.'}
+                caminho = os.path.join(pasta, nome)
+            if not ids:
+                return {'status': 'erro', 'mensagem': 'Nenhum orçamento encontrado para exportar.'}
+            if len(ids) > LIMITE_ORCAMENTOS_CONSOLIDADO:
+                return {'status': 'erro', 'mensagem': f'O relatório único aceita até {LIMITE_ORCAMENTOS_CONSOLIDADO} orçamentos '
+                        f'e o filtro tem {len(ids)}. Restrinja o período ou use a exportação de PDFs em lote.'}
+
+            id_lote = next(self._contador_lotes)
+            with self._trava_lotes:
+                self._lotes[id_lote] = {
+                    'id_lote': id_lote, 'total': len(ids), 'concluidos': 0, 'arquivos': [],
+                    'falhas': [], 'finalizado': False, 'cancelado': False, 'consolidado': True
+                }
+            titulo = descrever_filtro_pdf(parametros)
+            threading.Thread(target=self._executar_consolidado, args=(id_lote, ids, contexto, caminho, titulo), daemon=True).start()
+            return {'status': 'ok', 'id_lote': id_lote, 'total': len(ids), 'arquivo': caminho}
+        except Exception as e:
+            return {'status': 'erro', 'mensagem': str(e)}
+
+    def _executar_consolidado(self, id_lote, ids, contexto, caminho, titulo):
+        lote = self._lotes[id_lote]
+
+        def orcamentos():
+            # Lidos do banco em blocos e descartados após o desenho (as páginas ficam no FPDF até o fim)
+            for id_orcamento, orcamento in self._orcamentos_lote(ids, com_status=True):
+                if lote['cancelado']:
+                    raise InterruptedError('Cancelado')
+                with self._trava_lotes:
+                    lote['concluidos'] += 1
+                    if orcamento is None:
+                        lote['falhas'].append({'id': id_orcamento, 'mensagem': 'Orçamento não encontrado'})
+                if orcamento is not None:
+                    yield orcamento
+
+        try:
+            with diagnostico.medir_chamada('exportar_pdf_consolidado (fila)'):
+                totais = renderizar_consolidado(contexto, orcamentos(), caminho, titulo)
+            with self._trava_lotes:
+                lote['arquivos'].append(caminho)
+                lote['totais'] = {status: {'quantidade': quantidade, 'valor': valor} for status, (quantidade, valor) in totais.items()}
+        except InterruptedError:
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            with self._trava_lotes:
+                lote['erro'] = str(e)
+        finally:
+            with self._trava_lotes:
+                lote['finalizado'] = True
+
+    def _orcamentos_lote(self, ids, com_status=False):
+        """Lê os orçamentos do lote em blocos, para não carregar tudo na memória de uma vez.
+
+        Com 'com_status', inclui o status (fora de montar_orcamento_pdf, que não o
+        imprime e por isso não o leva para a chave do cache de PDFs).
+        """
+        for inicio in range(0, len(ids), TAMANHO_BLOCO_LOTE):
+            bloco = ids[inicio:inicio + TAMANHO_BLOCO_LOTE]
+            marcadores = ', '.join('?' * len(bloco))
+            with self.banco.conexao() as conexao:
+                linhas = {linha['id']: linha for linha in conexao.execute(f'{SQL_ORCAMENTO_PDF} WHERE o.id IN ({marcadores})', bloco)}
+                itens = carregar_itens_varios(conexao, list(linhas))
+            for id_orcamento in bloco:
+                linha = linhas.get(id_orcamento)
+                if linha is None:
+                    yield id_orcamento, None
+                    continue
+                orcamento = montar_orcamento_pdf(linha, itens[id_orcamento])
+                if com_status:
+                    orcamento['status'] = linha['status']
+                yield id_orcamento, orcamento
+
+    def _executar_lote(self, id_lote, ids, contexto):
+        lote = self._lotes[id_lote]
+        processos = max(1, (os.cpu_count() or 2) - 1)
+        pendentes = {}
+
+        def registrar(concluidas):
+            for futuro in concluidas:
+                id_orcamento, chave = pendentes.pop(futuro)
+                if not futuro.cancelled() and not futuro.exception():
+                    self.cache_pdf.guardar(chave, id_orcamento, futuro.result())
+                with self._trava_lotes:
+                    lote['concluidos'] += 1
+                    if futuro.cancelled():
+                        lote['falhas'].append({'id': id_orcamento, 'mensagem': 'Cancelado'})
+                    elif futuro.exception():
+                        lote['falhas'].append({'id': id_orcamento, 'mensagem': str(futuro.exception())})
+                    else:
+                        lote['arquivos'].append(futuro.result())
+
+        try:
+            # 'spawn' em todas as plataformas: fork de um processo com threads da GUI pode travar
+            with ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context('spawn')) as executor:
+                for id_orcamento, orcamento in self._orcamentos_lote(ids):
+                    if lote['cancelado']:
+                        break
+                    if orcamento is None:
+                        with self._trava_lotes:
+                            lote['concluidos'] += 1
+                            lote['falhas'].append({'id': id_orcamento, 'mensagem': 'Orçamento não encontrado'})
+                        continue
+                    # Limita as tarefas em espera para manter a memória constante em lotes grandes
+                    if len(pendentes) >= processos * TAREFAS_POR_PROCESSO_LOTE:
+                        concluidas, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                        registrar(concluidas)
+                    try:
+                        caminho = os.path.join(diretorio_salvamento(contexto, orcamento['pasta_cliente']), nome_arquivo_pdf(orcamento))
+                    except OSError as e:
+                        with self._trava_lotes:
+                            lote['concluidos'] += 1
+                            lote['falhas'].append({'id': id_orcamento, 'mensagem': str(e)})
+                        continue
+                    chave = chave_cache_pdf(contexto, orcamento)
+                    if self.cache_pdf.copiar(chave, caminho):
+                        with self._trava_lotes:
+                            lote['concluidos'] += 1
+                            lote['arquivos'].append(caminho)
+                        continue
+                    pendentes[executor.submit(renderizar_pdf, contexto, orcamento, caminho)] = (id_orcamento, chave)
+
+                if lote['cancelado']:
+                    for futuro in pendentes:
+                        futuro.cancel()
+                concluidas, _ = wait(pendentes)
+                registrar(concluidas)
+        except Exception as e:
+            with self._trava_lotes:
+                lote['erro'] = str(e)
+        finally:
+            with self._trava_lotes:
+                lote['finalizado'] = True
+
+    # --- Geração de PDF em segundo plano ---
+
     def gerar_pdf(self, id_orcamento):
+        """Enfileira a geração do PDF e retorna imediatamente o id da tarefa.
+
+        O andamento é consultado com obter_status_pdf; o arquivo é aberto ao final.
+        """
+        id_tarefa = next(self._contador_tarefas)
+        with self._trava_tarefas:
+            self._tarefas_pdf[id_tarefa] = {'id_tarefa': id_tarefa, 'id_orcamento': id_orcamento, 'estado': 'na_fila'}
+            if self._trabalhador_pdf is None:
+                self._trabalhador_pdf = threading.Thread(target=self._processar_fila_pdf, daemon=True)
+                self._trabalhador_pdf.start()
+        self._fila_pdf.put(id_tarefa)
+        return {'status': 'ok', 'id_tarefa': id_tarefa}
+
+    def obter_status_pdf(self, id_tarefa):
+        with self._trava_tarefas:
+            tarefa = self._tarefas_pdf.get(id_tarefa)
+            if not tarefa:
+                return {'status': 'erro', 'mensagem': 'Tarefa não encontrada'}
+            return {'status': 'ok', **tarefa, 'tarefas_na_fila': self._fila_pdf.qsize()}
+
+    def _processar_fila_pdf(self):
+        while True:
+            id_tarefa = self._fila_pdf.get()
+            with self._trava_tarefas:
+                tarefa = self._tarefas_pdf[id_tarefa]
+                tarefa['estado'] = 'gerando'
+
+            # A chamada gerar_pdf só enfileira: o trabalho aparece no diagnóstico como uma chamada própria
+            with diagnostico.medir_chamada('gerar_pdf (fila)') as medicao:
+                resultado = self._gerar_pdf(tarefa['id_orcamento'])
+                medicao['erro'] = resultado.get('mensagem')
+
+            with self._trava_tarefas:
+                if resultado['status'] == 'ok':
+                    tarefa.update(estado='concluido', arquivo=resultado['arquivo'])
+                else:
+                    tarefa.update(estado='erro', mensagem=resultado['mensagem'])
+                # Descarta as tarefas finalizadas mais antigas
+                finalizadas = [id_antigo for id_antigo, antiga in self._tarefas_pdf.items() if antiga['estado'] in ('concluido', 'erro')]
+                for id_antigo in finalizadas[:-LIMITE_TAREFAS_PDF]:
+                    del self._tarefas_pdf[id_antigo]
+            self._fila_pdf.task_done()
+
+    def _gerar_pdf(self, id_orcamento, abrir=True):
+        """Gera o PDF de forma síncrona (usado pela fila e por rotinas sem interface).
+
+        A duração de cada fase (consulta, cache, logo, layout, gravacao, abertura) vai para o diagnóstico.
+        """
+        tempos = {}
+        inicio = time.perf_counter()
         try:
-            conexao = sqlite3.connect(ARQUIVO_DB)
-            conexao.row_factory = sqlite3.Row
-            cursor = conexao.cursor()
-            cursor.execute('SELECT * FROM orcamentos WHERE id = ?', (id_orcamento,))
-            linha_orc = cursor.fetchone()
-            cursor.execute('SELECT * FROM configuracoes WHERE id = 1')
-            config_linha = cursor.fetchone()
-            conexao.close()
+            with self.banco.conexao() as conexao:
+                linha_orc = conexao.execute(f'{SQL_ORCAMENTO_PDF} WHERE o.id = ?', (id_orcamento,)).fetchone()
+                config_linha = conexao.execute('SELECT * FROM configuracoes WHERE id = 1').fetchone()
+                itens = carregar_itens(conexao, id_orcamento)
 
             if not linha_orc: return {'status': 'erro', 'mensagem': 'Orçamento não encontrado'}
+            tempos['consulta'] = time.perf_counter() - inicio
 
-            orcamento = {
-                'id': linha_orc['id'],
-                'cliente': linha_orc['cliente'],
-                'email': linha_orc['cliente_email'],
-                'telefone': linha_orc['cliente_telefone'],
-                'endereco': linha_orc['cliente_endereco'],
-                'itens': linha_orc['itens'],
-                'total': linha_orc['total'],
-                'data_criacao': linha_orc['data_criacao']
-            }
-
-            config = {k: config_linha[k] for k in config_linha.keys()} if config_linha else {}
-            
-            dados_empresa = {
-                'nome': config.get('nome_empresa', 'Minha Empresa'),
-                'razao_social': config.get('razao_social', ''),
-                'cnpj': config.get('cnpj', ''),
-                'endereco': config.get('endereco', ''),
-                'telefone': config.get('telefone', ''),
-                'caminho_logo': config.get('caminho_logo', '')
-            }
+            orcamento = montar_orcamento_pdf(linha_orc, itens)
+            contexto = montar_contexto_pdf(config_linha)
 
-            metodos_pagamento = {
-                'pix': bool(config.get('pagamento_pix', 0)),
-                'credito': bool(config.get('pagamento_credito', 0)),
-                'debito': bool(config.get('pagamento_debito', 0)),
-                'dinheiro': bool(config.get('pagamento_dinheiro', 0))
-            }
-            
-            salvar_auto = bool(config.get('salvar_auto', 1))
-            caminho_usuario = config.get('caminho_salvar_pdf', '')
-            texto_rodape = config.get('texto_rodape', '')
-            
-            if salvar_auto and caminho_usuario and os.path.exists(caminho_usuario):
-                dir_salvamento = caminho_usuario
-                if bool(config.get('criar_subpasta', 0)):
-                    cliente_seguro = sanitizar_nome_arquivo(orcamento['cliente'])
-                    dir_salvamento = os.path.join(dir_salvamento, cliente_seguro)
-                    if not os.path.exists(dir_salvamento): os.makedirs(dir_salvamento)
+            if contexto['salvar_auto'] and contexto['caminho_salvar'] and os.path.exists(contexto['caminho_salvar']):
+                dir_salvamento = diretorio_salvamento(contexto, orcamento['pasta_cliente'])
             else:
                 dir_salvamento = tempfile.gettempdir()
 
-            itens = json.loads(orcamento['itens'])
-            
-            # Instancia o PDF com todos os dados preenchidos
-            pdf = RelatorioPDF(dados_empresa, orcamento, orcamento['data_criacao'], metodos_pagamento, texto_rodape)
-            pdf.alias_nb_pages()
-            pdf.add_page()
-            
-            # Cabeçalho da Tabela pela primeira vez
-            pdf.cabecalho_tabela()
-            larguras = [90, 25, 30, 35]
-            
-            for i, item in enumerate(itens):
-                desc = item['desc']
-                if item.get('obs'): desc += f"\n(Obs: {item['obs']})"
-                
-                # --- PREVISÃO DE ESPAÇO: Evitar que a tabela quebre no meio do desenho ---
-                pdf.set_font('Helvetica', '', 10)
-                linhas_texto = desc.split('\n')
-                qtd_linhas = 0
-                for l in linhas_texto:
-                    largura_str = pdf.get_string_width("  " + l)
-                    qtd_linhas += max(1, int(largura_str / 85) + 1)
-                
-                altura_estimada = qtd_linhas * 7
-                
-                # O PDF FPDF vai até 297mm. Avaliamos até o 240mm por conta do nosso Rodapé Fixo estendido
-                if pdf.get_y() + altura_estimada > 240:
-                    pdf.add_page() # O FPDF automaticamente puxará o cabeçalho (empresa e cliente)
-                    pdf.cabecalho_tabela() # Nós chamamos manualmente as colunas da tabela novamente
-                # --------------------------------------------------------------------------
-
-                bg = (i % 2 == 1)
-                pdf.set_fill_color(248, 248, 248) if bg else pdf.set_fill_color(255, 255, 255)
-
-                x_ini, y_ini = pdf.get_x(), pdf.get_y()
-                pdf.multi_cell(larguras[0], 7, limpar_texto("  " + desc), border='L', align='L', fill=bg)
-                h_linha = pdf.get_y() - y_ini
-                
-                pdf.set_xy(x_ini + larguras[0], y_ini)
-                pdf.cell(larguras[1], h_linha, str(item['qtd']), border=0, align='C', fill=bg)
-                pdf.cell(larguras[2], h_linha, limpar_texto(formatar_moeda(item['preco'])), border=0, align='R', fill=bg)
-                pdf.cell(larguras[3], h_linha, limpar_texto(formatar_moeda(item['total']) + "  "), border=0, align='R', fill=bg)
-                
-                pdf.line(15, y_ini + h_linha, 195, y_ini + h_linha)
-                pdf.set_y(y_ini + h_linha)
-
-            pdf.ln(8)
-            
-            # Se não houver espaço para mostrar o Total Geral adequadamente, jogue para a próxima pág.
-            if pdf.get_y() > 225: 
-                pdf.add_page()
-            
-            # Totais
-            pdf.set_fill_color(235, 235, 235)
-            pdf.set_draw_color(0, 0, 0)
-            pdf.set_x(120)
-            pdf.rect(120, pdf.get_y(), 75, 12, 'DF')
-            pdf.set_font('Helvetica', 'B', 12)
-            pdf.cell(40, 12, limpar_texto("  TOTAL GERAL"), border=0, align='L')
-            pdf.cell(35, 12, limpar_texto(formatar_moeda(orcamento['total']) + "  "), border=0, align='R')
-            pdf.ln(15)
-
-            nome_arq = f"Orcamento_{orcamento['id']}_{sanitizar_nome_arquivo(orcamento['cliente'])}.pdf"
-            caminho_final = os.path.join(dir_salvamento, nome_arq)
-            pdf.output(caminho_final)
-            abrir_arquivo_externo(caminho_final)
-
-            return {'status': 'ok', 'arquivo': caminho_final}
+            caminho_final = os.path.join(dir_salvamento, nome_arquivo_pdf(orcamento))
+            inicio = time.perf_counter()
+            chave = chave_cache_pdf(contexto, orcamento)
+            do_cache = self.cache_pdf.copiar(chave, caminho_final)
+            tempos['cache'] = time.perf_counter() - inicio
+            if not do_cache:
+                renderizar_pdf(contexto, orcamento, caminho_final, tempos)
+                self.cache_pdf.guardar(chave, orcamento['id'], caminho_final)
+            if abrir:
+                inicio = time.perf_counter()
+                abrir_arquivo_externo(caminho_final)
+                tempos['abertura'] = time.perf_counter() - inicio
+
+            diagnostico.registrar_fases_pdf(tempos)
+            return {'status': 'ok', 'arquivo': caminho_final, 'cache': do_cache}
         except Exception as e:
-            import traceback
             traceback.print_exc()
+            diagnostico.registrar_erro('gerar_pdf', e, traceback.format_exc())
             return {'status': 'erro', 'mensagem': str(e)}
 
+# ===[ LINHA DE COMANDO ]===
+# Modo sem interface gráfica (servidor, cron, scripts): não importa o pywebview
+
+def imprimir_json(dados):
+    print(json.dumps(dados, ensure_ascii=False, indent=2))
+
+def cli_pdf(api, args):
+    parametros = {'ids': args.ids, 'status': args.status, 'data_inicio': args.de, 'data_fim': args.ate, 'pasta': args.pasta}
+    if args.consolidado:
+        parametros['caminho'] = args.consolidado
+        resposta = api.exportar_pdf_consolidado(parametros)
+    else:
+        resposta = api.exportar_pdfs_lote(parametros)
+    if resposta['status'] != 'ok':
+        print(resposta['mensagem'], file=sys.stderr)
+        return 1
+
+    while True:
+        progresso = api.obter_progresso_lote(resposta['id_lote'])
+        unidade = 'orçamentos' if args.consolidado else 'PDFs'
+        print(f"\r{progresso['concluidos']}/{progresso['total']} {unidade}", end='', file=sys.stderr, flush=True)
+        if progresso['finalizado']:
+            break
+        time.sleep(0.5)
+    print(file=sys.stderr)
+
+    for falha in progresso['falhas']:
+        print(f"Orçamento {falha['id']}: {falha['mensagem']}", file=sys.stderr)
+    if progresso.get('erro'):
+        print(progresso['erro'], file=sys.stderr)
+        return 1
+    if args.consolidado:
+        print(f"Relatório com {progresso['concluidos'] - len(progresso['falhas'])} orçamento(s) gravado(s) em {args.consolidado}")
+        return 1 if progresso['falhas'] else 0
+    print(f"{len(progresso['arquivos'])} PDF(s) gerado(s), {len(progresso['falhas'])} falha(s)")
+    return 1 if progresso['falhas'] else 0
+
+def parametros_acao_lote(args):
+    return {'ids': args.ids, 'status': args.status, 'data_inicio': args.de, 'data_fim': args.ate,
+            'mais_antigos_que': args.mais_antigos_que}
+
+def cli_status(api, args):
+    resposta = api.atualizar_status_lote({**parametros_acao_lote(args), 'novo_status': args.novo_status})
+    if resposta['status'] != 'ok':
+        print(resposta['mensagem'], file=sys.stderr)
+        return 1
+    print(f"{resposta['alterados']} orçamento(s) alterado(s) para {args.novo_status}, {resposta['inalterados']} já estava(m) nesse status")
+    return 0
+
+def cli_excluir(api, args):
+    resposta = api.excluir_orcamentos_lote(parametros_acao_lote(args))
+    if resposta['status'] != 'ok':
+        print(resposta['mensagem'], file=sys.stderr)
+        return 1
+    print(f"{resposta['excluidos']} orçamento(s) excluído(s)")
+    return 0
+
+def cli_importar(api, args):
+    """Importa orçamentos de um CSV (um item por linha) ou JSON Lines (um orçamento por linha)."""
+    def ao_rejeitar(linha, mensagem):
+        print(f"Linha {linha}: {mensagem}", file=sys.stderr)
+
+    resumo = importar_orcamentos(api.banco, args.arquivo, formato=args.formato, ao_rejeitar=ao_rejeitar, tamanho_lote=args.lote)
+    print(f"{resumo['importados']} orçamento(s) e {resumo['itens']} item(ns) importado(s) em {resumo['duracao']}s "
+          f"({resumo['por_segundo']} orçamentos/s), {resumo['rejeitados']} linha(s) rejeitada(s)")
+    return 1 if resumo['rejeitados'] else 0
+
+def cli_exportar(api, args):
+    parametros = {'status': args.status, 'data_inicio': args.de, 'data_fim': args.ate}
+    resumo = exportar_orcamentos(api.banco, args.arquivo, args.formato, parametros, args.itens)
+    print(f"{resumo['linhas']} registro(s) exportado(s) para {resumo['arquivo']} em {resumo['duracao']}s")
+    return 0
+
+def cli_estatisticas(api, args):
+    if args.verificar or args.corrigir:
+        resposta = api.verificar_estatisticas(corrigir=args.corrigir)
+        imprimir_json(resposta)
+        return 1 if resposta['divergencias'] and not args.corrigir else 0
+    imprimir_json(api.obter_estatisticas())
+    return 0
+
+def cli_manutencao(api, args):
+    if args.relatorio:
+        imprimir_json(api.obter_estado_manutencao())
+        return 0
+    resposta = api.otimizar_banco(compactar=None if args.auto else True)
+    imprimir_json(resposta)
+    return 0 if resposta['status'] == 'ok' else 1
+
+def cli_backup(api, args):
+    def ao_progredir(copiadas, total):
+        print(f"\r{copiadas}/{total} páginas", end='', file=sys.stderr, flush=True)
+
+    pasta = args.pasta or PASTA_BACKUPS
+    resultado = criar_backup(api.banco, pasta, ao_progredir)
+    print(file=sys.stderr)
+    if args.manter is not None:
+        resultado['removidos'] += rotacionar_backups(pasta, args.manter)
+    registrar_execucao(api.banco, 'backup', resultado)
+    imprimir_json(resultado)
+    return 0
+
+def cli_logo(api, args):
+    """Otimiza um novo logo ou, sem arquivo, o logo já configurado (ex.: os PNGs de 3300 px antigos)."""
+    origem = args.arquivo or api.obter_configuracoes().get('caminho_logo')
+    if not origem or not os.path.exists(origem):
+        print('Nenhum logo configurado', file=sys.stderr)
+        return 1
+    imprimir_json(api._instalar_logo(origem, configurar=True))
+    return 0
+
+def executar_cli(argumentos):
+    """Ponto de entrada da linha de comando. Retorna o código de saída do processo."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='orcapro', description='OrcaPro em modo linha de comando')
+    parser.add_argument('--banco', help='Arquivo do banco de dados (padrão: orcamentos.db da aplicação)')
+    parser.add_argument('--tempos', action='store_true', help='Mostra no stderr os tempos de inicialização e do comando')
+    parser.add_argument('--perfil', type=float, metavar='MS', help='Grava o cProfile das chamadas mais lentas que MS milissegundos')
+    parser.add_argument('--multiusuario', action='store_true', help='Abre o banco no modo multiusuário (pasta de rede compartilhada)')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_pdf = sub.add_parser('pdf', help='Exporta os PDFs de vários orçamentos')
+    p_pdf.add_argument('ids', nargs='*', type=int, help='IDs dos orçamentos (vazio: usa os filtros)')
+    p_pdf.add_argument('--status', choices=STATUS_VALIDOS)
+    p_pdf.add_argument('--de', help='Data inicial (AAAA-MM-DD)')
+    p_pdf.add_argument('--ate', help='Data final (AAAA-MM-DD)')
+    p_pdf.add_argument('--pasta', help='Pasta de destino (padrão: a das configurações)')
+    p_pdf.add_argument('--consolidado', metavar='ARQUIVO', help=f'Gera um único PDF com capa de totais em vez de um por orçamento (até {LIMITE_ORCAMENTOS_CONSOLIDADO})')
+    p_pdf.set_defaults(funcao=cli_pdf)
+
+    p_status = sub.add_parser('status', help='Muda o status de vários orçamentos numa única transação')
+    p_status.add_argument('novo_status', choices=STATUS_VALIDOS)
+    p_status.add_argument('ids', nargs='*', type=int, help='IDs dos orçamentos (vazio: usa os filtros)')
+    p_status.add_argument('--status', choices=STATUS_VALIDOS, help='Só os orçamentos neste status')
+    p_status.add_argument('--de', help='Data inicial (AAAA-MM-DD)')
+    p_status.add_argument('--ate', help='Data final (AAAA-MM-DD)')
+    p_status.add_argument('--mais-antigos-que', type=int, metavar='DIAS', help='Só os criados há mais de DIAS dias')
+    p_status.set_defaults(funcao=cli_status)
+
+    p_excluir = sub.add_parser('excluir', help='Exclui vários orçamentos numa única transação')
+    p_excluir.add_argument('ids', nargs='*', type=int, help='IDs dos orçamentos (vazio: usa os filtros)')
+    p_excluir.add_argument('--status', choices=STATUS_VALIDOS, help='Só os orçamentos neste status')
+    p_excluir.add_argument('--de', help='Data inicial (AAAA-MM-DD)')
+    p_excluir.add_argument('--ate', help='Data final (AAAA-MM-DD)')
+    p_excluir.add_argument('--mais-antigos-que', type=int, metavar='DIAS', help='Só os criados há mais de DIAS dias')
+    p_excluir.set_defaults(funcao=cli_excluir)
+
+    p_importar = sub.add_parser('importar', help='Importa orçamentos de um arquivo CSV ou JSON Lines')
+    p_importar.add_argument('arquivo')
+    p_importar.add_argument('--formato', choices=['csv', 'jsonl'], help='Padrão: pela extensão do arquivo')
+    p_importar.add_argument('--lote', type=int, default=TAMANHO_LOTE_IMPORTACAO, help='Orçamentos por transação')
+    p_importar.set_defaults(funcao=cli_importar)
+
+    p_exportar = sub.add_parser('exportar', help='Exporta o histórico para CSV, JSON Lines ou XLSX')
+    p_exportar.add_argument('arquivo')
+    p_exportar.add_argument('--formato', choices=FORMATOS_EXPORTACAO, help='Padrão: pela extensão do arquivo')
+    p_exportar.add_argument('--itens', action='store_true', help='Uma linha por item (no JSONL, a lista de itens)')
+    p_exportar.add_argument('--status', choices=STATUS_VALIDOS)
+    p_exportar.add_argument('--de', help='Data inicial (AAAA-MM-DD)')
+    p_exportar.add_argument('--ate', help='Data final (AAAA-MM-DD)')
+    p_exportar.set_defaults(funcao=cli_exportar)
+
+    p_estat = sub.add_parser('estatisticas', help='Mostra os totais do dashboard')
+    p_estat.add_argument('--verificar', action='store_true', help='Compara os agregados com um recálculo completo')
+    p_estat.add_argument('--corrigir', action='store_true', help='Reconstrói os agregados se houver divergência')
+    p_estat.set_defaults(funcao=cli_estatisticas)
+
+    p_manut = sub.add_parser('manutencao', help='Compacta e otimiza o banco de dados')
+    p_manut.add_argument('--auto', action='store_true', help=f'Só faz VACUUM com fragmentação acima de {LIMITE_FRAGMENTACAO_VACUUM:g}%%')
+    p_manut.add_argument('--relatorio', action='store_true', help='Só mostra tamanho, fragmentação e backups, sem alterar nada')
+    p_manut.set_defaults(funcao=cli_manutencao)
+
+    p_backup = sub.add_parser('backup', help='Copia o banco em uso para um snapshot consistente')
+    p_backup.add_argument('--pasta', help='Pasta dos snapshots (padrão: backups/ da aplicação)')
+    p_backup.add_argument('--manter', type=int, help=f'Snapshots mantidos na pasta (padrão: {LIMITE_SNAPSHOTS})')
+    p_backup.set_defaults(funcao=cli_backup)
+
+    p_logo = sub.add_parser('logo', help='Otimiza o logo usado nos PDFs')
+    p_logo.add_argument('arquivo', nargs='?', help='Nova imagem (padrão: reprocessa o logo atual)')
+    p_logo.set_defaults(funcao=cli_logo)
+
+    args = parser.parse_args(argumentos)
+    diagnostico.limite_perfil_ms = args.perfil
+    if args.banco or args.multiusuario:
+        banco_dados = BancoDados(args.banco or ARQUIVO_DB, multiusuario=args.multiusuario or MODO_MULTIUSUARIO)
+    else:
+        banco_dados = banco
+    try:
+        inicializar_banco(banco_dados)
+        marcar_inicializacao('banco')
+        return args.funcao(InterfaceSistema(banco_dados), args)
+    finally:
+        banco_dados.fechar()
+        if args.tempos:
+            marcar_inicializacao(args.comando)
+            print(resumo_inicializacao(), file=sys.stderr)
+            for chamada in diagnostico.resumo()['chamadas']:
+                print(f"{chamada['metodo']}: {chamada['quantidade']}x, {chamada['total_ms']}ms "
+                      f"(SQL: {chamada['sql_consultas']} consultas, {chamada['sql_ms']}ms)", file=sys.stderr)
+
 # ===[ EXECUÇÃO ]===
 
-if __name__ == '__main__':
+# Milissegundos desde o início do processo até o fim de cada etapa da inicialização
+TEMPOS_INICIALIZACAO = {}
+
+def marcar_inicializacao(etapa):
+    TEMPOS_INICIALIZACAO[etapa] = round((time.perf_counter() - INICIO_PROCESSO) * 1000, 1)
+
+def resumo_inicializacao():
+    return 'Inicialização: ' + ', '.join(f'{etapa} {ms:.0f}ms' for etapa, ms in TEMPOS_INICIALIZACAO.items())
+
+def iniciar_interface():
+    import webview
+    marcar_inicializacao('webview')
+
     inicializar_banco()
+    marcar_inicializacao('banco')
     api = InterfaceSistema()
+    copiar_assinaturas(InterfaceSistema)
+    api._iniciar_agendador()
     caminho_html = os.path.join(obter_caminho_app(), 'web', 'index.html')
     api.janela = webview.create_window('OrcaPro', caminho_html, js_api=api, width=1200, height=850)
-    webview.start()
\ No newline at end of file
+
+    def janela_carregada():
+        if 'janela' not in TEMPOS_INICIALIZACAO:
+            marcar_inicializacao('janela')
+            print(resumo_inicializacao())
+    api.janela.events.loaded += janela_carregada
+
+    webview.start()
+    banco.fechar()
+
+if __name__ == '__main__':
+    marcar_inicializacao('importacao')
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        sys.exit(executar_cli(sys.argv[1:]))
+    iniciar_interface()
@@ -0,0 +1,521 @@
+"""
+Geração dos PDFs de orçamento (FPDF + Pillow).
+
+Importado sob demanda por main.renderizar_pdf, para que a abertura do programa e
+a linha de comando não paguem o carregamento do FPDF e do Pillow.
+"""
+import os
+import threading
+import time
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from fpdf.image_parsing import preload_image
+from fpdf.image_datastructures import ImageCache
+
+# ===[ FUNÇÕES AUXILIARES ]===
+
+def formatar_moeda(valor):
+    """Formata float para BRL."""
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def limpar_texto(texto):
+    """Converte texto para latin-1 para compatibilidade com fontes padrão do FPDF."""
+    if not texto: return ""
+    return str(texto).encode('latin-1', 'replace').decode('latin-1')
+
+
+# ===[ GERAÇÃO DE PDF ]===
+
+# Rótulos fixos do PDF, convertidos para latin-1 uma única vez
+ROTULOS_PDF = {chave: limpar_texto(texto) for chave, texto in {
+    'titulo': "ORÇAMENTO", 'numero': "Número:", 'data': "Data:", 'preparado_para': "PREPARADO PARA:",
+    'col_descricao': "  DESCRIÇÃO / SERVIÇO", 'col_qtd': "QTD", 'col_unitario': "UNITÁRIO", 'col_total': "TOTAL  ",
+    'formas_pagamento': "Formas de Pagamento Aceitas:", 'total_geral': "  TOTAL GERAL",
+    'titulo_relatorio': "RELATÓRIO", 'emitido_em': "Emitido em:", 'resumo_status': "RESUMO POR STATUS",
+    'col_status': "  STATUS", 'col_quantidade': "ORÇAMENTOS", 'col_valor': "VALOR TOTAL  ", 'total': "  TOTAL",
+}.items()}
+
+STATUS_RELATORIO = ('APROVADO', 'PENDENTE', 'REJEITADO')
+
+class ModeloPDF:
+    """Parte do PDF que depende apenas das configurações da empresa.
+
+    Guarda os textos da empresa, do rodapé e das formas de pagamento já convertidos
+    e o logo já decodificado, para reaproveitar em todas as páginas e documentos.
+    """
+    def __init__(self, contexto):
+        empresa = contexto['dados_empresa']
+        self.nome_empresa = limpar_texto(empresa.get('nome', 'Minha Empresa'))
+        self.linhas_empresa = []
+        if empresa.get('razao_social'): self.linhas_empresa.append(limpar_texto(empresa['razao_social']))
+        if empresa.get('cnpj'): self.linhas_empresa.append(limpar_texto(f"CNPJ: {empresa['cnpj']}"))
+        if empresa.get('endereco'): self.linhas_empresa.append(limpar_texto(empresa['endereco']))
+        if empresa.get('telefone'): self.linhas_empresa.append(limpar_texto(f"Tel: {empresa['telefone']}"))
+
+        self.texto_rodape = limpar_texto(contexto['texto_rodape'])
+
+        pagamentos = contexto['metodos_pagamento']
+        self.possui_pagamentos = bool(pagamentos)
+        texto_metodos = []
+        if pagamentos.get('pix'): texto_metodos.append("PIX")
+        if pagamentos.get('credito'): texto_metodos.append("Cartão de Crédito")
+        if pagamentos.get('debito'): texto_metodos.append("Cartão de Débito")
+        if pagamentos.get('dinheiro'): texto_metodos.append("Dinheiro")
+        self.texto_pagamentos = limpar_texto(", ".join(texto_metodos) + ".") if texto_metodos else ""
+
+        caminho_logo = empresa.get('caminho_logo')
+        self.caminho_logo = caminho_logo if caminho_logo and os.path.exists(caminho_logo) else None
+        self.cache_logo = self._decodificar_logo(self.caminho_logo) if self.caminho_logo else None
+
+    @staticmethod
+    def _decodificar_logo(caminho):
+        try:
+            cache = ImageCache()
+            preload_image(cache, caminho)
+            return cache
+        except Exception:
+            return None
+
+    def registrar_logo(self, pdf):
+        """Entrega o logo já decodificado ao cache de imagens de um novo documento."""
+        if self.cache_logo is not None:
+            for nome, info in self.cache_logo.images.items():
+                pdf.image_cache.images[nome] = type(info)(info, usages=0)
+            pdf.image_cache.icc_profiles.update(self.cache_logo.icc_profiles)
+        return self.caminho_logo
+
+_modelo_pdf = None
+_trava_modelo_pdf = threading.Lock()
+
+def obter_modelo_pdf(contexto):
+    """Retorna o ModeloPDF das configurações atuais, recriando-o só quando elas ou o logo mudam."""
+    global _modelo_pdf
+    caminho_logo = contexto['dados_empresa'].get('caminho_logo')
+    try:
+        estado_logo = os.stat(caminho_logo)
+        assinatura_logo = (estado_logo.st_mtime_ns, estado_logo.st_size)
+    except (OSError, TypeError):
+        assinatura_logo = None
+    chave = (
+        tuple(sorted(contexto['dados_empresa'].items())), tuple(sorted(contexto['metodos_pagamento'].items())),
+        contexto['texto_rodape'], assinatura_logo
+    )
+    with _trava_modelo_pdf:
+        if _modelo_pdf is None or _modelo_pdf[0] != chave:
+            _modelo_pdf = (chave, ModeloPDF(contexto))
+        return _modelo_pdf[1]
+
+def invalidar_modelo_pdf():
+    """Descarta o ModeloPDF em cache (configurações ou logo alterados)."""
+    global _modelo_pdf
+    with _trava_modelo_pdf:
+        _modelo_pdf = None
+
+class RelatorioPDF(FPDF):
+    """Documento de um orçamento ou, no relatório consolidado, de vários em sequência.
+
+    Sem orçamento (capa do consolidado), o cabeçalho mostra só a empresa e a data de
+    emissão; definir_orcamento troca o orçamento dos próximos cabeçalhos.
+    """
+    def __init__(self, modelo, orcamento=None, data_formatada=''):
+        super().__init__()
+        self.modelo = modelo
+        self.orcamento = None
+        self.data_str = limpar_texto(data_formatada)
+        if orcamento is not None:
+            self.definir_orcamento(orcamento)
+        self.logo = modelo.registrar_logo(self)
+        # Margem inferior aumentada para comportar o rodapé estendido com segurança
+        self.set_auto_page_break(auto=True, margin=35)
+        self.set_margins(15, 15, 15)
+        # Último Y utilizável pelo conteúdo: a linha divisória do rodapé fica 2mm acima da margem
+        self.limite_conteudo = self.page_break_trigger - 3
+
+    def definir_orcamento(self, orcamento):
+        self.orcamento = orcamento
+        self.data_str = limpar_texto(orcamento['data_criacao'])
+        self.numero = limpar_texto(f"#{orcamento['id']:04d}")
+        self.nome_cliente = limpar_texto(orcamento['cliente'])
+        detalhes_cliente = [orcamento[campo] for campo in ('email', 'telefone') if orcamento.get(campo)]
+        self.detalhes_cliente = limpar_texto(" | ".join(detalhes_cliente))
+        self.endereco_cliente = limpar_texto(orcamento.get('endereco'))
+
+    def header(self):
+        # Topo decorativo
+        self.set_fill_color(55, 65, 81)
+        self.rect(0, 0, 210, 5, 'F')
+        self.ln(10)
+        
+        possui_logo = False
+        if self.logo:
+            try:
+                self.image(self.logo, 15, 12, w=30)
+                possui_logo = True
+            except:
+                pass
+
+        pos_texto_x = 50 if possui_logo else 15
+        
+        # Dados da Empresa
+        self.set_xy(pos_texto_x, 15)
+        self.set_text_color(0, 0, 0)
+        self.set_font('Helvetica', 'B', 14)
+        self.cell(100, 7, self.modelo.nome_empresa, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+        
+        self.set_font('Helvetica', '', 9)
+        self.set_text_color(80, 80, 80)
+        
+        for linha in self.modelo.linhas_empresa:
+            self.set_x(pos_texto_x)
+            self.cell(100, 5, linha, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+
+        if self.orcamento is None:
+            self.cabecalho_capa()
+            return
+
+        # Título do Documento
+        self.set_y(15)
+        self.set_font('Helvetica', 'B', 24)
+        self.set_text_color(200, 200, 200)
+        self.cell(0, 10, ROTULOS_PDF['titulo'], border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+
+        y_pos = 28
+        self.set_xy(110, y_pos)
+        self.set_font('Helvetica', 'B', 10)
+        self.set_text_color(0, 0, 0)
+        self.cell(40, 6, ROTULOS_PDF['numero'], border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='R')
+        self.set_font('Helvetica', '', 10)
+        self.cell(45, 6, self.numero, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+        
+        self.set_xy(110, y_pos + 6)
+        self.set_font('Helvetica', 'B', 10)
+        self.cell(40, 6, ROTULOS_PDF['data'], border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='R')
+        self.set_font('Helvetica', '', 10)
+        self.cell(45, 6, self.data_str, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+
+        self.set_y(max(self.get_y(), 50)) 
+        self.ln(5)
+        
+        # Dados do Cliente
+        self.set_draw_color(200, 200, 200)
+        self.line(15, self.get_y(), 195, self.get_y())
+        self.ln(5)
+        
+        self.set_font('Helvetica', 'B', 10)
+        self.set_text_color(100, 100, 100)
+        self.cell(0, 6, ROTULOS_PDF['preparado_para'], border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+        
+        self.set_font('Helvetica', 'B', 12)
+        self.set_text_color(0, 0, 0)
+        self.cell(0, 7, self.nome_cliente, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+        
+        self.set_font('Helvetica', '', 10)
+        self.set_text_color(80, 80, 80)
+        
+        if self.detalhes_cliente:
+            self.cell(0, 5, self.detalhes_cliente, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+            
+        if self.endereco_cliente:
+            self.cell(0, 5, self.endereco_cliente, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+            
+        self.ln(8) # Espaço antes do começo da tabela
+
+    def cabecalho_capa(self):
+        """Título e data de emissão da capa do relatório consolidado."""
+        self.set_y(15)
+        self.set_font('Helvetica', 'B', 24)
+        self.set_text_color(200, 200, 200)
+        self.cell(0, 10, ROTULOS_PDF['titulo_relatorio'], border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+
+        self.set_xy(110, 28)
+        self.set_font('Helvetica', 'B', 10)
+        self.set_text_color(0, 0, 0)
+        self.cell(40, 6, ROTULOS_PDF['emitido_em'], border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='R')
+        self.set_font('Helvetica', '', 10)
+        self.cell(45, 6, self.data_str, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R')
+
+        self.set_y(max(self.get_y(), 50))
+        self.ln(5)
+        self.set_draw_color(200, 200, 200)
+        self.line(15, self.get_y(), 195, self.get_y())
+        self.ln(8)
+
+    def cabecalho_tabela(self):
+        """Desenha os cabeçalhos das colunas (Repetido automaticamente em novas páginas)."""
+        self.set_font('Helvetica', 'B', 10)
+        self.set_fill_color(50, 50, 50)
+        self.set_draw_color(50, 50, 50)
+        self.set_text_color(255, 255, 255)
+        larguras = [90, 25, 30, 35]
+        
+        self.cell(larguras[0], 9, ROTULOS_PDF['col_descricao'], border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='L', fill=True)
+        self.cell(larguras[1], 9, ROTULOS_PDF['col_qtd'], border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
+        self.cell(larguras[2], 9, ROTULOS_PDF['col_unitario'], border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='R', fill=True)
+        self.cell(larguras[3], 9, ROTULOS_PDF['col_total'], border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R', fill=True)
+        
+        self.set_font('Helvetica', '', 10)
+        self.set_text_color(0, 0, 0)
+        self.set_draw_color(220, 220, 220)
+
+    def footer(self):
+        """Rodapé fixo em todas as páginas."""
+        # Define a altura base do rodapé baseada na presença do texto extra das configurações
+        y_pos = -35 if self.modelo.texto_rodape else -25
+        self.set_y(y_pos)
+        
+        # Texto customizado de observação / rodapé
+        if self.modelo.texto_rodape:
+            self.set_draw_color(200, 200, 200)
+            self.line(15, self.get_y()-2, 195, self.get_y()-2)
+            self.set_font('Helvetica', '', 9)
+            self.set_text_color(60, 60, 60)
+            self.multi_cell(0, 5, self.modelo.texto_rodape, align='C')
+            self.ln(3)
+
+        # Formas de Pagamento
+        if self.modelo.possui_pagamentos:
+            self.set_font('Helvetica', 'B', 8)
+            self.set_text_color(50, 50, 50)
+            self.cell(0, 4, ROTULOS_PDF['formas_pagamento'], border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+            self.set_font('Helvetica', '', 8)
+            
+            if self.modelo.texto_pagamentos:
+                self.cell(0, 4, self.modelo.texto_pagamentos, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+
+        # Contagem de páginas
+        self.set_y(-15)
+        self.set_font('Helvetica', 'I', 8)
+        self.set_text_color(150, 150, 150)
+        self.cell(0, 10, limpar_texto(f'Página {self.page_no()}/{{paginas}}'), border=0, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C')
+
+class TabelaItensPDF:
+    """Layout da tabela de itens do RelatorioPDF.
+
+    Cada descrição é quebrada em linhas uma única vez e as mesmas linhas são
+    desenhadas em seguida, então a altura da linha é exata e as quebras de página
+    são decididas contra o limite real do conteúdo. Itens mais altos que uma
+    página inteira continuam na página seguinte.
+    """
+    LARGURAS = [90, 25, 30, 35]
+    ALTURA_LINHA = 7
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        # A tabela começa sempre no mesmo Y (o cabeçalho é igual em todas as páginas)
+        self.linhas_por_pagina = max(1, int((pdf.limite_conteudo - pdf.get_y()) // self.ALTURA_LINHA))
+        self.largura_util = self.LARGURAS[0] - 2 * pdf.c_margin
+        self._larguras = {}  # Largura de cada palavra já medida (a fonte da tabela não muda)
+
+    def largura(self, palavra):
+        w = self._larguras.get(palavra)
+        if w is None:
+            w = self._larguras[palavra] = self.pdf.get_string_width(palavra)
+        return w
+
+    def medir(self, texto):
+        """Quebra o texto na largura da coluna de descrição, retornando as linhas.
+
+        Quebra gulosa por palavras em tempo linear; o multi_cell do FPDF remede a
+        linha inteira a cada caractere, o que domina o tempo em orçamentos grandes.
+        """
+        limite = self.largura_util
+        espaco = self.largura(' ')
+        linhas = []
+        for paragrafo in texto.split('\n'):
+            atual, w_atual = [], 0.0
+            for palavra in paragrafo.split(' '):
+                w = self.largura(palavra)
+                if atual and w_atual + espaco + w > limite:
+                    linhas.append(' '.join(atual).rstrip())
+                    atual, w_atual = [], 0.0
+                if not atual and w > limite:
+                    # Palavra maior que a coluna: corta por caracteres
+                    *inteiros, resto = self.cortar_palavra(palavra, limite)
+                    linhas.extend(inteiros)
+                    atual, w_atual = [resto], self.pdf.get_string_width(resto)
+                    continue
+                w_atual = w_atual + espaco + w if atual else w
+                atual.append(palavra)
+            linhas.append(' '.join(atual).rstrip())
+        return linhas
+
+    def cortar_palavra(self, palavra, limite):
+        pedacos, inicio = [], 0
+        for fim in range(1, len(palavra) + 1):
+            if fim - inicio > 1 and self.pdf.get_string_width(palavra[inicio:fim]) > limite:
+                pedacos.append(palavra[inicio:fim - 1])
+                inicio = fim - 1
+        pedacos.append(palavra[inicio:])
+        return pedacos
+
+    def desenhar(self, itens):
+        pdf = self.pdf
+        pdf.set_font('Helvetica', '', 10)
+        for i, item in enumerate(itens):
+            desc = item['desc']
+            if item.get('obs'): desc += f"\n(Obs: {item['obs']})"
+            linhas = self.medir(limpar_texto("  " + desc))
+            valores = (str(item['qtd']), limpar_texto(formatar_moeda(item['preco'])), limpar_texto(formatar_moeda(item['total']) + "  "))
+            fundo = (i % 2 == 1)
+
+            while linhas:
+                cabem = int((pdf.limite_conteudo - pdf.get_y()) // self.ALTURA_LINHA)
+                # Só divide o item se ele não couber nem em uma página vazia
+                if cabem < len(linhas) and (cabem < 1 or len(linhas) <= self.linhas_por_pagina):
+                    self.nova_pagina()
+                    continue
+                self.desenhar_linha(linhas[:cabem], valores, fundo)
+                linhas, valores = linhas[cabem:], ('', '', '')
+
+    def nova_pagina(self):
+        self.pdf.add_page()  # O FPDF automaticamente puxará o cabeçalho (empresa e cliente)
+        self.pdf.cabecalho_tabela()  # As colunas da tabela são repetidas manualmente
+
+    def desenhar_linha(self, linhas, valores, fundo):
+        pdf = self.pdf
+        larguras = self.LARGURAS
+        x_ini, y_ini = pdf.l_margin, pdf.get_y()
+        h_linha = len(linhas) * self.ALTURA_LINHA
+
+        if fundo:
+            pdf.set_fill_color(248, 248, 248)
+            pdf.rect(x_ini, y_ini, sum(larguras), h_linha, 'F')
+        pdf.line(x_ini, y_ini, x_ini, y_ini + h_linha)
+
+        for n, linha in enumerate(linhas):
+            pdf.set_xy(x_ini, y_ini + n * self.ALTURA_LINHA)
+            pdf.cell(larguras[0], self.ALTURA_LINHA, linha, border=0, align='L')
+
+        pdf.set_xy(x_ini + larguras[0], y_ini)
+        pdf.cell(larguras[1], h_linha, valores[0], border=0, align='C')
+        pdf.cell(larguras[2], h_linha, valores[1], border=0, align='R')
+        pdf.cell(larguras[3], h_linha, valores[2], border=0, align='R')
+
+        pdf.line(15, y_ini + h_linha, 195, y_ini + h_linha)
+        pdf.set_y(y_ini + h_linha)
+
+def renderizar_pdf(contexto, orcamento, caminho_final, tempos=None):
+    """Monta o PDF de um orçamento e grava em 'caminho_final'.
+
+    Chamada por main.renderizar_pdf, inclusive nos processos do exportador em lote. Com
+    'tempos' (dict), registra nele a duração (s) das fases: logo (modelo e imagem do logo),
+    layout e gravacao.
+    """
+    inicio = time.perf_counter()
+    # Instancia o PDF com todos os dados preenchidos
+    pdf = RelatorioPDF(obter_modelo_pdf(contexto), orcamento)
+    inicio_layout = time.perf_counter()
+    pdf.alias_nb_pages('{paginas}')  # Alias largo: comporta contagens de 4+ dígitos
+    pdf.add_page()
+    desenhar_orcamento(pdf, orcamento)
+
+    inicio_gravacao = time.perf_counter()
+    pdf.output(caminho_final)
+    if tempos is not None:
+        tempos.update(logo=inicio_layout - inicio, layout=inicio_gravacao - inicio_layout,
+                      gravacao=time.perf_counter() - inicio_gravacao)
+    return caminho_final
+
+def desenhar_orcamento(pdf, orcamento):
+    """Desenha a tabela de itens e o total de um orçamento a partir da página atual."""
+    # Cabeçalho da Tabela pela primeira vez
+    pdf.cabecalho_tabela()
+    TabelaItensPDF(pdf).desenhar(orcamento['itens'])
+
+    pdf.ln(8)
+
+    # Se não houver espaço para mostrar o Total Geral adequadamente, jogue para a próxima pág.
+    if pdf.get_y() + 12 > pdf.limite_conteudo:
+        pdf.add_page()
+
+    # Totais
+    pdf.set_fill_color(235, 235, 235)
+    pdf.set_draw_color(0, 0, 0)
+    pdf.set_x(120)
+    pdf.rect(120, pdf.get_y(), 75, 12, 'DF')
+    pdf.set_font('Helvetica', 'B', 12)
+    pdf.cell(40, 12, ROTULOS_PDF['total_geral'], border=0, align='L')
+    pdf.cell(35, 12, limpar_texto(formatar_moeda(orcamento['total']) + "  "), border=0, align='R')
+    pdf.ln(15)
+
+def desenhar_capa(pdf, titulo, totais):
+    """Conteúdo da capa do consolidado: descrição do filtro e totais por status."""
+    pdf.set_x(pdf.l_margin)  # Desenhada no fim do documento: o X é o da última célula
+    if titulo:
+        pdf.set_font('Helvetica', '', 11)
+        pdf.set_text_color(80, 80, 80)
+        pdf.multi_cell(0, 6, limpar_texto(titulo), new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+        pdf.ln(6)
+
+    pdf.set_font('Helvetica', 'B', 10)
+    pdf.set_text_color(100, 100, 100)
+    pdf.cell(0, 6, ROTULOS_PDF['resumo_status'], border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+    pdf.ln(2)
+
+    larguras = [80, 40, 60]
+    pdf.set_fill_color(50, 50, 50)
+    pdf.set_draw_color(50, 50, 50)
+    pdf.set_text_color(255, 255, 255)
+    pdf.cell(larguras[0], 9, ROTULOS_PDF['col_status'], border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='L', fill=True)
+    pdf.cell(larguras[1], 9, ROTULOS_PDF['col_quantidade'], border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
+    pdf.cell(larguras[2], 9, ROTULOS_PDF['col_valor'], border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R', fill=True)
+
+    # Status fixos primeiro, na ordem do dashboard; outros valores (dados antigos) no fim
+    linhas = [(status, totais.get(status, (0, 0.0))) for status in STATUS_RELATORIO]
+    linhas += [(status, total) for status, total in sorted(totais.items()) if status not in STATUS_RELATORIO]
+    pdf.set_font('Helvetica', '', 10)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_draw_color(220, 220, 220)
+    for i, (status, (quantidade, valor)) in enumerate(linhas):
+        pdf.set_fill_color(248, 248, 248)
+        fundo = (i % 2 == 1)
+        pdf.cell(larguras[0], 8, limpar_texto(f"  {status}"), border='B', new_x=XPos.RIGHT, new_y=YPos.TOP, align='L', fill=fundo)
+        pdf.cell(larguras[1], 8, str(quantidade), border='B', new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=fundo)
+        pdf.cell(larguras[2], 8, limpar_texto(formatar_moeda(valor) + "  "), border='B', new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R', fill=fundo)
+
+    pdf.set_fill_color(235, 235, 235)
+    pdf.set_draw_color(0, 0, 0)
+    pdf.set_font('Helvetica', 'B', 11)
+    quantidade_total = sum(quantidade for quantidade, _ in totais.values())
+    valor_total = sum(valor for _, valor in totais.values())
+    pdf.cell(larguras[0], 10, ROTULOS_PDF['total'], border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='L', fill=True)
+    pdf.cell(larguras[1], 10, str(quantidade_total), border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
+    pdf.cell(larguras[2], 10, limpar_texto(formatar_moeda(valor_total) + "  "), border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R', fill=True)
+
+def renderizar_consolidado(contexto, orcamentos, caminho_final, titulo='', data_emissao=''):
+    """Grava em um único PDF uma capa com os totais por status e, em seguida, cada orçamento.
+
+    'orcamentos' é um iterável (de preferência um gerador lido do banco em blocos), consumido
+    uma única vez: os dados de cada orçamento são descartados após o desenho, mas o FPDF
+    mantém todas as páginas na memória até o output(), então o consumo cresce com o
+    relatório (quem chama limita a quantidade, ver LIMITE_ORCAMENTOS_CONSOLIDADO em
+    main.py). Fontes e logo são registrados uma vez para o documento todo. A capa é reservada no início e preenchida no fim (insert_toc_placeholder do
+    FPDF), quando os totais já são conhecidos; cada orçamento vira um marcador do PDF.
+    Retorna os totais por status: {status: (quantidade, valor)}.
+    """
+    orcamentos = iter(orcamentos)
+    primeiro = next(orcamentos, None)
+    if primeiro is None:
+        raise ValueError('Nenhum orçamento para o relatório')
+
+    totais = {}
+    pdf = RelatorioPDF(obter_modelo_pdf(contexto), data_formatada=data_emissao)
+    pdf.alias_nb_pages('{paginas}')
+    pdf.add_page()
+    # A quebra de página da capa já desenha o cabeçalho do primeiro orçamento
+    pdf.definir_orcamento(primeiro)
+    pdf.insert_toc_placeholder(lambda pdf, _: desenhar_capa(pdf, titulo, totais), pages=1, reset_page_indices=False)
+
+    orcamento = primeiro
+    while orcamento is not None:
+        if orcamento is not primeiro:
+            pdf.definir_orcamento(orcamento)
+            pdf.add_page()
+        pdf.start_section(f"#{orcamento['id']:04d} - {orcamento['cliente']}")
+        desenhar_orcamento(pdf, orcamento)
+        quantidade, valor = totais.get(orcamento['status'], (0, 0.0))
+        totais[orcamento['status']] = (quantidade + 1, valor + (orcamento['total'] or 0))
+        orcamento = next(orcamentos, None)
+
+    pdf.output(caminho_final)
+    return totais
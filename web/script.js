@@ -3,12 +3,36 @@ let itensAtuais = [];
 let totalGeral = 0;
 let indiceEdicao = -1;
 let idOrcamentoAtual = null;
+let versaoOrcamentoAtual = null;  // Versão lida ao abrir a edição (detecta alterações de outros usuários)
+let linhasItens = [];          // O que está desenhado em #lista-itens: { item, editando } por linha
+let cursorHistorico = null;
+let temporizadorBuscaHistorico = null;
+let clienteHistorico = null;   // Cliente escolhido para filtrar o histórico (id do cadastro)
+let sugestoesClientes = [];
+let temporizadorClientes = null;
+let historicoCarregado = [];   // Orçamentos já buscados (só os visíveis viram DOM)
+let fimHistorico = false;
+let consultaHistorico = 0;     // Incrementa a cada novo filtro, descartando respostas antigas
+let carregandoHistorico = null;
+let quadroHistorico = null;
+let janelaHistorico = { inicio: -1, fim: -1 };
+let loteAtual = null;
+let temporizadorLote = null;
+let pdfsEmAndamento = 0;
+let seqAlteracoes = null;      // Última sequência do registro de alterações já aplicada
+let selecaoHistorico = new Set();  // IDs marcados na lista (sobrevivem à virtualização)
+let recargaHistoricoPendente = false;  // Recarga adiada enquanto houver orçamentos marcados
+const INTERVALO_ALTERACOES_MS = 5000;
 
 /* ===[ UTILITÁRIOS DE FORMATAÇÃO ]=== */
 function formatarMoeda(valor) {
     return value = valor.toLocaleString('pt-BR', { style: 'currency', currency: 'BRL' });
 }
 
+function escaparHtml(texto) {
+    return String(texto ?? '').replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[c]));
+}
+
 function converterMoeda(str) {
     if (!str) return 0;
     // Remove R$, espaços e substitui vírgula por ponto
@@ -19,7 +43,7 @@ function converterMoeda(str) {
 function navegar(idTela) {
     document.querySelectorAll('.btn-nav').forEach(btn => btn.classList.remove('ativo'));
 
-    const mapa = { 'inicio': 0, 'criar': 1, 'historico': 2, 'configuracoes': 3, 'ajuda': 4 };
+    const mapa = { 'inicio': 0, 'criar': 1, 'historico': 2, 'configuracoes': 3, 'ajuda': 4, 'diagnostico': 5 };
     const botoes = document.querySelectorAll('.btn-nav');
     if (mapa[idTela] !== undefined) botoes[mapa[idTela]].classList.add('ativo');
 
@@ -28,7 +52,11 @@ function navegar(idTela) {
 
     if (idTela === 'inicio') carregarEstatisticas();
     if (idTela === 'historico') carregarHistorico();
-    if (idTela === 'configuracoes') carregarConfiguracoes();
+    if (idTela === 'configuracoes') {
+        carregarConfiguracoes();
+        carregarManutencao();
+    }
+    if (idTela === 'diagnostico') carregarDiagnostico();
 }
 
 function iniciarNovoOrcamento() {
@@ -39,6 +67,7 @@ function iniciarNovoOrcamento() {
 /* ===[ GERENCIAMENTO DE ITENS E FORMULÁRIO ]=== */
 function resetarFormulario() {
     idOrcamentoAtual = null;
+    versaoOrcamentoAtual = null;
     itensAtuais = [];
     document.getElementById('titulo-formulario').innerText = 'Novo Orçamento';
     document.getElementById('cliente-nome').value = '';
@@ -127,35 +156,59 @@ function editarItem(index) {
 function removerItem(index) {
     if (confirm('Remover este item?')) {
         itensAtuais.splice(index, 1);
+        // Remove só a linha correspondente; as seguintes continuam válidas
+        document.getElementById('lista-itens').deleteRow(index);
+        linhasItens.splice(index, 1);
         if (indiceEdicao === index) resetarEstadoEdicao();
+        else if (indiceEdicao > index) indiceEdicao--;
         renderizarItens();
     }
 }
 
+function desenharLinhaItem(tr, item, editando) {
+    let descHtml = `<strong>${escaparHtml(item.desc)}</strong>`;
+    if (item.obs) descHtml += `<span class="item-obs-texto">Obs: ${escaparHtml(item.obs)}</span>`;
+
+    // O índice vem da posição atual da linha, que continua certa após remoções
+    tr.className = editando ? 'linha-editando' : '';
+    tr.innerHTML = `
+        <td>${descHtml}</td>
+        <td>${item.qtd}</td>
+        <td>${formatarMoeda(item.preco)}</td>
+        <td>${formatarMoeda(item.total)}</td>
+        <td>
+            <button class="btn btn-secundario" style="padding: 5px 10px;" onclick="editarItem(this.closest('tr').sectionRowIndex)">✏️</button>
+            <button class="btn btn-perigo" style="padding: 5px 10px;" onclick="removerItem(this.closest('tr').sectionRowIndex)">X</button>
+        </td>
+    `;
+}
+
 function renderizarItens() {
+    // Atualiza só as linhas cujo item (ou destaque de edição) mudou desde o último desenho
     const corpoTabela = document.getElementById('lista-itens');
-    corpoTabela.innerHTML = '';
+    const novasLinhas = document.createDocumentFragment();
     totalGeral = 0;
 
     itensAtuais.forEach((item, index) => {
         totalGeral += item.total;
-        let descHtml = `<strong>${item.desc}</strong>`;
-        if (item.obs) descHtml += `<span class="item-obs-texto">Obs: ${item.obs}</span>`;
-
-        const linha = `
-            <tr class="${indiceEdicao === index ? 'linha-editando' : ''}">
-                <td>${descHtml}</td>
-                <td>${item.qtd}</td>
-                <td>${formatarMoeda(item.preco)}</td>
-                <td>${formatarMoeda(item.total)}</td>
-                <td>
-                    <button class="btn btn-secundario" style="padding: 5px 10px;" onclick="editarItem(${index})">✏️</button>
-                    <button class="btn btn-perigo" style="padding: 5px 10px;" onclick="removerItem(${index})">X</button>
-                </td>
-            </tr>
-        `;
-        corpoTabela.innerHTML += linha;
+        const editando = indiceEdicao === index;
+        const desenhada = linhasItens[index];
+        if (!desenhada) {
+            const tr = document.createElement('tr');
+            desenharLinhaItem(tr, item, editando);
+            novasLinhas.appendChild(tr);
+            linhasItens.push({ item, editando });
+        } else if (desenhada.item !== item || desenhada.editando !== editando) {
+            desenharLinhaItem(corpoTabela.rows[index], item, editando);
+            linhasItens[index] = { item, editando };
+        }
     });
+    corpoTabela.appendChild(novasLinhas);
+
+    while (linhasItens.length > itensAtuais.length) {
+        corpoTabela.deleteRow(-1);
+        linhasItens.pop();
+    }
 
     document.getElementById('display-total').innerText = `Total: ${formatarMoeda(totalGeral)}`;
 }
@@ -180,6 +233,7 @@ async function salvarOrcamento() {
 
     const dadosOrcamento = {
         id: idOrcamentoAtual,
+        versao: versaoOrcamentoAtual,
         cliente: cliente,
         telefone: telefone,
         email: email,
@@ -190,7 +244,18 @@ async function salvarOrcamento() {
     };
 
     try {
-        const resposta = await window.pywebview.api.salvar_orcamento(dadosOrcamento);
+        let resposta = await window.pywebview.api.salvar_orcamento(dadosOrcamento);
+        if (resposta.conflito) {
+            if (resposta.versao_atual === null) {
+                if (!confirm(`${resposta.mensagem}\n\nSalvar como um novo orçamento?`)) return;
+                dadosOrcamento.id = null;
+            } else if (!confirm(`${resposta.mensagem}\n\nOK: sobrescrever com a sua versão.\nCancelar: descartar suas mudanças e abrir a versão atual.`)) {
+                editarOrcamento(idOrcamentoAtual);
+                return;
+            }
+            dadosOrcamento.versao = resposta.versao_atual;
+            resposta = await window.pywebview.api.salvar_orcamento(dadosOrcamento);
+        }
         if (resposta.status === 'ok') {
             alert('Orçamento salvo com sucesso!');
             resetarFormulario();
@@ -203,11 +268,43 @@ async function salvarOrcamento() {
     }
 }
 
+/* ===[ AUTOCOMPLETAR DE CLIENTES ]=== */
+function agendarSugestoesClientes() {
+    clearTimeout(temporizadorClientes);
+    temporizadorClientes = setTimeout(carregarSugestoesClientes, 200);
+}
+
+async function carregarSugestoesClientes() {
+    const nome = document.getElementById('cliente-nome').value;
+    if (nome.trim().length < 2) return;
+    try {
+        const resposta = await window.pywebview.api.buscar_clientes(nome);
+        if (resposta.status !== 'ok') return;
+        sugestoesClientes = resposta.clientes;
+        document.getElementById('sugestoes-clientes').innerHTML = sugestoesClientes
+            .map(cliente => `<option value="${escaparHtml(cliente.nome)}">${cliente.quantidade} orçamento(s) • ${formatarMoeda(cliente.valor)}</option>`)
+            .join('');
+    } catch (e) { }
+}
+
+function preencherContatosCliente() {
+    // Ao escolher uma sugestão, completa só os campos de contato que ainda estão vazios
+    const nome = document.getElementById('cliente-nome').value;
+    const cliente = sugestoesClientes.find(sugestao => sugestao.nome === nome);
+    if (!cliente) return;
+    const campos = { 'cliente-email': cliente.email, 'cliente-telefone': cliente.telefone, 'cliente-endereco': cliente.endereco };
+    for (const [idCampo, valor] of Object.entries(campos)) {
+        const campo = document.getElementById(idCampo);
+        if (!campo.value && valor) campo.value = valor;
+    }
+}
+
 async function editarOrcamento(id) {
     try {
         const orcamento = await window.pywebview.api.obter_detalhes_orcamento(id);
         if (orcamento) {
             idOrcamentoAtual = orcamento.id;
+            versaoOrcamentoAtual = orcamento.versao;
             document.getElementById('titulo-formulario').innerText = `Editando Orçamento #${orcamento.id}`;
             document.getElementById('cliente-nome').value = orcamento.cliente;
             document.getElementById('cliente-email').value = orcamento.email || '';
@@ -221,83 +318,440 @@ async function editarOrcamento(id) {
 }
 
 /* ===[ HISTÓRICO E AÇÕES ]=== */
+function versaoItemHistorico(id) {
+    const item = historicoCarregado.find(item => item.id === id);
+    return item ? item.versao : null;
+}
+
 async function definirStatus(id, novoStatus) {
     try {
-        const resposta = await window.pywebview.api.atualizar_status(id, novoStatus);
-        if (resposta.status === 'ok') { carregarHistorico(); carregarEstatisticas(); }
+        const resposta = await window.pywebview.api.atualizar_status(id, novoStatus, versaoItemHistorico(id));
+        if (resposta.status === 'ok') {
+            const filtroStatus = document.getElementById('historico-status').value;
+            atualizarItemHistorico(id, filtroStatus && filtroStatus !== novoStatus ? null : { status: novoStatus, versao: resposta.versao });
+            carregarEstatisticas();
+        } else if (resposta.conflito) {
+            alert(resposta.mensagem + ' A lista foi atualizada; confira antes de repetir.');
+            verificarAlteracoes();
+        }
     } catch (e) { }
 }
 
 async function gerarPDF(id) {
     try {
-        document.body.style.cursor = 'wait';
         const resposta = await window.pywebview.api.gerar_pdf(id);
-        document.body.style.cursor = 'default';
-
-        if (resposta.status === 'ok') {
-            console.log("PDF Gerado:", resposta.arquivo);
-        } else {
+        if (resposta.status !== 'ok') {
             alert('Erro ao gerar PDF: ' + resposta.mensagem);
+            return;
         }
+        pdfsEmAndamento++;
+        document.body.style.cursor = 'progress';
+        acompanharPDF(resposta.id_tarefa);
     } catch (e) {
-        document.body.style.cursor = 'default';
         alert('Erro ao solicitar PDF.');
     }
 }
 
+async function acompanharPDF(idTarefa) {
+    let tarefa;
+    try {
+        tarefa = await window.pywebview.api.obter_status_pdf(idTarefa);
+    } catch (e) {
+        tarefa = { estado: 'erro', mensagem: 'Erro de conexão com o sistema.' };
+    }
+
+    if (tarefa.estado === 'na_fila' || tarefa.estado === 'gerando') {
+        setTimeout(() => acompanharPDF(idTarefa), 300);
+        return;
+    }
+
+    pdfsEmAndamento--;
+    if (pdfsEmAndamento === 0) document.body.style.cursor = 'default';
+    if (tarefa.estado === 'concluido') {
+        console.log("PDF Gerado:", tarefa.arquivo);
+    } else {
+        alert('Erro ao gerar PDF: ' + tarefa.mensagem);
+    }
+}
+
 async function excluirOrcamento(id) {
     if (!confirm("Excluir permanentemente?")) return;
     try {
-        await window.pywebview.api.excluir_orcamento(id);
-        carregarHistorico();
+        const resposta = await window.pywebview.api.excluir_orcamento(id, versaoItemHistorico(id));
+        if (resposta.conflito) {
+            alert(resposta.mensagem + ' A lista foi atualizada; confira antes de excluir.');
+            verificarAlteracoes();
+            return;
+        }
+        if (resposta.status !== 'ok') {
+            alert('Erro ao excluir: ' + resposta.mensagem);
+            return;
+        }
+        atualizarItemHistorico(id, null);
         carregarEstatisticas();
     } catch (e) { }
 }
 
+function montarItemHistorico(item) {
+    let classeStatus = 'status-pendente';
+    let rotuloStatus = 'Pendente';
+    if (item.status === 'APROVADO') { classeStatus = 'status-aprovado'; rotuloStatus = 'Aprovado ✅'; }
+    else if (item.status === 'REJEITADO') { classeStatus = 'status-rejeitado'; rotuloStatus = 'Rejeitado ❌'; }
+
+    const selecionado = selecaoHistorico.has(item.id);
+    return `
+        <div class="item-historico ${classeStatus}${selecionado ? ' selecionado' : ''}">
+            <div style="display: flex; align-items: center; gap: 12px;">
+                <input type="checkbox" ${selecionado ? 'checked' : ''} onchange="alternarSelecaoHistorico(${item.id}, this.checked)" title="Selecionar">
+                <div>
+                    <div style="font-weight: 600; font-size: 1.1rem;">
+                        ${item.cliente_id ? `<a href="#" class="link-cliente" onclick="filtrarHistoricoCliente(${item.cliente_id}); return false;" title="Ver orçamentos deste cliente">${escaparHtml(item.cliente)}</a>` : escaparHtml(item.cliente)}
+                    </div>
+                    <div style="font-size: 0.9rem; color: var(--texto-suave);">
+                         #${item.id} • ${item.data} • ${item.qtd_itens} itens
+                    </div>
+                    <div style="font-size: 0.8rem; font-weight: bold; margin-top: 4px; color: #555;">${rotuloStatus}</div>
+                </div>
+            </div>
+            <div style="display: flex; flex-direction: column; align-items: flex-end; gap: 5px;">
+                <div style="font-weight: 700; color: var(--texto-principal); font-size: 1.1rem;">${formatarMoeda(item.total)}</div>
+                <div style="display: flex; gap: 5px;">
+                    ${item.status !== 'APROVADO' ? `<button class="btn-icone" onclick="definirStatus(${item.id}, 'APROVADO')" title="Aprovar">✅</button>` : ''}
+                    ${item.status !== 'REJEITADO' ? `<button class="btn-icone" onclick="definirStatus(${item.id}, 'REJEITADO')" title="Rejeitar">❌</button>` : ''}
+                    <div style="width: 1px; background: #ccc; margin: 0 5px;"></div>
+                    <button class="btn-icone" onclick="editarOrcamento(${item.id})" title="Editar">✏️</button>
+                    <button class="btn-icone" onclick="gerarPDF(${item.id})" title="PDF">📄</button>
+                    <button class="btn-icone" onclick="excluirOrcamento(${item.id})" title="Excluir" style="color: #ef4444;">🗑️</button>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
+function filtrosHistorico() {
+    return {
+        status: document.getElementById('historico-status').value,
+        cliente_id: clienteHistorico,
+        busca: document.getElementById('historico-busca').value,
+        ordem: document.getElementById('historico-ordem').value,
+        limite: 50
+    };
+}
+
+async function filtrarHistoricoCliente(idCliente) {
+    const filtro = document.getElementById('historico-cliente');
+    clienteHistorico = idCliente;
+    filtro.style.display = idCliente ? '' : 'none';
+    document.getElementById('historico-cliente-texto').innerText = '👤 ...';
+    carregarHistorico();
+    if (!idCliente) return;
+
+    // Totais do cliente direto do índice, sem esperar a listagem
+    const resumo = await window.pywebview.api.obter_resumo_cliente(idCliente);
+    if (resumo.status === 'ok' && clienteHistorico === idCliente) {
+        document.getElementById('historico-cliente-texto').innerText =
+            `👤 ${resumo.nome} • ${resumo.quantidade} orçamento(s) • ${formatarMoeda(resumo.valor)}`;
+    }
+}
+
+function agendarBuscaHistorico() {
+    clearTimeout(temporizadorBuscaHistorico);
+    temporizadorBuscaHistorico = setTimeout(() => carregarHistorico(), 300);
+}
+
+/* Lista virtualizada: as linhas têm altura fixa e só as visíveis (mais uma folga) existem no DOM.
+   As páginas seguintes são buscadas quando a rolagem se aproxima do fim do que já foi carregado. */
+const ALTURA_ITEM_HISTORICO = 104;
+const FOLGA_HISTORICO = 10;
+
 async function carregarHistorico() {
+    consultaHistorico++;
+    historicoCarregado = [];
+    recargaHistoricoPendente = false;
+    selecaoHistorico.clear();
+    atualizarBarraSelecao();
+    cursorHistorico = null;
+    fimHistorico = false;
+    carregandoHistorico = null;
+    document.getElementById('container-historico').scrollTop = 0;
+    await carregarMaisHistorico();
+}
+
+async function carregarMaisHistorico() {
+    const consulta = consultaHistorico;
+    if (fimHistorico || carregandoHistorico === consulta) return;
+    carregandoHistorico = consulta;
     try {
-        const historico = await window.pywebview.api.obter_historico();
-        const container = document.getElementById('container-historico');
-        if (historico.length === 0) {
-            container.innerHTML = '<p style="text-align:center; color: #666; margin-top: 20px;">Nenhum orçamento encontrado.</p>';
+        const pagina = await window.pywebview.api.obter_historico_paginado({ ...filtrosHistorico(), cursor: cursorHistorico });
+        if (consulta !== consultaHistorico) return;  // O filtro mudou enquanto a página era buscada
+        historicoCarregado.push(...pagina.itens);
+        cursorHistorico = pagina.proximo_cursor;
+        fimHistorico = !cursorHistorico;
+    } catch (e) {
+        fimHistorico = true;
+    } finally {
+        if (carregandoHistorico === consulta) carregandoHistorico = null;
+    }
+    renderizarHistorico(true);
+}
+
+function agendarRenderizacaoHistorico() {
+    if (quadroHistorico) return;
+    quadroHistorico = requestAnimationFrame(() => {
+        quadroHistorico = null;
+        renderizarHistorico(false);
+    });
+}
+
+function renderizarHistorico(forcar) {
+    const container = document.getElementById('container-historico');
+    const janela = document.getElementById('historico-janela');
+    const total = historicoCarregado.length;
+
+    // Uma linha extra no fim indica que ainda há páginas a buscar
+    document.getElementById('historico-espacador').style.height = `${(total + (fimHistorico ? 0 : 1)) * ALTURA_ITEM_HISTORICO}px`;
+
+    if (total === 0 && fimHistorico) {
+        janela.style.transform = '';
+        janela.innerHTML = '<p style="text-align:center; color: #666; margin-top: 20px;">Nenhum orçamento encontrado.</p>';
+        janelaHistorico = { inicio: -1, fim: -1 };
+        return;
+    }
+
+    const inicio = Math.max(0, Math.floor(container.scrollTop / ALTURA_ITEM_HISTORICO) - FOLGA_HISTORICO);
+    const fim = Math.min(total, Math.ceil((container.scrollTop + container.clientHeight) / ALTURA_ITEM_HISTORICO) + FOLGA_HISTORICO);
+    if (forcar || inicio !== janelaHistorico.inicio || fim !== janelaHistorico.fim) {
+        janela.style.transform = `translateY(${inicio * ALTURA_ITEM_HISTORICO}px)`;
+        janela.innerHTML = historicoCarregado.slice(inicio, fim).map(montarItemHistorico).join('');
+        janelaHistorico = { inicio, fim };
+    }
+
+    if (!fimHistorico && fim >= total - FOLGA_HISTORICO) carregarMaisHistorico();
+}
+
+function atualizarItemHistorico(id, alteracoes) {
+    // Aplica a mudança no que já foi carregado, sem buscar o histórico de novo (null remove da lista)
+    const indice = historicoCarregado.findIndex(item => item.id === id);
+    if (indice < 0) return;
+    if (alteracoes) Object.assign(historicoCarregado[indice], alteracoes);
+    else {
+        historicoCarregado.splice(indice, 1);
+        if (selecaoHistorico.delete(id)) atualizarBarraSelecao();
+    }
+    renderizarHistorico(true);
+}
+
+/* ===[ SELEÇÃO MÚLTIPLA ]===
+   As ações sobre os marcados vão ao backend numa única chamada (uma transação); a lista é
+   atualizada em seguida pelo registro de alterações, como se outro usuário tivesse feito a mudança. */
+function atualizarBarraSelecao() {
+    const quantidade = selecaoHistorico.size;
+    document.getElementById('selecao-texto').innerText = quantidade ? `${quantidade} selecionado(s)` : '';
+    document.getElementById('selecao-acoes').style.display = quantidade ? '' : 'none';
+    document.getElementById('selecao-carregados').checked = quantidade > 0 && quantidade === historicoCarregado.length;
+    if (!quantidade && recargaHistoricoPendente) {
+        recargaHistoricoPendente = false;
+        carregarHistorico();
+    }
+}
+
+function alternarSelecaoHistorico(id, marcado) {
+    if (marcado) selecaoHistorico.add(id);
+    else selecaoHistorico.delete(id);
+    atualizarBarraSelecao();
+    renderizarHistorico(true);
+}
+
+function selecionarCarregadosHistorico(marcado) {
+    // Só o que já foi carregado: o resto da lista ainda não é conhecido
+    selecaoHistorico = new Set(marcado ? historicoCarregado.map(item => item.id) : []);
+    atualizarBarraSelecao();
+    renderizarHistorico(true);
+}
+
+function parametrosSelecao() {
+    const ids = [...selecaoHistorico];
+    return { ids, versoes: Object.fromEntries(ids.map(id => [id, versaoItemHistorico(id)])) };
+}
+
+async function concluirAcaoSelecao(resposta, mensagem) {
+    if (resposta.status !== 'ok') {
+        alert(resposta.mensagem);
+        return;
+    }
+    if (resposta.conflitos.length) {
+        alert(`${mensagem} ${resposta.conflitos.length} orçamento(s) foram alterados por outro usuário e ficaram de fora; confira antes de repetir.`);
+    }
+    selecaoHistorico.clear();
+    atualizarBarraSelecao();
+    await verificarAlteracoes();
+    carregarEstatisticas();
+}
+
+async function alterarStatusSelecionados(novoStatus) {
+    try {
+        const resposta = await window.pywebview.api.atualizar_status_lote({ ...parametrosSelecao(), novo_status: novoStatus });
+        await concluirAcaoSelecao(resposta, `${resposta.alterados} orçamento(s) alterado(s).`);
+    } catch (e) { alert('Erro ao alterar os orçamentos selecionados.'); }
+}
+
+async function excluirSelecionados() {
+    if (!confirm(`Excluir permanentemente ${selecaoHistorico.size} orçamento(s)?`)) return;
+    try {
+        const resposta = await window.pywebview.api.excluir_orcamentos_lote(parametrosSelecao());
+        await concluirAcaoSelecao(resposta, `${resposta.excluidos} orçamento(s) excluído(s).`);
+    } catch (e) { alert('Erro ao excluir os orçamentos selecionados.'); }
+}
+
+/* ===[ ALTERAÇÕES DE OUTROS USUÁRIOS ]===
+   Consulta periódica do registro de alterações: só as linhas que mudaram são atualizadas na lista. */
+async function verificarAlteracoes() {
+    try {
+        const resposta = await window.pywebview.api.obter_alteracoes(seqAlteracoes);
+        if (resposta.status !== 'ok') return;
+        const primeiraConsulta = seqAlteracoes === null;
+        seqAlteracoes = resposta.seq;
+        if (primeiraConsulta) return;
+
+        const historicoAtivo = document.getElementById('historico').classList.contains('ativa');
+        const houveMudanca = resposta.recarregar || resposta.alterados.length > 0 || resposta.excluidos.length > 0;
+        if (houveMudanca && document.getElementById('inicio').classList.contains('ativa')) carregarEstatisticas();
+        if (!historicoAtivo) return;
+        if (resposta.recarregar) {
+            // Recarregar desmarcaria a seleção em andamento: espera o usuário concluí-la ou limpá-la
+            if (selecaoHistorico.size) recargaHistoricoPendente = true;
+            else carregarHistorico();
             return;
         }
 
-        let html = '';
-        historico.reverse().forEach(item => {
-            let classeStatus = 'status-pendente';
-            let rotuloStatus = 'Pendente';
-            // Mapeamento dos status do banco (que estão em inglês ou padrão antigo) para visual
-            if (item.status === 'APROVADO' || item.status === 'APPROVED') { classeStatus = 'status-aprovado'; rotuloStatus = 'Aprovado ✅'; }
-            else if (item.status === 'REJEITADO' || item.status === 'REJECTED') { classeStatus = 'status-rejeitado'; rotuloStatus = 'Rejeitado ❌'; }
-
-            html += `
-                <div class="item-historico ${classeStatus}">
-                    <div>
-                        <div style="font-weight: 600; font-size: 1.1rem;">${item.cliente}</div>
-                        <div style="font-size: 0.9rem; color: var(--texto-suave);">
-                             #${item.id} • ${item.data} • ${item.qtd_itens} itens
-                        </div>
-                        <div style="font-size: 0.8rem; font-weight: bold; margin-top: 4px; color: #555;">${rotuloStatus}</div>
-                    </div>
-                    <div style="display: flex; flex-direction: column; align-items: flex-end; gap: 5px;">
-                        <div style="font-weight: 700; color: var(--texto-principal); font-size: 1.1rem;">${formatarMoeda(item.total)}</div>
-                        <div style="display: flex; gap: 5px;">
-                            ${item.status !== 'APROVADO' && item.status !== 'APPROVED' ? `<button class="btn-icone" onclick="definirStatus(${item.id}, 'APROVADO')" title="Aprovar">✅</button>` : ''}
-                            ${item.status !== 'REJEITADO' && item.status !== 'REJECTED' ? `<button class="btn-icone" onclick="definirStatus(${item.id}, 'REJEITADO')" title="Rejeitar">❌</button>` : ''}
-                            <div style="width: 1px; background: #ccc; margin: 0 5px;"></div>
-                            <button class="btn-icone" onclick="editarOrcamento(${item.id})" title="Editar">✏️</button>
-                            <button class="btn-icone" onclick="gerarPDF(${item.id})" title="PDF">📄</button>
-                            <button class="btn-icone" onclick="excluirOrcamento(${item.id})" title="Excluir" style="color: #ef4444;">🗑️</button>
-                        </div>
-                    </div>
-                </div>
-            `;
-        });
-        container.innerHTML = html;
+        resposta.excluidos.forEach(id => atualizarItemHistorico(id, null));
+        const filtroStatus = document.getElementById('historico-status').value;
+        let novos = 0;
+        for (const { operacao, ...linha } of resposta.alterados) {
+            if (historicoCarregado.some(item => item.id === linha.id)) {
+                atualizarItemHistorico(linha.id, filtroStatus && filtroStatus !== linha.status ? null : linha);
+            } else if (operacao === 'insercao') {
+                novos++;
+            }
+        }
+        // Orçamentos novos entram no topo: só recarrega se o usuário estiver vendo o topo da lista
+        const container = document.getElementById('container-historico');
+        if (novos > 0 && selecaoHistorico.size === 0 && container.scrollTop === 0 && document.getElementById('historico-ordem').value === 'recentes') carregarHistorico();
     } catch (e) { }
 }
 
+/* ===[ EXPORTAÇÃO EM LOTE ]=== */
+function parametrosLote() {
+    return {
+        status: document.getElementById('historico-status').value,
+        data_inicio: document.getElementById('lote-data-inicio').value,
+        data_fim: document.getElementById('lote-data-fim').value
+    };
+}
+
+function acompanharLote(idLote) {
+    loteAtual = idLote;
+    document.getElementById('progresso-lote').style.display = 'block';
+    document.getElementById('btn-cancelar-lote').style.display = 'inline-block';
+    clearInterval(temporizadorLote);
+    temporizadorLote = setInterval(atualizarProgressoLote, 500);
+    atualizarProgressoLote();
+}
+
+async function exportarLote() {
+    try {
+        const resposta = await window.pywebview.api.exportar_pdfs_lote(parametrosLote());
+        if (resposta.status !== 'ok') {
+            alert(resposta.mensagem);
+            return;
+        }
+        acompanharLote(resposta.id_lote);
+    } catch (e) { alert('Erro ao iniciar a exportação em lote.'); }
+}
+
+async function exportarConsolidado() {
+    // Um único PDF com capa de totais por status e todos os orçamentos do filtro
+    try {
+        const resposta = await window.pywebview.api.exportar_pdf_consolidado(parametrosLote());
+        if (resposta.status === 'cancelado') return;
+        if (resposta.status !== 'ok') {
+            alert(resposta.mensagem);
+            return;
+        }
+        acompanharLote(resposta.id_lote);
+    } catch (e) { alert('Erro ao iniciar o relatório consolidado.'); }
+}
+
+async function exportarDados() {
+    const parametros = {
+        formato: document.getElementById('exportar-formato').value,
+        itens: document.getElementById('exportar-itens').checked,
+        status: document.getElementById('historico-status').value,
+        data_inicio: document.getElementById('lote-data-inicio').value,
+        data_fim: document.getElementById('lote-data-fim').value
+    };
+    try {
+        const resposta = await window.pywebview.api.exportar_dados(parametros);
+        if (resposta.status === 'cancelado') return;
+        if (resposta.status !== 'ok') {
+            alert('Erro ao exportar: ' + resposta.mensagem);
+            return;
+        }
+        alert(`${resposta.linhas} registro(s) exportado(s) para:\n${resposta.arquivo}`);
+    } catch (e) { alert('Erro ao exportar os dados.'); }
+}
+
+async function importarArquivo() {
+    try {
+        const resposta = await window.pywebview.api.importar_arquivo();
+        if (resposta.status === 'cancelado') return;
+        if (resposta.status !== 'ok') {
+            alert('Erro ao importar: ' + resposta.mensagem);
+            return;
+        }
+        let mensagem = `${resposta.importados} orçamento(s) importado(s) em ${resposta.duracao}s.`;
+        if (resposta.rejeitados > 0) {
+            const exemplos = resposta.rejeicoes.slice(0, 10).map(r => `Linha ${r.linha}: ${r.mensagem}`).join('\n');
+            mensagem += `\n${resposta.rejeitados} linha(s) rejeitada(s):\n${exemplos}`;
+        }
+        alert(mensagem);
+        carregarHistorico();
+        carregarEstatisticas();
+    } catch (e) { alert('Erro ao importar o arquivo.'); }
+}
+
+async function atualizarProgressoLote() {
+    try {
+        const progresso = await window.pywebview.api.obter_progresso_lote(loteAtual);
+        if (progresso.status !== 'ok') return;
+
+        const percentual = progresso.total ? Math.round(progresso.concluidos * 100 / progresso.total) : 0;
+        let texto = progresso.consolidado
+            ? `Montando o relatório: ${progresso.concluidos}/${progresso.total} orçamentos...`
+            : `Exportando ${progresso.concluidos}/${progresso.total} PDFs...`;
+        if (progresso.finalizado) {
+            if (progresso.consolidado) {
+                texto = progresso.arquivos.length ? `Relatório salvo em ${progresso.arquivos[0]}.` : 'Relatório não gerado' + (progresso.cancelado ? ' (cancelado).' : '.');
+            } else {
+                texto = `${progresso.arquivos.length} PDFs exportados` + (progresso.cancelado ? ' (cancelado)' : '') + '.';
+            }
+            if (progresso.erro) texto += ` Erro: ${progresso.erro}`;
+            clearInterval(temporizadorLote);
+            document.getElementById('btn-cancelar-lote').style.display = 'none';
+        }
+        if (progresso.falhas.length > 0) texto += ` ${progresso.falhas.length} falha(s).`;
+
+        document.getElementById('progresso-lote-texto').innerText = texto;
+        document.getElementById('progresso-lote-barra').style.width = `${percentual}%`;
+        document.getElementById('progresso-lote-falhas').innerHTML = progresso.falhas
+            .map(falha => `<li>#${falha.id}: ${escaparHtml(falha.mensagem)}</li>`).join('');
+    } catch (e) { clearInterval(temporizadorLote); }
+}
+
+async function cancelarLote() {
+    if (loteAtual !== null) await window.pywebview.api.cancelar_lote(loteAtual);
+}
+
 async function carregarEstatisticas() {
     try {
         const stats = await window.pywebview.api.obter_estatisticas();
@@ -310,6 +764,121 @@ async function carregarEstatisticas() {
     } catch (e) { }
 }
 
+/* ===[ DIAGNÓSTICO ]=== */
+function formatarMs(valor) {
+    if (valor === null || valor === undefined) return '> 5 s';
+    return valor >= 1000 ? `${(valor / 1000).toFixed(2)} s` : `${valor} ms`;
+}
+
+function montarHistograma(faixas) {
+    // Uma barra por faixa de latência, proporcional à faixa mais cheia
+    const maior = Math.max(...faixas.map(faixa => faixa.quantidade), 1);
+    return `<div class="histograma">${faixas.map(faixa => `
+        <span title="até ${formatarMs(faixa.ate_ms)}: ${faixa.quantidade}" style="height: ${Math.round(faixa.quantidade / maior * 100)}%"></span>`).join('')}
+    </div>`;
+}
+
+async function carregarDiagnostico() {
+    try {
+        const dados = await window.pywebview.api.obter_diagnostico();
+        const inicializacao = Object.entries(dados.inicializacao).map(([etapa, ms]) => `${etapa} ${ms} ms`).join(', ');
+        document.getElementById('diagnostico-resumo').innerText =
+            `Desde ${new Date(dados.desde).toLocaleString('pt-BR')}. Inicialização: ${inicializacao || '-'}.` +
+            (dados.perfil.limite_ms !== null ? ` Perfis das chamadas acima de ${dados.perfil.limite_ms} ms em ${dados.perfil.pasta}.` : '');
+        document.getElementById('diagnostico-perfil').value = dados.perfil.limite_ms ?? '';
+
+        document.getElementById('diagnostico-chamadas').innerHTML = dados.chamadas.map(chamada => `
+            <tr>
+                <td>${escaparHtml(chamada.metodo)}</td>
+                <td>${chamada.quantidade}</td>
+                <td>${chamada.erros}</td>
+                <td>${formatarMs(chamada.media_ms)}</td>
+                <td>≤ ${formatarMs(chamada.p95_ms)}</td>
+                <td>${formatarMs(chamada.max_ms)}</td>
+                <td>${formatarMs(chamada.total_ms)}</td>
+                <td>${chamada.sql_consultas} / ${formatarMs(chamada.sql_ms)}</td>
+                <td>${montarHistograma(chamada.histograma)}</td>
+            </tr>`).join('') || '<tr><td colspan="9">Nenhuma chamada registrada.</td></tr>';
+
+        document.getElementById('diagnostico-fases').innerHTML = dados.fases_pdf.map(fase => `
+            <tr>
+                <td>${fase.fase}</td>
+                <td>${fase.quantidade}</td>
+                <td>${formatarMs(fase.media_ms)}</td>
+                <td>${formatarMs(fase.max_ms)}</td>
+                <td>${formatarMs(fase.total_ms)}</td>
+            </tr>`).join('') || '<tr><td colspan="5">Nenhum PDF gerado.</td></tr>';
+
+        document.getElementById('diagnostico-erros').innerHTML = dados.erros.map(erro => `
+            <li>
+                <strong>${escaparHtml(erro.metodo)}</strong> (${new Date(erro.quando).toLocaleTimeString('pt-BR')}): ${escaparHtml(erro.mensagem)}
+                ${erro.detalhes ? `<details><summary>Detalhes</summary><pre>${escaparHtml(erro.detalhes)}</pre></details>` : ''}
+            </li>`).join('') || '<li>Nenhum erro registrado.</li>';
+    } catch (e) { console.error(e); }
+}
+
+async function limparDiagnostico() {
+    await window.pywebview.api.limpar_diagnostico();
+    carregarDiagnostico();
+}
+
+async function configurarPerfil() {
+    const resposta = await window.pywebview.api.configurar_perfil(document.getElementById('diagnostico-perfil').value);
+    if (resposta.status === 'erro') alert(resposta.mensagem);
+    carregarDiagnostico();
+}
+
+/* ===[ BACKUP E MANUTENÇÃO ]=== */
+function formatarBytes(bytes) {
+    if (bytes >= 1048576) return `${(bytes / 1048576).toFixed(1).replace('.', ',')} MB`;
+    return `${Math.ceil(bytes / 1024)} KB`;
+}
+
+async function carregarManutencao() {
+    try {
+        const estado = await window.pywebview.api.obter_estado_manutencao();
+        if (estado.status !== 'ok') return;
+        const arm = estado.armazenamento;
+        document.getElementById('manutencao-armazenamento').innerText =
+            `Banco: ${formatarBytes(arm.tamanho)} (+ ${formatarBytes(arm.tamanho_wal)} no WAL), ` +
+            `${arm.paginas} páginas, ${arm.paginas_livres} livres (${arm.fragmentacao_pct}% de fragmentação).`;
+
+        const quando = tarefa => estado.execucoes[tarefa]
+            ? new Date(estado.execucoes[tarefa].executada_em).toLocaleString('pt-BR') : 'nunca';
+        let texto = `Último backup: ${quando('backup')}. Última otimização: ${quando('otimizacao')}.`;
+        if (estado.execucoes.backup_falha) texto += ` Falha de backup em ${quando('backup_falha')}: ${estado.execucoes.backup_falha.resultado.mensagem}`;
+        document.getElementById('manutencao-execucoes').innerText = texto;
+
+        const progresso = estado.backup;
+        document.getElementById('manutencao-progresso').style.display = progresso.em_andamento ? 'block' : 'none';
+        document.getElementById('manutencao-progresso-barra').style.width =
+            `${progresso.total ? Math.round(progresso.copiadas * 100 / progresso.total) : 0}%`;
+        if (progresso.em_andamento) setTimeout(carregarManutencao, 300);
+
+        document.getElementById('manutencao-backups').innerHTML = estado.backups
+            .map(backup => `<li>${escaparHtml(backup.arquivo)} (${formatarBytes(backup.tamanho)})</li>`).join('')
+            || `<li>Nenhum backup em ${escaparHtml(estado.pasta)}.</li>`;
+    } catch (e) { console.error(e); }
+}
+
+async function fazerBackup() {
+    const resposta = await window.pywebview.api.fazer_backup();
+    if (resposta.status !== 'ok') alert(resposta.mensagem);
+    carregarManutencao();
+}
+
+async function otimizarBanco() {
+    if (!confirm('Compactar o banco reescreve o arquivo inteiro e pausa as gravações até terminar. Continuar?')) return;
+    const resposta = await window.pywebview.api.otimizar_banco();
+    if (resposta.status !== 'ok') {
+        alert('Erro ao otimizar: ' + resposta.mensagem);
+        return;
+    }
+    alert(`Banco otimizado em ${resposta.duracao}s: ${formatarBytes(resposta.antes.tamanho)} → ${formatarBytes(resposta.depois.tamanho)}, ` +
+        `fragmentação ${resposta.antes.fragmentacao_pct}% → ${resposta.depois.fragmentacao_pct}%.`);
+    carregarManutencao();
+}
+
 /* ===[ CONFIGURAÇÕES ]=== */
 async function selecionarPasta() {
     try {
@@ -325,9 +894,14 @@ async function selecionarLogo() {
             document.getElementById('caminho-logo').value = resposta.caminho;
             const preview = document.getElementById('logo-preview');
             // Cache busting
-            preview.src = resposta.caminho + '?t=' + new Date().getTime();
+            preview.src = resposta.previa + '?t=' + new Date().getTime();
             preview.style.display = 'block';
             document.getElementById('logo-placeholder').style.display = 'none';
+            const [largura, altura] = resposta.dimensoes;
+            document.getElementById('logo-economia').innerText =
+                `Otimizado para impressão: ${largura}x${altura} px em ${resposta.formato}, ` +
+                `${Math.ceil(resposta.tamanho / 1024)} KB` +
+                (resposta.economia_pct > 0 ? ` (${resposta.economia_pct}% menor que o original).` : '.');
         } else if (resposta.status === 'erro') {
             alert(resposta.mensagem);
         }
@@ -416,6 +990,14 @@ function mascaraCNPJ(evento) {
 
 document.addEventListener('DOMContentLoaded', () => {
     setTimeout(() => carregarEstatisticas(), 500);
+    setTimeout(verificarAlteracoes, 500);
+    setInterval(verificarAlteracoes, INTERVALO_ALTERACOES_MS);
+
+    const inputCliente = document.getElementById('cliente-nome');
+    if (inputCliente) {
+        inputCliente.addEventListener('input', agendarSugestoesClientes);
+        inputCliente.addEventListener('change', preencherContatosCliente);
+    }
 
     const inputTelefone = document.getElementById('cliente-telefone');
     if (inputTelefone) inputTelefone.addEventListener('input', mascaraTelefone);